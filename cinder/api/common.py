@@ -25,6 +25,7 @@ import webob
 
 from cinder.api.openstack import wsgi
 from cinder.api import xmlutil
+from cinder import exception
 from cinder.openstack.common import log as logging
 from cinder import utils
 
@@ -125,6 +126,28 @@ def limited(items, request, max_limit=CONF.osapi_max_limit):
     return items[offset:range_end]
 
 
+def get_limit(limit, max_limit=None):
+    """Return the number of items to fetch for the requested limit.
+
+    A limit that is not given, or 0, is max_limit, and a larger one is
+    lowered to max_limit, as `limited` does, so the items can be limited
+    before they are fetched. max_limit defaults to osapi_max_limit.
+    """
+    if max_limit is None:
+        max_limit = CONF.osapi_max_limit
+    if limit is None:
+        return max_limit
+    try:
+        limit = int(limit)
+    except ValueError:
+        msg = _('limit param must be an integer')
+        raise exception.InvalidInput(reason=msg)
+    if limit < 0:
+        msg = _('limit param must be positive')
+        raise exception.InvalidInput(reason=msg)
+    return min(max_limit, limit or max_limit)
+
+
 def limited_by_marker(items, request, max_limit=CONF.osapi_max_limit):
     """Return a slice of items according to the requested marker and limit."""
     params = get_pagination_params(request)
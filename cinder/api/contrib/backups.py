@@ -28,6 +28,7 @@ from cinder.api import xmlutil
 from cinder import backup as backupAPI
 from cinder import exception
 from cinder.openstack.common import log as logging
+from cinder.openstack.common import strutils
 
 
 LOG = logging.getLogger(__name__)
@@ -39,6 +40,7 @@ def make_backup(elem):
     elem.set('size')
     elem.set('container')
     elem.set('volume_id')
+    elem.set('parent_id')
     elem.set('object_count')
     elem.set('availability_zone')
     elem.set('created_at')
@@ -46,6 +48,13 @@ def make_backup(elem):
     elem.set('description')
     elem.set('fail_reason')
 
+    progress = xmlutil.SubTemplateElement(elem, 'progress',
+                                          selector='progress')
+    for attr in ('volume_bytes', 'backend_bytes', 'total_bytes',
+                 'compression_ratio', 'throughput', 'chunk_latency',
+                 'percent', 'eta'):
+        progress.set(attr)
+
 
 def make_backup_restore(elem):
     elem.set('backup_id')
@@ -91,7 +100,8 @@ class CreateDeserializer(wsgi.MetadataXMLDeserializer):
         backup_node = self.find_first_child_named(node, 'backup')
 
         attributes = ['container', 'display_name',
-                      'display_description', 'volume_id']
+                      'display_description', 'volume_id', 'incremental',
+                      'compression']
 
         for attr in attributes:
             if backup_node.getAttribute(attr):
@@ -197,6 +207,9 @@ class BackupsController(wsgi.Controller):
         container = backup.get('container', None)
         name = backup.get('name', None)
         description = backup.get('description', None)
+        incremental = strutils.bool_from_string(backup.get('incremental',
+                                                           False))
+        compression = backup.get('compression', None)
 
         LOG.audit(_("Creating backup of volume %(volume_id)s in container"
                     " %(container)s"),
@@ -205,9 +218,15 @@ class BackupsController(wsgi.Controller):
 
         try:
             new_backup = self.backup_api.create(context, name, description,
-                                                volume_id, container)
+                                                volume_id, container,
+                                                incremental=incremental,
+                                                compression=compression)
+        except exception.InvalidInput as error:
+            raise exc.HTTPBadRequest(explanation=unicode(error))
         except exception.InvalidVolume as error:
             raise exc.HTTPBadRequest(explanation=unicode(error))
+        except exception.InvalidBackup as error:
+            raise exc.HTTPBadRequest(explanation=unicode(error))
         except exception.VolumeNotFound as error:
             raise exc.HTTPNotFound(explanation=unicode(error))
         except exception.ServiceNotFound as error:
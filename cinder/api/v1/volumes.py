@@ -253,8 +253,8 @@ class VolumeController(wsgi.Controller):
 
         #pop out limit and offset , they are not search_opts
         search_opts = req.GET.copy()
-        search_opts.pop('limit', None)
-        search_opts.pop('offset', None)
+        limit = common.get_limit(search_opts.pop('limit', None))
+        offset = search_opts.pop('offset', None)
 
         if 'metadata' in search_opts:
             search_opts['metadata'] = ast.literal_eval(search_opts['metadata'])
@@ -263,11 +263,11 @@ class VolumeController(wsgi.Controller):
         remove_invalid_options(context,
                                search_opts, self._get_volume_search_options())
 
-        volumes = self.volume_api.get_all(context, marker=None, limit=None,
+        volumes = self.volume_api.get_all(context, marker=None, limit=limit,
                                           sort_key='created_at',
-                                          sort_dir='desc', filters=search_opts)
-        limited_list = common.limited(volumes, req)
-        res = [entity_maker(context, vol) for vol in limited_list]
+                                          sort_dir='desc', filters=search_opts,
+                                          offset=offset)
+        res = [entity_maker(context, vol) for vol in volumes]
         return {'volumes': res}
 
     def _image_uuid_from_href(self, image_href):
@@ -201,10 +201,10 @@ class VolumeController(wsgi.Controller):
 
         params = req.params.copy()
         marker = params.pop('marker', None)
-        limit = params.pop('limit', None)
+        limit = common.get_limit(params.pop('limit', None))
         sort_key = params.pop('sort_key', 'created_at')
         sort_dir = params.pop('sort_dir', 'desc')
-        params.pop('offset', None)
+        offset = params.pop('offset', None)
         filters = params
 
         remove_invalid_options(context,
@@ -219,13 +219,12 @@ class VolumeController(wsgi.Controller):
             filters['metadata'] = ast.literal_eval(filters['metadata'])
 
         volumes = self.volume_api.get_all(context, marker, limit, sort_key,
-                                          sort_dir, filters)
-        limited_list = common.limited(volumes, req)
+                                          sort_dir, filters, offset=offset)
 
         if is_detail:
-            volumes = self._view_builder.detail_list(req, limited_list)
+            volumes = self._view_builder.detail_list(req, volumes)
         else:
-            volumes = self._view_builder.summary_list(req, limited_list)
+            volumes = self._view_builder.summary_list(req, volumes)
         return volumes
 
     def _image_uuid_from_href(self, image_href):
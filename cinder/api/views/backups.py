@@ -14,6 +14,7 @@
 #    under the License.
 
 from cinder.api import common
+from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
 
 
@@ -72,10 +73,19 @@ class ViewBuilder(common.ViewBuilder):
                 'description': backup.get('display_description'),
                 'fail_reason': backup.get('fail_reason'),
                 'volume_id': backup.get('volume_id'),
+                'parent_id': backup.get('parent_id'),
+                'progress': self._get_progress(backup),
                 'links': self._get_links(request, backup['id'])
             }
         }
 
+    def _get_progress(self, backup):
+        """Return the progress last recorded by a backup or restore."""
+        progress = backup.get('progress')
+        if progress:
+            return jsonutils.loads(progress)
+        return None
+
     def _list_view(self, func, request, backups):
         """Provide a view for a list of backups."""
         backups_list = [func(request, backup)['backup'] for backup in backups]
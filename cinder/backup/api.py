@@ -22,6 +22,7 @@ from eventlet import greenthread
 
 from oslo.config import cfg
 
+from cinder.backup import compression as backup_compression
 from cinder.backup import rpcapi as backup_rpcapi
 from cinder import context
 from cinder.db import base
@@ -68,6 +69,12 @@ class API(base.Base):
             msg = _('Backup status must be available or error')
             raise exception.InvalidBackup(reason=msg)
 
+        backups = self.db.backup_get_all_by_volume(context.elevated(),
+                                                   backup['volume_id'])
+        if any(b['parent_id'] == backup_id for b in backups):
+            msg = _('Incremental backups exist for this backup')
+            raise exception.InvalidBackup(reason=msg)
+
         self.db.backup_update(context, backup_id, {'status': 'deleting'})
         self.backup_rpcapi.delete_backup(context,
                                          backup['host'],
@@ -98,16 +105,48 @@ class API(base.Base):
                 return True
         return False
 
+    def _get_parent_backup(self, context, volume_id, container):
+        """
+        Return the most recent available backup to base an incremental
+        backup of the volume on.
+        """
+        for backup in self.db.backup_get_all_by_volume(context, volume_id):
+            if backup['status'] != 'available':
+                continue
+            if container is not None and backup['container'] != container:
+                continue
+            return backup
+        msg = _('No available backup to base an incremental backup on')
+        raise exception.InvalidBackup(reason=msg)
+
     def create(self, context, name, description, volume_id,
-               container, availability_zone=None):
+               container, availability_zone=None, incremental=False,
+               compression=None):
         """
         Make the RPC call to create a volume backup.
+
+        An incremental backup only stores the data that changed since the
+        most recent available backup of the volume in the same container.
+        The compression algorithm defaults to the one configured on the
+        backup service.
         """
         check_policy(context, 'create')
+        if (compression is not None and
+                not backup_compression.is_supported(compression)):
+            msg = _('Unsupported compression algorithm: %s') % compression
+            raise exception.InvalidInput(reason=msg)
+
         volume = self.volume_api.get(context, volume_id)
         if volume['status'] != "available":
             msg = _('Volume to be backed up must be available')
             raise exception.InvalidVolume(reason=msg)
+
+        parent_id = None
+        if incremental:
+            parent = self._get_parent_backup(context, volume_id, container)
+            parent_id = parent['id']
+            container = parent['container']
+
         self.db.volume_update(context, volume_id, {'status': 'backing-up'})
 
         options = {'user_id': context.user_id,
@@ -115,8 +154,10 @@ class API(base.Base):
                    'display_name': name,
                    'display_description': description,
                    'volume_id': volume_id,
+                   'parent_id': parent_id,
                    'status': 'creating',
                    'container': container,
+                   'compression': compression,
                    'size': volume['size'],
                    # TODO(DuncanT): This will need de-managling once
                    #                multi-backend lands
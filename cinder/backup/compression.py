@@ -0,0 +1,127 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compression algorithms available to the backup drivers.
+
+The libraries implementing the algorithms are only imported when a
+compressor is requested, so that the optional ones (lz4, zstd) are only
+needed where they are used.
+"""
+
+
+class Compressor(object):
+    """Compression algorithm with its compression level bound in."""
+
+    def __init__(self, compress, decompress):
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _clamp_level(level, minimum, maximum):
+    """Clamp the configured level to the range the algorithm supports."""
+    if level is None:
+        return None
+    return max(minimum, min(level, maximum))
+
+
+def _zlib_compressor(level):
+    import zlib
+    level = _clamp_level(level, 0, 9)
+    if level is None:
+        return zlib
+    return Compressor(lambda data: zlib.compress(data, level),
+                      zlib.decompress)
+
+
+def _bz2_compressor(level):
+    import bz2
+    level = _clamp_level(level, 1, 9)
+    if level is None:
+        return bz2
+    return Compressor(lambda data: bz2.compress(data, level),
+                      bz2.decompress)
+
+
+def _lz4_compressor(level):
+    import lz4.frame
+    level = _clamp_level(level, 0, 16)
+
+    def compress(data):
+        return lz4.frame.compress(data, compression_level=level or 0)
+
+    return Compressor(compress, lz4.frame.decompress)
+
+
+def _zstd_compressor(level):
+    import zstandard
+    level = _clamp_level(level, 1, 22)
+
+    # zstandard contexts are not thread safe and chunks may be compressed
+    # in parallel native threads, so each call uses its own context
+    def compress(data):
+        return zstandard.ZstdCompressor(level=level or 3).compress(data)
+
+    def decompress(data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    return Compressor(compress, decompress)
+
+
+# Maps each compression algorithm name to a function that takes the
+# compression level and returns an object with compress() and decompress()
+# functions.  The level is clamped to the range of the algorithm.  The
+# function raises ImportError when the library implementing the algorithm
+# is not available.
+COMPRESSORS = {
+    'zlib': _zlib_compressor,
+    'gzip': _zlib_compressor,
+    'bz2': _bz2_compressor,
+    'bzip2': _bz2_compressor,
+    'lz4': _lz4_compressor,
+    'zstd': _zstd_compressor,
+}
+
+# Names that disable compression
+NO_COMPRESSION = ('none', 'off', 'no')
+
+
+def get_compressor(algorithm, level=None):
+    """Return the compressor of an algorithm, None to disable compression.
+
+    Raises ValueError if the algorithm is unknown or its library is not
+    installed.
+    """
+    algorithm = algorithm.lower()
+    if algorithm in NO_COMPRESSION:
+        return None
+    factory = COMPRESSORS.get(algorithm)
+    if factory is not None:
+        try:
+            return factory(level)
+        except ImportError:
+            pass
+
+    err = _('unsupported compression algorithm: %s') % algorithm
+    raise ValueError(unicode(err))
+
+
+def is_supported(algorithm):
+    """Return whether get_compressor() can be used with an algorithm."""
+    try:
+        get_compressor(algorithm)
+    except ValueError:
+        return False
+    return True
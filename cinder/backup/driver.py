@@ -15,11 +15,137 @@
 #
 """Base class for all backup drivers."""
 
+import time
+
+import eventlet
+from oslo.config import cfg
+
 from cinder.db import base
+from cinder.openstack.common import jsonutils
+from cinder.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+service_opts = [
+    cfg.IntOpt('backup_progress_interval',
+               default=30,
+               help='The interval in seconds between updates of the '
+                    'progress recorded on running backups and restores'),
+    cfg.IntOpt('backup_max_bandwidth',
+               default=0,
+               help='The maximum rate in bytes per second at which a single '
+                    'backup or restore transfers data to or from the backup '
+                    'store, 0 for no limit'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(service_opts)
+
+
+class BackupProgress(object):
+    """Progress of a running backup or restore.
+
+    Drivers call update() for every chunk they move between the volume and
+    the backup store. The accumulated progress is recorded on the backup at
+    most every backup_progress_interval seconds, and once more by finish().
+    update() also holds the caller back while the operation transfers data
+    faster than backup_max_bandwidth.
+    """
+
+    def __init__(self, context, db, backup_id, total_bytes):
+        self.context = context
+        self.db = db
+        self.backup_id = backup_id
+        self.total_bytes = total_bytes
+        self.volume_bytes = 0
+        self.backend_bytes = 0
+        self.chunks = 0
+        self.chunk_time = 0.0
+        self.started = time.time()
+        self.last_saved = self.started
+
+    def update(self, volume_bytes, backend_bytes, latency=None):
+        """Account for a chunk of the volume.
+
+        volume_bytes is the amount of volume data read for a backup or
+        written for a restore, backend_bytes the amount sent to or fetched
+        from the backup store for it, after compression. latency is the
+        time taken to move the chunk, or None if it was skipped.
+        """
+        self.volume_bytes += volume_bytes
+        self.backend_bytes += backend_bytes
+        if latency is not None:
+            self.chunks += 1
+            self.chunk_time += latency
+
+        now = time.time()
+        if now - self.last_saved >= CONF.backup_progress_interval:
+            self.save(now)
+        if CONF.backup_max_bandwidth:
+            self._throttle(now)
+
+    def _throttle(self, now):
+        delay = (float(self.backend_bytes) / CONF.backup_max_bandwidth -
+                 (now - self.started))
+        if delay > 0:
+            eventlet.sleep(delay)
+
+    def to_dict(self, now=None):
+        """Return the progress as recorded on the backup."""
+        elapsed = (now or time.time()) - self.started
+        progress = {'volume_bytes': self.volume_bytes,
+                    'backend_bytes': self.backend_bytes,
+                    'total_bytes': self.total_bytes,
+                    'compression_ratio': None,
+                    'throughput': None,
+                    'chunk_latency': None,
+                    'percent': None,
+                    'eta': None}
+        if self.backend_bytes:
+            progress['compression_ratio'] = (float(self.volume_bytes) /
+                                             self.backend_bytes)
+        if self.chunks:
+            progress['chunk_latency'] = self.chunk_time / self.chunks
+        if self.total_bytes:
+            progress['percent'] = min(100, self.volume_bytes * 100 /
+                                      self.total_bytes)
+        if elapsed > 0:
+            throughput = self.volume_bytes / elapsed
+            progress['throughput'] = throughput
+            if self.total_bytes and throughput:
+                remaining = max(0, self.total_bytes - self.volume_bytes)
+                progress['eta'] = int(remaining / throughput)
+        return progress
+
+    def save(self, now=None):
+        """Record the progress on the backup."""
+        now = now or time.time()
+        self.last_saved = now
+        try:
+            self.db.backup_update(self.context, self.backup_id,
+                                  {'progress':
+                                   jsonutils.dumps(self.to_dict(now))})
+        except Exception:
+            LOG.exception(_('failed to record progress of backup %s') %
+                          self.backup_id)
+
+    def finish(self):
+        """Record the final progress on the backup."""
+        self.save()
 
 
 class BackupDriver(base.Base):
 
+    # Whether backup() only stores what changed since backup['parent_id'].
+    # Drivers that do not support it make full backups, which do not
+    # depend on their parent.
+    SUPPORTS_INCREMENTAL = False
+
+    def _get_progress(self, backup_id, total_bytes):
+        """Return a tracker for the progress of a backup or restore."""
+        return BackupProgress(self.context, self.db, backup_id, total_bytes)
+
     def backup(self, backup, volume_file):
         """Starts a backup of a specified volume"""
         raise NotImplementedError()
@@ -42,6 +42,8 @@ restore to a new volume (default).
 """
 
 import eventlet
+from eventlet import queue
+from eventlet import tpool
 import os
 import re
 import time
@@ -83,6 +85,183 @@ CONF = cfg.CONF
 CONF.register_opts(service_opts)
 
 
+class DataMover(object):
+    """Copy data between Python IO objects.
+
+    Data is moved through a fixed set of buffers which are allocated once per
+    transfer and filled with readinto() where the source supports it. Reads
+    and writes run in native threads and overlap, so the next chunk is read
+    from the source while the previous one is written to the destination.
+
+    If the source is an RBD image its unallocated extents are not read. They
+    are skipped in a destination that is known to read back zeros, and hole
+    punched or zero filled otherwise.
+
+    If given, progress is called with the number of bytes of the volume and
+    of the backup for every chunk, and the time taken to move it.
+    """
+
+    def __init__(self, chunk_size, num_buffers=2):
+        self.chunk_size = chunk_size
+        self.num_buffers = num_buffers
+
+    def _get_extents(self, src, src_start, length):
+        """Return the (offset, length, allocated) ranges to transfer.
+
+        Offsets are relative to the start of the transfer.
+        """
+        rbd_image = getattr(src, 'rbd_image', None)
+        if rbd_image is None:
+            return [(0, length, True)]
+
+        allocated = []
+
+        def iter_cb(offset, length, exists):
+            if exists:
+                allocated.append((offset - src_start, length))
+
+        try:
+            rbd_image.diff_iterate(src_start, length, None, iter_cb)
+        except AttributeError:
+            LOG.debug(_("diff_iterate() not supported by librbd - copying "
+                        "all extents"))
+            return [(0, length, True)]
+
+        extents = []
+        pos = 0
+        for offset, ext_length in sorted(allocated):
+            if offset > pos:
+                extents.append((pos, offset - pos, False))
+            extents.append((offset, ext_length, True))
+            pos = offset + ext_length
+        if pos < length:
+            extents.append((pos, length - pos, False))
+        return extents
+
+    @staticmethod
+    def _fill(src, buf, count):
+        """Read up to count bytes from src into buf.
+
+        Runs in a native thread so must not log.
+        """
+        view = memoryview(buf)
+        readinto = getattr(src, 'readinto', None)
+        filled = 0
+        while filled < count:
+            if readinto is not None:
+                nbytes = readinto(view[filled:count])
+            else:
+                data = src.read(count - filled)
+                nbytes = len(data)
+                view[filled:filled + nbytes] = data
+            if not nbytes:
+                break
+            filled += nbytes
+        return filled
+
+    def _read(self, src, src_start, extents, free_buffers, filled):
+        """Read the allocated extents of src into free buffers."""
+        pos = 0
+        try:
+            for offset, length, allocated in extents:
+                if not allocated:
+                    filled.put((offset, length, None, None))
+                    continue
+
+                end = offset + length
+                while offset < end:
+                    buf = free_buffers.get()
+                    count = min(self.chunk_size, end - offset)
+                    if offset != pos:
+                        src.seek(src_start + offset)
+                    before = time.time()
+                    nbytes = tpool.execute(self._fill, src, buf, count)
+                    filled.put((offset, nbytes, buf, time.time() - before))
+                    offset += nbytes
+                    pos = offset
+                    if nbytes < count:
+                        # Short source, nothing more to read.
+                        return
+        finally:
+            filled.put(None)
+
+    def _write_hole(self, dest, dest_offset, length, dest_zeroed):
+        """Make length bytes at dest_offset of dest read back as zeros."""
+        if dest_zeroed or self._punch_hole(dest, dest_offset, length):
+            dest.seek(dest_offset + length)
+            return
+
+        zeros = bytearray(min(self.chunk_size, length))
+        end = dest_offset + length
+        while dest_offset < end:
+            count = min(len(zeros), end - dest_offset)
+            tpool.execute(dest.write, buffer(zeros, 0, count))
+            dest_offset += count
+
+    @staticmethod
+    def _punch_hole(dest, dest_offset, length):
+        try:
+            fileno = dest.fileno()
+        except (AttributeError, IOError):
+            return False
+
+        # Anything still buffered must reach the file before the hole is
+        # punched behind it.
+        dest.flush()
+        return utils.punch_hole(fileno, dest_offset, length)
+
+    def transfer(self, src, dest, length, dest_zeroed=False, progress=None):
+        """Copy length bytes from the current offset of src to dest.
+
+        Returns the number of unallocated bytes that were not read.
+        """
+        src_start = src.tell()
+        dest_start = dest.tell()
+        extents = self._get_extents(src, src_start, length)
+
+        free_buffers = queue.Queue()
+        buf_size = min(self.chunk_size, length)
+        for i in xrange(self.num_buffers):
+            free_buffers.put(bytearray(buf_size))
+        filled = queue.Queue()
+
+        reader = eventlet.spawn(self._read, src, src_start, extents,
+                                free_buffers, filled)
+        try:
+            pos = 0
+            skipped = 0
+            while True:
+                item = filled.get()
+                if item is None:
+                    break
+
+                offset, count, buf, latency = item
+                if offset != pos:
+                    dest.seek(dest_start + offset)
+                if buf is None:
+                    self._write_hole(dest, dest_start + offset, count,
+                                     dest_zeroed)
+                    skipped += count
+                    if progress:
+                        progress(count, 0)
+                else:
+                    before = time.time()
+                    tpool.execute(dest.write, buffer(buf, 0, count))
+                    free_buffers.put(buf)
+                    if progress:
+                        progress(count, count,
+                                 latency + time.time() - before)
+                pos = offset + count
+
+            # Re-raises any error hit by the reader
+            reader.wait()
+        finally:
+            reader.kill()
+
+        dest.flush()
+        return skipped
+
+
 class CephBackupDriver(BackupDriver):
     """Backup up Cinder volumes to Ceph Object Store.
 
@@ -208,38 +387,27 @@ class CephBackupDriver(BackupDriver):
                 raise exception.InvalidParameterValue(msg)
             return self._utf8("volume-%s.backup.%s" % (volume_id, backup_id))
 
-    def _transfer_data(self, src, src_name, dest, dest_name, length):
-        """Transfer data between files (Python IO objects)."""
+    def _transfer_data(self, src, src_name, dest, dest_name, length,
+                       dest_zeroed=False, progress=None):
+        """Transfer data between files (Python IO objects).
+
+        dest_zeroed should be True if the destination is known to read back
+        zeros, in which case unallocated source extents are not written.
+        progress is an optional BackupProgress to report the transfer to.
+        """
         LOG.debug(_("transferring data between '%(src)s' and '%(dest)s'") %
                   {'src': src_name, 'dest': dest_name})
 
-        chunks = int(length / self.chunk_size)
-        LOG.debug(_("%(chunks)s chunks of %(bytes)s bytes to be transferred") %
-                  {'chunks': chunks, 'bytes': self.chunk_size})
-
-        for chunk in xrange(0, chunks):
-            before = time.time()
-            data = src.read(self.chunk_size)
-            dest.write(data)
-            dest.flush()
-            delta = (time.time() - before)
-            rate = (self.chunk_size / delta) / 1024
-            LOG.debug((_("transferred chunk %(chunk)s of %(chunks)s "
-                         "(%(rate)dK/s)") %
-                       {'chunk': chunk, 'chunks': chunks,
-                        'rate': rate}))
-
-            # yield to any other pending backups
-            eventlet.sleep(0)
-
-        rem = int(length % self.chunk_size)
-        if rem:
-            LOG.debug(_("transferring remaining %s bytes") % (rem))
-            data = src.read(rem)
-            dest.write(data)
-            dest.flush()
-            # yield to any other pending backups
-            eventlet.sleep(0)
+        mover = DataMover(self.chunk_size)
+        before = time.time()
+        skipped = mover.transfer(src, dest, length, dest_zeroed=dest_zeroed,
+                                 progress=progress and progress.update)
+        delta = time.time() - before
+        rate = (length / delta) / 1024 if delta else 0
+        LOG.debug(_("transferred %(bytes)s bytes (%(skipped)s unallocated) "
+                    "in %(delta).4fs (%(rate)dK/s)") %
+                  {'bytes': length, 'skipped': skipped, 'delta': delta,
+                   'rate': rate})
 
     def _create_base_image(self, name, size, rados_client):
         """Create a base backup image.
@@ -553,8 +721,11 @@ class CephBackupDriver(BackupDriver):
                                                         self._ceph_backup_user,
                                                         self._ceph_backup_conf)
                 rbd_fd = drivers.rbd.RBDImageIOWrapper(rbd_meta)
+                progress = self._get_progress(backup_id, length)
                 self._transfer_data(src_volume, src_name, rbd_fd, backup_name,
-                                    length)
+                                    length, dest_zeroed=True,
+                                    progress=progress)
+                progress.finish()
             finally:
                 dest_rbd.close()
 
@@ -713,8 +884,10 @@ class CephBackupDriver(BackupDriver):
                                                         self._ceph_backup_user,
                                                         self._ceph_backup_conf)
                 rbd_fd = drivers.rbd.RBDImageIOWrapper(rbd_meta)
+                progress = self._get_progress(backup_id, length)
                 self._transfer_data(rbd_fd, backup_name, dest_file, dest_name,
-                                    length)
+                                    length, progress=progress)
+                progress.finish()
             finally:
                 src_rbd.close()
 
@@ -27,23 +27,63 @@
                                     failed Swift operations (default: 10).
 :backup_compression_algorithm: Compression algorithm to use for volume
                                backups. Supported options are:
-                               None (to disable), zlib and bz2 (default: zlib)
+                               None (to disable), zlib, bz2 and, when the
+                               python libraries are installed, lz4 and zstd
+                               (default: zlib)
+:backup_compression_level: Compression level passed to the compression
+                           algorithm, clamped to the range it supports
+                           (zlib 0-9, bz2 1-9, lz4 0-16, zstd 1-22).
+                           None to use its default (default: None).
+:backup_swift_upload_concurrency: The number of Swift objects uploaded in
+                                  parallel for each backup (default: 1).
+:backup_swift_compress_concurrency: The number of chunks compressed and
+                                    hashed in parallel native threads
+                                    (default: 1).
+:backup_swift_max_chunks_in_flight: The maximum number of chunks held in
+                                    memory by the parallel upload pipeline
+                                    (default: 4).
+:backup_swift_dedup: Store chunks once per Swift account under their
+                     content hash and share them between backups
+                     (default: False).
+:backup_swift_dedup_container: The Swift container holding deduplicated
+                               chunks (default: volumebackups_chunks).
+:backup_swift_restore_concurrency: The number of objects downloaded and
+                                   decompressed ahead of the volume writes
+                                   during restore (default: 1).
+:backup_swift_restore_fsync_interval: The number of objects written between
+                                      fsync calls during restore
+                                      (default: 1).
+:backup_swift_delete_concurrency: The number of objects deleted in parallel
+                                  when a backup is deleted (default: 1).
+:backup_swift_bulk_delete: Delete backup objects through the Swift bulk
+                           delete middleware when the cluster advertises
+                           it (default: True).
 """
 
+import collections
 import hashlib
 import httplib
 import json
 import os
 import socket
 import StringIO
+import time
+import urllib
+import uuid
 
 import eventlet
+from eventlet import pools
+from eventlet import semaphore
+from eventlet import tpool
 from oslo.config import cfg
 
+from cinder.backup import compression
 from cinder.backup.driver import BackupDriver
 from cinder import exception
+from cinder.openstack.common import excutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import timeutils
+from cinder import utils
 from swiftclient import client as swift
 
 
@@ -77,33 +117,114 @@ swiftbackup_service_opts = [
     cfg.StrOpt('backup_compression_algorithm',
                default='zlib',
                help='Compression algorithm (None to disable)'),
+    cfg.IntOpt('backup_compression_level',
+               default=None,
+               help='Compression level of the compression algorithm, '
+                    'clamped to the range the algorithm supports (None to '
+                    'use the algorithm default)'),
+    cfg.IntOpt('backup_swift_upload_concurrency',
+               default=1,
+               help='The number of Swift objects uploaded in parallel for '
+                    'each backup'),
+    cfg.IntOpt('backup_swift_compress_concurrency',
+               default=1,
+               help='The number of backup chunks compressed and hashed in '
+                    'parallel native threads'),
+    cfg.IntOpt('backup_swift_max_chunks_in_flight',
+               default=4,
+               help='The maximum number of backup chunks held in memory by '
+                    'the parallel upload pipeline'),
+    cfg.BoolOpt('backup_swift_dedup',
+                default=False,
+                help='Store backup chunks once per Swift account, keyed by '
+                     'their content hash, and share them between backups'),
+    cfg.StrOpt('backup_swift_dedup_container',
+               default='volumebackups_chunks',
+               help='The Swift container holding deduplicated backup '
+                    'chunks'),
+    cfg.IntOpt('backup_swift_restore_concurrency',
+               default=1,
+               help='The number of Swift objects downloaded and '
+                    'decompressed ahead of the volume writes during restore'),
+    cfg.IntOpt('backup_swift_restore_fsync_interval',
+               default=1,
+               help='The number of Swift objects written to the volume '
+                    'between fsync calls during restore'),
+    cfg.IntOpt('backup_swift_delete_concurrency',
+               default=1,
+               help='The number of Swift objects deleted in parallel when a '
+                    'backup is deleted'),
+    cfg.BoolOpt('backup_swift_bulk_delete',
+                default=True,
+                help='Delete backup objects through the Swift bulk delete '
+                     'middleware when the cluster advertises it'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(swiftbackup_service_opts)
 
 
+def _get_swift_info(url, token, http_conn=None):
+    """Return the capabilities advertised by the Swift cluster.
+
+    Called through SwiftBackupDriver._swift_request(), so url is the storage
+    URL of the account; the capabilities are served next to its version.
+    """
+    parsed, conn = http_conn
+    path = '%s/info' % parsed.path.rstrip('/').rsplit('/', 2)[0]
+    conn.request('GET', path, '', {})
+    resp = conn.getresponse()
+    body = resp.read()
+    if resp.status < 200 or resp.status >= 300:
+        raise swift.ClientException('Info GET failed', http_path=path,
+                                    http_status=resp.status,
+                                    http_reason=resp.reason)
+    return json.loads(body)
+
+
+def _bulk_delete_objects(url, token, paths, http_conn=None):
+    """Delete the given /container/object paths in a single request.
+
+    Called through SwiftBackupDriver._swift_request().
+    """
+    parsed, conn = http_conn
+    path = '%s?bulk-delete' % parsed.path
+    body = '\n'.join(urllib.quote(object_path) for object_path in paths)
+    headers = {'X-Auth-Token': token,
+               'Content-Type': 'text/plain',
+               'Accept': 'application/json'}
+    conn.request('DELETE', path, body, headers)
+    resp = conn.getresponse()
+    body = resp.read()
+    if resp.status < 200 or resp.status >= 300:
+        raise swift.ClientException('Bulk DELETE failed', http_path=path,
+                                    http_status=resp.status,
+                                    http_reason=resp.reason)
+    return json.loads(body)
+
+
+class SwiftConnectionPool(pools.Pool):
+    """Pool of Swift connections shared by concurrent workers."""
+
+    def __init__(self, driver, max_size):
+        self.driver = driver
+        super(SwiftConnectionPool, self).__init__(max_size=max_size)
+
+    def create(self):
+        return self.driver._create_connection()
+
+
 class SwiftBackupDriver(BackupDriver):
     """Provides backup, restore and delete of backup objects within Swift."""
 
-    DRIVER_VERSION = '1.0.0'
-    DRIVER_VERSION_MAPPING = {'1.0.0': '_restore_v1'}
+    DRIVER_VERSION = '1.1.0'
+    SUPPORTS_INCREMENTAL = True
+    DRIVER_VERSION_MAPPING = {'1.0.0': '_restore_v1',
+                              '1.1.0': '_restore_v1_1'}
 
     def _get_compressor(self, algorithm):
-        try:
-            if algorithm.lower() in ('none', 'off', 'no'):
-                return None
-            elif algorithm.lower() in ('zlib', 'gzip'):
-                import zlib as compressor
-                return compressor
-            elif algorithm.lower() in ('bz2', 'bzip2'):
-                import bz2 as compressor
-                return compressor
-        except ImportError:
-            pass
-
-        err = _('unsupported compression algorithm: %s') % algorithm
-        raise ValueError(unicode(err))
+        return compression.get_compressor(algorithm,
+                                          CONF.backup_compression_level)
 
     def __init__(self, context, db_driver=None):
         self.context = context
@@ -113,8 +234,39 @@ class SwiftBackupDriver(BackupDriver):
         self.data_block_size_bytes = CONF.backup_swift_object_size
         self.swift_attempts = CONF.backup_swift_retry_attempts
         self.swift_backoff = CONF.backup_swift_retry_backoff
-        self.compressor = \
-            self._get_compressor(CONF.backup_compression_algorithm)
+        self._set_compression(CONF.backup_compression_algorithm)
+        self.upload_concurrency = max(
+            CONF.backup_swift_upload_concurrency, 1)
+        self.compress_concurrency = max(
+            CONF.backup_swift_compress_concurrency, 1)
+        self.max_chunks_in_flight = max(
+            CONF.backup_swift_max_chunks_in_flight, 1)
+        self.restore_concurrency = max(
+            CONF.backup_swift_restore_concurrency, 1)
+        self.restore_fsync_interval = max(
+            CONF.backup_swift_restore_fsync_interval, 1)
+        self.dedup = CONF.backup_swift_dedup
+        self.dedup_container = CONF.backup_swift_dedup_container
+        # Stored chunks can only be shared between backups written to the
+        # same Swift account
+        if CONF.backup_swift_auth == 'single_user':
+            self.dedup_project_id = None
+        else:
+            self.dedup_project_id = self.context.project_id
+        self.delete_concurrency = max(
+            CONF.backup_swift_delete_concurrency, 1)
+        self.bulk_delete = CONF.backup_swift_bulk_delete
+        self._bulk_delete_max = None
+        self.conn = self._create_connection()
+        self._zero_chunk = ''
+
+        super(SwiftBackupDriver, self).__init__(db_driver)
+
+    def _set_compression(self, algorithm):
+        self.compressor = self._get_compressor(algorithm)
+        self.compression_algorithm = algorithm.lower()
+
+    def _create_connection(self):
         LOG.debug('Connect to %s in "%s" mode' % (CONF.backup_swift_url,
                                                   CONF.backup_swift_auth))
         if CONF.backup_swift_auth == 'single_user':
@@ -123,18 +275,16 @@ class SwiftBackupDriver(BackupDriver):
                             "but %(param)s not set")
                           % {'param': 'backup_swift_user'})
                 raise exception.ParameterNotFound(param='backup_swift_user')
-            self.conn = swift.Connection(authurl=CONF.backup_swift_url,
-                                         user=CONF.backup_swift_user,
-                                         key=CONF.backup_swift_key,
-                                         retries=self.swift_attempts,
-                                         starting_backoff=self.swift_backoff)
+            return swift.Connection(authurl=CONF.backup_swift_url,
+                                    user=CONF.backup_swift_user,
+                                    key=CONF.backup_swift_key,
+                                    retries=self.swift_attempts,
+                                    starting_backoff=self.swift_backoff)
         else:
-            self.conn = swift.Connection(retries=self.swift_attempts,
-                                         preauthurl=self.swift_url,
-                                         preauthtoken=self.context.auth_token,
-                                         starting_backoff=self.swift_backoff)
-
-        super(SwiftBackupDriver, self).__init__(db_driver)
+            return swift.Connection(retries=self.swift_attempts,
+                                    preauthurl=self.swift_url,
+                                    preauthtoken=self.context.auth_token,
+                                    starting_backoff=self.swift_backoff)
 
     def _check_container_exists(self, container):
         LOG.debug(_('_check_container_exists: container: %s') % container)
@@ -194,6 +344,7 @@ class SwiftBackupDriver(BackupDriver):
         metadata = {}
         metadata['version'] = self.DRIVER_VERSION
         metadata['backup_id'] = backup['id']
+        metadata['parent_id'] = backup.get('parent_id')
         metadata['volume_id'] = volume_id
         metadata['backup_name'] = backup['display_name']
         metadata['backup_description'] = backup['display_description']
@@ -233,6 +384,9 @@ class SwiftBackupDriver(BackupDriver):
             err = _('volume size %d is invalid.') % volume['size']
             raise exception.InvalidVolume(reason=err)
 
+        if backup.get('compression'):
+            self._set_compression(backup['compression'])
+
         try:
             container = self._create_container(self.context, backup)
         except socket.error as err:
@@ -254,49 +408,119 @@ class SwiftBackupDriver(BackupDriver):
                       'object_prefix': object_prefix,
                       'availability_zone': availability_zone,
                   })
-        object_meta = {'id': 1, 'list': [], 'prefix': object_prefix}
+        if self.dedup:
+            try:
+                if not self._check_container_exists(self.dedup_container):
+                    self.conn.put_container(self.dedup_container)
+            except socket.error as err:
+                raise exception.SwiftConnectionFailed(reason=str(err))
+        object_meta = {'id': 1, 'list': [], 'prefix': object_prefix,
+                       'parent_objects': self._parent_objects(backup,
+                                                              container),
+                       'dedup_refs': [],
+                       'progress': self._get_progress(backup_id,
+                                                      volume_size_bytes)}
         return object_meta, container
 
-    def _backup_chunk(self, backup, container, data, data_offset, object_meta):
-        """Backup data chunk based on the object metadata and offset"""
-        object_prefix = object_meta['prefix']
-        object_list = object_meta['list']
+    def _parent_objects(self, backup, container):
+        """Map the chunks of the parent of an incremental backup.
+
+        Returns a dict keyed by chunk offset of the objects listed in the
+        parent backup metadata, or an empty dict for a full backup.
+        """
+        parent_id = backup.get('parent_id')
+        if parent_id is None:
+            return {}
+        parent = self.db.backup_get(self.context, parent_id)
+        if parent['container'] != container:
+            err = (_('parent backup %(parent_id)s is not stored in container '
+                     '%(container)s') %
+                   {'parent_id': parent_id, 'container': container})
+            raise exception.InvalidBackup(reason=err)
+        try:
+            metadata = self._read_metadata(parent)
+        except socket.error as err:
+            raise exception.SwiftConnectionFailed(reason=str(err))
+        parent_objects = {}
+        for obj in metadata['objects']:
+            object_name = obj.keys()[0]
+            parent_objects[obj[object_name]['offset']] = obj
+        LOG.debug(_('incremental backup of %(backup_id)s based on parent '
+                    '%(parent_id)s with %(count)d objects') %
+                  {'backup_id': backup['id'], 'parent_id': parent_id,
+                   'count': len(parent_objects)})
+        return parent_objects
+
+    @staticmethod
+    def _unchanged_object(object_meta, data_offset, data_length, sha256):
+        """Return the parent object for a chunk if it did not change."""
+        obj = object_meta['parent_objects'].get(data_offset)
+        if obj is None:
+            return None
+        object_name, chunk = obj.items()[0]
+        if chunk['length'] != data_length or chunk.get('sha256') != sha256:
+            return None
+        # References on stored chunks stay with the backup that took them
+        chunk = dict(chunk)
+        chunk.pop('dedup', None)
+        return {object_name: chunk}
+
+    def _next_object_name(self, object_meta):
+        """Reserve the next Swift object name of the backup."""
         object_id = object_meta['id']
-        object_name = '%s-%05d' % (object_prefix, object_id)
-        obj = {}
-        obj[object_name] = {}
-        obj[object_name]['offset'] = data_offset
-        obj[object_name]['length'] = len(data)
-        LOG.debug(_('reading chunk of data from volume'))
+        object_name = '%s-%05d' % (object_meta['prefix'], object_id)
+        object_meta['id'] = object_id + 1
+        return object_name
+
+    @staticmethod
+    def _digest(data):
+        """Return the SHA-256 digest of the uncompressed chunk data."""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def _compress_and_hash(compressor, data):
+        """Compress a chunk and return it along with its MD5 digest.
+
+        This is CPU bound and may run in a native thread, so it must not
+        log or touch any green primitives.
+        """
+        if compressor is not None:
+            data = compressor.compress(data)
+        return data, hashlib.md5(data).hexdigest()
+
+    def _log_compression(self, data_size_bytes, comp_size_bytes):
         if self.compressor is not None:
-            algorithm = CONF.backup_compression_algorithm.lower()
-            obj[object_name]['compression'] = algorithm
-            data_size_bytes = len(data)
-            data = self.compressor.compress(data)
-            comp_size_bytes = len(data)
             LOG.debug(_('compressed %(data_size_bytes)d bytes of data '
                         'to %(comp_size_bytes)d bytes using '
                         '%(algorithm)s') %
                       {
                           'data_size_bytes': data_size_bytes,
                           'comp_size_bytes': comp_size_bytes,
-                          'algorithm': algorithm,
+                          'algorithm': self.compression_algorithm,
                       })
         else:
             LOG.debug(_('not compressing data'))
-            obj[object_name]['compression'] = 'none'
 
+    def _chunk_metadata(self, data, data_offset):
+        """Return the metadata recorded in the manifest for a chunk."""
+        chunk = {'offset': data_offset, 'length': len(data)}
+        if self.compressor is not None:
+            chunk['compression'] = self.compression_algorithm
+        else:
+            chunk['compression'] = 'none'
+        return chunk
+
+    def _put_chunk(self, conn, container, object_name, data, md5):
+        """Upload a prepared chunk to Swift and verify its MD5."""
         reader = StringIO.StringIO(data)
         LOG.debug(_('About to put_object'))
         try:
-            etag = self.conn.put_object(container, object_name, reader,
-                                        content_length=len(data))
+            etag = conn.put_object(container, object_name, reader,
+                                   content_length=len(data))
         except socket.error as err:
             raise exception.SwiftConnectionFailed(reason=str(err))
         LOG.debug(_('swift MD5 for %(object_name)s: %(etag)s') %
                   {'object_name': object_name, 'etag': etag, })
-        md5 = hashlib.md5(data).hexdigest()
-        obj[object_name]['md5'] = md5
         LOG.debug(_('backup MD5 for %(object_name)s: %(md5)s') %
                   {'object_name': object_name, 'md5': md5})
         if etag != md5:
@@ -304,17 +528,226 @@ class SwiftBackupDriver(BackupDriver):
                     'swift %(etag)s is not the same as MD5 of object sent '
                     'to swift %(md5)s') % {'etag': etag, 'md5': md5}
             raise exception.InvalidBackup(reason=err)
-        object_list.append(obj)
-        object_id += 1
-        object_meta['list'] = object_list
-        object_meta['id'] = object_id
+
+    def _upload_chunk(self, conn, container, object_meta, object_name, data,
+                      data_offset, sha256, compress_sem=None):
+        """Compress, hash and upload a chunk and return its manifest entry.
+
+        In dedup mode the object name is derived from the chunk digest and
+        an already stored copy of the chunk is referenced instead of being
+        uploaded again.  When compress_sem is given, compression runs in a
+        native thread while holding it.
+        """
+        started = time.time()
+        if self.dedup:
+            obj = self._reference_dedup_chunk(object_meta, data_offset,
+                                              sha256)
+            if obj is not None:
+                LOG.debug(_('chunk at offset %s already stored, skipping '
+                            'upload') % data_offset)
+                object_meta['progress'].update(len(data), 0,
+                                               time.time() - started)
+                return obj
+            container = self.dedup_container
+            object_name = 'chunk_%s_%s' % (sha256, uuid.uuid4().hex)
+        chunk = self._chunk_metadata(data, data_offset)
+        chunk['sha256'] = sha256
+        data_size_bytes = len(data)
+        if compress_sem is None:
+            data, md5 = self._compress_and_hash(self.compressor, data)
+        else:
+            with compress_sem:
+                data, md5 = tpool.execute(self._compress_and_hash,
+                                          self.compressor, data)
+        self._log_compression(data_size_bytes, len(data))
+        self._put_chunk(conn, container, object_name, data, md5)
+        object_meta['progress'].update(data_size_bytes, len(data),
+                                       time.time() - started)
+        chunk['md5'] = md5
+        if self.dedup:
+            chunk['container'] = container
+            chunk['dedup'] = True
+            self.db.backup_chunk_create(self.context,
+                                        {'project_id': self.dedup_project_id,
+                                         'container': container,
+                                         'object_name': object_name,
+                                         'sha256': sha256,
+                                         'md5': md5,
+                                         'compression': chunk['compression'],
+                                         'length': chunk['length']})
+            object_meta['dedup_refs'].append((container, object_name))
+        return {object_name: chunk}
+
+    def _reference_dedup_chunk(self, object_meta, data_offset, sha256):
+        """Take a reference on a stored chunk with the given digest.
+
+        Returns the manifest entry pointing at the stored chunk, or None if
+        no chunk with that digest is stored yet.
+        """
+        stored = self.db.backup_chunk_ref(self.context,
+                                          self.dedup_project_id,
+                                          self.dedup_container, sha256)
+        if stored is None:
+            return None
+        object_meta['dedup_refs'].append((stored['container'],
+                                          stored['object_name']))
+        return {stored['object_name']: {'offset': data_offset,
+                                        'length': stored['length'],
+                                        'compression': stored['compression'],
+                                        'md5': stored['md5'],
+                                        'sha256': sha256,
+                                        'container': stored['container'],
+                                        'dedup': True}}
+
+    def _release_dedup_chunks(self, dedup_refs):
+        """Drop references on stored chunks and delete unreferenced ones.
+
+        dedup_refs is a list of (container, object name) tuples.
+        """
+        unreferenced = collections.defaultdict(list)
+        for container, object_name in dedup_refs:
+            chunk = self.db.backup_chunk_unref(self.context, container,
+                                               object_name)
+            if chunk is not None and chunk['refcount'] <= 0:
+                unreferenced[container].append(object_name)
+        for container, object_names in unreferenced.items():
+            self._delete_objects(container, object_names)
+
+    def _is_zero_chunk(self, data):
+        """Check whether a chunk only contains zeros."""
+        length = len(data)
+        if len(self._zero_chunk) < length:
+            self._zero_chunk = '\0' * length
+        if length == len(self._zero_chunk):
+            return data == self._zero_chunk
+        return data == self._zero_chunk[:length]
+
+    @staticmethod
+    def _hole_object(object_meta, data, data_offset):
+        """Return the manifest entry of a chunk that only contains zeros.
+
+        Holes are not uploaded to Swift; the entry only records their
+        position so that restore can recreate them.
+        """
+        object_name = '%s-zero-%d' % (object_meta['prefix'], data_offset)
+        return {object_name: {'offset': data_offset,
+                              'length': len(data),
+                              'compression': 'none',
+                              'hole': True}}
+
+    def _backup_chunk(self, backup, container, data, data_offset, object_meta):
+        """Backup data chunk based on the object metadata and offset"""
+        if self._is_zero_chunk(data):
+            LOG.debug(_('chunk at offset %s only contains zeros, skipping '
+                        'upload') % data_offset)
+            object_meta['list'].append(self._hole_object(object_meta, data,
+                                                         data_offset))
+            object_meta['progress'].update(len(data), 0)
+            eventlet.sleep(0)
+            return
+        sha256 = self._digest(data)
+        obj = self._unchanged_object(object_meta, data_offset, len(data),
+                                     sha256)
+        if obj is not None:
+            LOG.debug(_('chunk at offset %s unchanged since parent backup, '
+                        'skipping upload') % data_offset)
+            object_meta['list'].append(obj)
+            object_meta['progress'].update(len(data), 0)
+            eventlet.sleep(0)
+            return
+        object_name = None
+        if not self.dedup:
+            object_name = self._next_object_name(object_meta)
+        LOG.debug(_('reading chunk of data from volume'))
+        obj = self._upload_chunk(self.conn, container, object_meta,
+                                 object_name, data, data_offset, sha256)
+        object_meta['list'].append(obj)
         LOG.debug(_('Calling eventlet.sleep(0)'))
         eventlet.sleep(0)
 
+    def _backup_pipelined(self, backup, container, volume_file, object_meta):
+        """Backup the volume with overlapped read, compress and upload.
+
+        A single reader stage hashes each chunk, skips those that only
+        contain zeros or are unchanged since the parent backup and hands
+        the rest to compress-and-hash workers running in native threads
+        and then to upload workers drawing from a pool of Swift
+        connections.  The number of chunks
+        between the read and the completed upload is bounded by
+        backup_swift_max_chunks_in_flight.  The manifest is rebuilt in
+        offset order once every upload has completed.
+        """
+        conn_pool = SwiftConnectionPool(self, self.upload_concurrency)
+        compress_sem = semaphore.Semaphore(self.compress_concurrency)
+        in_flight = semaphore.Semaphore(self.max_chunks_in_flight)
+        workers = eventlet.GreenPool(self.max_chunks_in_flight)
+        results = {}
+        errors = []
+        index = 0
+
+        def _process_chunk(index, object_name, data, data_offset, sha256):
+            try:
+                with conn_pool.item() as conn:
+                    results[index] = self._upload_chunk(
+                        conn, container, object_meta, object_name, data,
+                        data_offset, sha256, compress_sem=compress_sem)
+            except Exception as err:
+                errors.append(err)
+            finally:
+                in_flight.release()
+
+        while True:
+            in_flight.acquire()
+            if errors:
+                in_flight.release()
+                break
+            data = tpool.execute(volume_file.read, self.data_block_size_bytes)
+            data_offset = volume_file.tell()
+            if data == '':
+                in_flight.release()
+                break
+            if self._is_zero_chunk(data):
+                LOG.debug(_('chunk at offset %s only contains zeros, '
+                            'skipping upload') % data_offset)
+                results[index] = self._hole_object(object_meta, data,
+                                                   data_offset)
+                object_meta['progress'].update(len(data), 0)
+                in_flight.release()
+                index += 1
+                continue
+            sha256 = tpool.execute(self._digest, data)
+            obj = self._unchanged_object(object_meta, data_offset, len(data),
+                                         sha256)
+            if obj is not None:
+                LOG.debug(_('chunk at offset %s unchanged since parent '
+                            'backup, skipping upload') % data_offset)
+                results[index] = obj
+                object_meta['progress'].update(len(data), 0)
+                in_flight.release()
+            else:
+                object_name = None
+                if not self.dedup:
+                    object_name = self._next_object_name(object_meta)
+                workers.spawn_n(_process_chunk, index, object_name, data,
+                                data_offset, sha256)
+            index += 1
+        workers.waitall()
+
+        if errors:
+            raise errors[0]
+        object_meta['list'].extend(results[index]
+                                   for index in sorted(results))
+
     def _finalize_backup(self, backup, container, object_meta):
         """Finalize the backup by updating its metadata on Swift"""
         object_list = object_meta['list']
-        object_id = object_meta['id']
+        object_count = object_meta['id']
+        if self.dedup:
+            # Stored chunks are not named after the backup, count those the
+            # backup references instead
+            object_count = sum(1 for obj in object_list
+                               for chunk in obj.itervalues()
+                               if not chunk.get('hole'))
         try:
             self._write_metadata(backup,
                                  backup['volume_id'],
@@ -323,26 +756,42 @@ class SwiftBackupDriver(BackupDriver):
         except socket.error as err:
             raise exception.SwiftConnectionFailed(reason=str(err))
         self.db.backup_update(self.context, backup['id'],
-                              {'object_count': object_id})
+                              {'object_count': object_count})
+        object_meta['progress'].finish()
         LOG.debug(_('backup %s finished.') % backup['id'])
 
     def backup(self, backup, volume_file):
         """Backup the given volume to swift using the given backup metadata."""
         object_meta, container = self._prepare_backup(backup)
-        while True:
-            data = volume_file.read(self.data_block_size_bytes)
-            data_offset = volume_file.tell()
-            if data == '':
-                break
-            self._backup_chunk(backup, container, data,
-                               data_offset, object_meta)
-        self._finalize_backup(backup, container, object_meta)
+        try:
+            if self.upload_concurrency > 1 or self.compress_concurrency > 1:
+                self._backup_pipelined(backup, container, volume_file,
+                                       object_meta)
+            else:
+                while True:
+                    data = volume_file.read(self.data_block_size_bytes)
+                    data_offset = volume_file.tell()
+                    if data == '':
+                        break
+                    self._backup_chunk(backup, container, data,
+                                       data_offset, object_meta)
+            self._finalize_backup(backup, container, object_meta)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                if object_meta['dedup_refs']:
+                    self._release_dedup_refs_on_error(object_meta)
+
+    def _release_dedup_refs_on_error(self, object_meta):
+        try:
+            self._release_dedup_chunks(object_meta['dedup_refs'])
+        except Exception:
+            LOG.exception(_('failed to release stored chunks referenced by '
+                            'the failed backup'))
 
     def _restore_v1(self, backup, volume_id, metadata, volume_file):
         """Restore a v1 swift volume backup from swift."""
         backup_id = backup['id']
         LOG.debug(_('v1 swift volume backup restore of %s started'), backup_id)
-        container = backup['container']
         metadata_objects = metadata['objects']
         metadata_object_names = sum((obj.keys() for obj in metadata_objects),
                                     [])
@@ -356,49 +805,201 @@ class SwiftBackupDriver(BackupDriver):
                     'swift does not match object list stored in metadata')
             raise exception.InvalidBackup(reason=err)
 
-        for metadata_object in metadata_objects:
-            object_name = metadata_object.keys()[0]
-            LOG.debug(_('restoring object from swift. backup: %(backup_id)s, '
-                        'container: %(container)s, swift object name: '
-                        '%(object_name)s, volume: %(volume_id)s') %
-                      {
-                          'backup_id': backup_id,
-                          'container': container,
-                          'object_name': object_name,
-                          'volume_id': volume_id,
-                      })
-            try:
-                (resp, body) = self.conn.get_object(container, object_name)
-            except socket.error as err:
-                raise exception.SwiftConnectionFailed(reason=str(err))
-            compression_algorithm = metadata_object[object_name]['compression']
-            decompressor = self._get_compressor(compression_algorithm)
-            if decompressor is not None:
-                LOG.debug(_('decompressing data using %s algorithm') %
-                          compression_algorithm)
-                decompressed = decompressor.decompress(body)
-                volume_file.write(decompressed)
+        self._restore_objects(backup, volume_id, metadata_objects,
+                              volume_file)
+        LOG.debug(_('v1 swift volume backup restore of %s finished'),
+                  backup_id)
+
+    def _restore_v1_1(self, backup, volume_id, metadata, volume_file):
+        """Restore a v1.1 swift volume backup from swift.
+
+        The metadata of an incremental backup lists the objects of its
+        parent backups for the chunks that did not change, so only the
+        objects carrying this backup's prefix are checked against the
+        container listing.  Chunks that only contain zeros are recorded as
+        holes and have no object in Swift.
+        """
+        backup_id = backup['id']
+        LOG.debug(_('v1.1 swift volume backup restore of %(backup_id)s '
+                    'started, parent: %(parent_id)s') %
+                  {'backup_id': backup_id,
+                   'parent_id': metadata.get('parent_id')})
+        metadata_objects = metadata['objects']
+        object_prefix = backup['service_metadata']
+        metadata_object_names = [name for obj in metadata_objects
+                                 for name, chunk in obj.items()
+                                 if name.startswith(object_prefix) and
+                                 not chunk.get('hole')]
+        prune_list = [self._metadata_filename(backup)]
+        swift_object_names = [swift_object_name for swift_object_name in
+                              self._generate_object_names(backup)
+                              if swift_object_name not in prune_list]
+        if sorted(swift_object_names) != sorted(metadata_object_names):
+            err = _('restore_backup aborted, actual swift object list in '
+                    'swift does not match object list stored in metadata')
+            raise exception.InvalidBackup(reason=err)
+
+        self._restore_objects(backup, volume_id, metadata_objects,
+                              volume_file)
+        LOG.debug(_('v1.1 swift volume backup restore of %s finished'),
+                  backup_id)
+
+    def _fetch_object(self, conn, container, object_name, chunk):
+        """Download a swift object of the backup.
+
+        Returns the decompressed data and the size of the object in swift.
+        """
+        try:
+            (resp, body) = conn.get_object(container, object_name)
+        except socket.error as err:
+            raise exception.SwiftConnectionFailed(reason=str(err))
+        except swift.ClientException as error:
+            if error.http_status != httplib.NOT_FOUND:
+                raise
+            err = (_('restore_backup aborted, swift object '
+                     '%(object_name)s referenced by the backup metadata '
+                     'does not exist') % {'object_name': object_name})
+            raise exception.InvalidBackup(reason=err)
+        stored_bytes = len(body)
+        compression_algorithm = chunk['compression']
+        decompressor = self._get_compressor(compression_algorithm)
+        if decompressor is not None:
+            LOG.debug(_('decompressing data using %s algorithm') %
+                      compression_algorithm)
+            if self.restore_concurrency > 1:
+                body = tpool.execute(decompressor.decompress, body)
             else:
-                volume_file.write(body)
+                body = decompressor.decompress(body)
+        return body, stored_bytes
+
+    def _fetch_pooled_object(self, conn_pool, container, object_name, chunk):
+        with conn_pool.item() as conn:
+            return self._fetch_object(conn, container, object_name, chunk)
+
+    def _sync_volume_file(self, volume_file):
+        """Flush the volume file and fsync it to the underlying device."""
+        volume_file.flush()
+
+        # Be tolerant to IO implementations that do not support fileno()
+        try:
+            fileno = volume_file.fileno()
+        except IOError:
+            LOG.info("volume_file does not support fileno() so skipping "
+                     "fsync()")
+        else:
+            os.fsync(fileno)
+
+    def _restore_objects(self, backup, volume_id, metadata_objects,
+                         volume_file):
+        """Write the listed swift objects to the volume in order.
+
+        Up to backup_swift_restore_concurrency objects are downloaded and
+        decompressed ahead of the object being written, and the volume is
+        synced to disk every backup_swift_restore_fsync_interval objects.
+        """
+        backup_id = backup['id']
+        container = backup['container']
+        conn_pool = None
+        if self.restore_concurrency > 1:
+            conn_pool = SwiftConnectionPool(self, self.restore_concurrency)
+        pending = collections.deque()
+        objects = iter(metadata_objects)
+        written = 0
+        progress = self._get_progress(backup_id,
+                                      backup['size'] * 1024 * 1024 * 1024)
 
+        def _fetch_next():
+            metadata_object = next(objects)
+            object_name = metadata_object.keys()[0]
+            chunk = metadata_object[object_name]
+            fetcher = None
+            if not chunk.get('hole'):
+                LOG.debug(_('restoring object from swift. backup: '
+                            '%(backup_id)s, container: %(container)s, '
+                            'swift object name: %(object_name)s, '
+                            'volume: %(volume_id)s') %
+                          {
+                              'backup_id': backup_id,
+                              'container': container,
+                              'object_name': object_name,
+                              'volume_id': volume_id,
+                          })
+                if conn_pool is not None:
+                    fetcher = eventlet.spawn(self._fetch_pooled_object,
+                                             conn_pool,
+                                             chunk.get('container', container),
+                                             object_name, chunk)
+            pending.append((object_name, chunk, fetcher, time.time()))
+
+        def _write_next():
+            object_name, chunk, fetcher, started = pending.popleft()
+            if chunk.get('hole'):
+                LOG.debug(_('restoring %(length)d bytes hole %(object_name)s '
+                            'to volume %(volume_id)s') %
+                          {'length': chunk['length'],
+                           'object_name': object_name,
+                           'volume_id': volume_id})
+                self._restore_hole(volume_file, chunk['length'])
+                progress.update(chunk['length'], 0)
+                return
+            if fetcher is None:
+                data, stored_bytes = self._fetch_object(
+                    self.conn, chunk.get('container', container),
+                    object_name, chunk)
+            else:
+                data, stored_bytes = fetcher.wait()
+            volume_file.write(data)
             # force flush every write to avoid long blocking write on close
             volume_file.flush()
+            progress.update(len(data), stored_bytes, time.time() - started)
 
-            # Be tolerant to IO implementations that do not support fileno()
-            try:
-                fileno = volume_file.fileno()
-            except IOError:
-                LOG.info("volume_file does not support fileno() so skipping "
-                         "fsync()")
-            else:
-                os.fsync(fileno)
+        try:
+            while True:
+                try:
+                    while len(pending) < self.restore_concurrency:
+                        _fetch_next()
+                except StopIteration:
+                    if not pending:
+                        break
+                _write_next()
+                written += 1
+                if written % self.restore_fsync_interval == 0:
+                    self._sync_volume_file(volume_file)
 
-            # Restoring a backup to a volume can take some time. Yield so other
-            # threads can run, allowing for among other things the service
-            # status to be updated
-            eventlet.sleep(0)
-        LOG.debug(_('v1 swift volume backup restore of %s finished'),
-                  backup_id)
+                # Restoring a backup to a volume can take some time. Yield so
+                # other threads can run, allowing for among other things the
+                # service status to be updated
+                eventlet.sleep(0)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for object_name, chunk, fetcher, started in pending:
+                    if fetcher is not None:
+                        fetcher.kill()
+        if written % self.restore_fsync_interval:
+            self._sync_volume_file(volume_file)
+        progress.finish()
+
+    def _restore_hole(self, volume_file, length):
+        """Recreate a range of zeros at the current volume file position.
+
+        The range is punched out of the target when it supports it, which
+        leaves it reading back as zeros without writing them, otherwise the
+        zeros are written out.
+        """
+        try:
+            fileno = volume_file.fileno()
+        except (AttributeError, IOError):
+            fileno = None
+        if fileno is not None:
+            volume_file.flush()
+            offset = volume_file.tell()
+            if utils.punch_hole(fileno, offset, length):
+                volume_file.seek(length, os.SEEK_CUR)
+                return
+        if len(self._zero_chunk) < length:
+            self._zero_chunk = '\0' * length
+        volume_file.write(buffer(self._zero_chunk, 0, length))
+        volume_file.flush()
 
     def restore(self, backup, volume_id, volume_file):
         """Restore the given volume backup from swift."""
@@ -431,38 +1032,185 @@ class SwiftBackupDriver(BackupDriver):
         LOG.debug(_('restore %(backup_id)s to %(volume_id)s finished.') %
                   {'backup_id': backup_id, 'volume_id': volume_id})
 
+    def _backup_object_names(self, backup, metadata):
+        """Return the names of the objects owned by the backup.
+
+        These are the objects of the backup metadata carrying the backup's
+        prefix, so neither the chunks shared with parent backups nor
+        deduplicated chunks.  None is returned if the backup has no prefix
+        recorded.
+        """
+        object_prefix = backup['service_metadata']
+        if not object_prefix:
+            return None
+        return [object_name for obj in metadata['objects']
+                for object_name, chunk in obj.items()
+                if object_name.startswith(object_prefix) and
+                not chunk.get('hole') and not chunk.get('dedup')]
+
+    def _swift_request(self, func, *args):
+        """Make a request the swiftclient Connection has no method for.
+
+        func is called as func(url, token, *args, http_conn=http_conn) with
+        the storage URL and token of the connection and a new HTTP
+        connection to the storage URL.  Only public swiftclient calls are
+        used, the request is not retried.
+        """
+        url, token = self.conn.url, self.conn.token
+        if not url or not token:
+            url, token = self.conn.get_auth()
+        return func(url, token, *args, http_conn=swift.http_connection(url))
+
+    def _bulk_delete_limit(self):
+        """Return the maximum number of objects deleted by one request.
+
+        Returns 0 if bulk deletes are disabled or the Swift cluster does
+        not advertise them.
+        """
+        if self._bulk_delete_max is None:
+            self._bulk_delete_max = 0
+            if self.bulk_delete:
+                try:
+                    info = self._swift_request(_get_swift_info)
+                except Exception:
+                    LOG.debug(_('could not get the swift capabilities, not '
+                                'using bulk delete'))
+                else:
+                    bulk_delete = info.get('bulk_delete')
+                    if bulk_delete is not None:
+                        self._bulk_delete_max = bulk_delete.get(
+                            'max_deletes_per_request', 10000)
+        return self._bulk_delete_max
+
+    def _bulk_delete(self, container, object_names):
+        """Delete objects through the Swift bulk delete middleware.
+
+        Returns False if the request was rejected, in which case nothing
+        is known to have been deleted.
+        """
+        paths = ['/%s/%s' % (container, object_name)
+                 for object_name in object_names]
+        try:
+            result = self._swift_request(_bulk_delete_objects, paths)
+        except socket.error as err:
+            raise exception.SwiftConnectionFailed(reason=str(err))
+        except swift.ClientException:
+            LOG.warn(_('swift bulk delete failed, deleting objects one by '
+                       'one'))
+            return False
+        for path, status in result.get('Errors', []):
+            LOG.warn(_('swift error %(status)s while deleting object '
+                       '%(path)s, continuing with delete') %
+                     {'status': status, 'path': path})
+        LOG.debug(_('bulk deleted %(deleted)s swift objects in container: '
+                    '%(container)s, %(not_found)s not found') %
+                  {'deleted': result.get('Number Deleted'),
+                   'container': container,
+                   'not_found': result.get('Number Not Found')})
+        return True
+
+    def _delete_object(self, conn, container, swift_object_name):
+        try:
+            conn.delete_object(container, swift_object_name)
+        except socket.error as err:
+            raise exception.SwiftConnectionFailed(reason=str(err))
+        except Exception:
+            LOG.warn(_('swift error while deleting object %s, '
+                       'continuing with delete') % swift_object_name)
+        else:
+            LOG.debug(_('deleted swift object: %(swift_object_name)s'
+                        ' in container: %(container)s') %
+                      {
+                          'swift_object_name': swift_object_name,
+                          'container': container
+                      })
+
+    def _delete_objects(self, container, swift_object_names):
+        """Delete the given objects from a container.
+
+        The objects are removed in bulk when the Swift cluster supports
+        it, otherwise backup_swift_delete_concurrency at a time.
+        """
+        max_deletes = self._bulk_delete_limit()
+        if max_deletes:
+            for i in xrange(0, len(swift_object_names), max_deletes):
+                batch = swift_object_names[i:i + max_deletes]
+                if not self._bulk_delete(container, batch):
+                    self._bulk_delete_max = 0
+                    swift_object_names = swift_object_names[i:]
+                    break
+            else:
+                return
+
+        if self.delete_concurrency > 1:
+            conn_pool = SwiftConnectionPool(self, self.delete_concurrency)
+            workers = eventlet.GreenPool(self.delete_concurrency)
+            errors = []
+
+            def _delete_pooled_object(swift_object_name):
+                try:
+                    with conn_pool.item() as conn:
+                        self._delete_object(conn, container,
+                                            swift_object_name)
+                except Exception as err:
+                    errors.append(err)
+
+            for swift_object_name in swift_object_names:
+                if errors:
+                    break
+                workers.spawn_n(_delete_pooled_object, swift_object_name)
+            workers.waitall()
+            if errors:
+                raise errors[0]
+            return
+
+        for swift_object_name in swift_object_names:
+            self._delete_object(self.conn, container, swift_object_name)
+            # Deleting a backup's objects from swift can take some time.
+            # Yield so other threads can run
+            eventlet.sleep(0)
+
     def delete(self, backup):
-        """Delete the given backup from swift."""
+        """Delete the given backup from swift.
+
+        The objects to delete are taken from the backup metadata, which is
+        deleted last so that an interrupted delete can be retried.  The
+        container is only listed when the metadata cannot be read.
+        """
         container = backup['container']
         LOG.debug('delete started, backup: %s, container: %s, prefix: %s',
                   backup['id'], container, backup['service_metadata'])
 
         if container is not None:
-            swift_object_names = []
+            dedup_refs = []
+            swift_object_names = None
             try:
-                swift_object_names = self._generate_object_names(backup)
+                metadata = self._read_metadata(backup)
             except Exception:
-                LOG.warn(_('swift error while listing objects, continuing'
+                LOG.warn(_('swift error while reading metadata, continuing'
                            ' with delete'))
+            else:
+                dedup_refs = [(chunk['container'], object_name)
+                              for obj in metadata['objects']
+                              for object_name, chunk in obj.items()
+                              if chunk.get('dedup')]
+                swift_object_names = self._backup_object_names(backup,
+                                                               metadata)
 
-            for swift_object_name in swift_object_names:
+            if swift_object_names is not None:
+                self._delete_objects(container, swift_object_names)
+                self._delete_objects(container,
+                                     [self._metadata_filename(backup)])
+            else:
+                swift_object_names = []
                 try:
-                    self.conn.delete_object(container, swift_object_name)
-                except socket.error as err:
-                    raise exception.SwiftConnectionFailed(reason=str(err))
+                    swift_object_names = self._generate_object_names(backup)
                 except Exception:
-                    LOG.warn(_('swift error while deleting object %s, '
-                               'continuing with delete') % swift_object_name)
-                else:
-                    LOG.debug(_('deleted swift object: %(swift_object_name)s'
-                                ' in container: %(container)s') %
-                              {
-                                  'swift_object_name': swift_object_name,
-                                  'container': container
-                              })
-                # Deleting a backup's objects from swift can take some time.
-                # Yield so other threads can run
-                eventlet.sleep(0)
+                    LOG.warn(_('swift error while listing objects, continuing'
+                               ' with delete'))
+                self._delete_objects(container, swift_object_names)
+
+            self._release_dedup_chunks(dedup_refs)
 
         LOG.debug(_('delete %s finished') % backup['id'])
 
@@ -30,11 +30,22 @@ Volume backups can be created, restored, deleted and listed.
 :backup_manager:  The module name of a class derived from
                           :class:`manager.Manager` (default:
                           :class:`cinder.backup.manager.Manager`).
+:backup_max_concurrent_backups:  Maximum number of backups running at once
+                                 on a backup node (default: 0, no limit).
+:backup_max_concurrent_restores:  Maximum number of restores running at
+                                  once on a backup node (default: 0, no
+                                  limit).
+:backup_max_concurrent_deletes:  Maximum number of deletes running at once
+                                 on a backup node (default: 0, no limit).
+:backup_max_queued_operations:  Maximum number of operations waiting for
+                                one of the above limits, capped at half of
+                                rpc_thread_pool_size (default: 32).
 
 """
 
 from oslo.config import cfg
 
+from cinder.backup import scheduler
 from cinder import context
 from cinder import exception
 from cinder import manager
@@ -50,6 +61,24 @@ backup_manager_opts = [
                default='cinder.backup.drivers.swift',
                help='Driver to use for backups.',
                deprecated_name='backup_service'),
+    cfg.IntOpt('backup_max_concurrent_backups',
+               default=0,
+               help='The maximum number of backups run at the same time by '
+                    'a backup service, 0 for no limit'),
+    cfg.IntOpt('backup_max_concurrent_restores',
+               default=0,
+               help='The maximum number of restores run at the same time by '
+                    'a backup service, 0 for no limit'),
+    cfg.IntOpt('backup_max_concurrent_deletes',
+               default=0,
+               help='The maximum number of backup deletes run at the same '
+                    'time by a backup service, 0 for no limit'),
+    cfg.IntOpt('backup_max_queued_operations',
+               default=32,
+               help='The maximum number of backup operations waiting for a '
+                    'concurrency limit before new ones are rejected. Each '
+                    'one holds an RPC thread while waiting, so it is '
+                    'capped at half of rpc_thread_pool_size'),
 ]
 
 # This map doesn't need to be extended in the future since it's only
@@ -59,6 +88,7 @@ mapper = {'cinder.backup.services.swift': 'cinder.backup.drivers.swift',
 
 CONF = cfg.CONF
 CONF.register_opts(backup_manager_opts)
+CONF.import_opt('rpc_thread_pool_size', 'cinder.openstack.common.rpc')
 
 
 class BackupManager(manager.SchedulerDependentManager):
@@ -72,10 +102,30 @@ class BackupManager(manager.SchedulerDependentManager):
         self.volume_manager = importutils.import_object(
             CONF.volume_manager)
         self.driver = self.volume_manager.driver
+        self.work_scheduler = scheduler.BackupWorkScheduler(
+            {'backup': CONF.backup_max_concurrent_backups,
+             'restore': CONF.backup_max_concurrent_restores,
+             'delete': CONF.backup_max_concurrent_deletes},
+            max_queued=self._max_queued_operations())
         super(BackupManager, self).__init__(service_name='backup',
                                             *args, **kwargs)
         self.driver.db = self.db
 
+    @staticmethod
+    def _max_queued_operations():
+        """Return the queue depth, leaving RPC threads for other requests.
+
+        Queued operations wait in the RPC green thread that received them,
+        a deeper queue would starve the backup service of RPC threads.
+        """
+        max_queued = CONF.backup_max_queued_operations
+        pool_limit = max(CONF.rpc_thread_pool_size // 2, 1)
+        if not max_queued or max_queued > pool_limit:
+            LOG.warn(_('backup_max_queued_operations capped at %d, half of '
+                       'rpc_thread_pool_size') % pool_limit)
+            return pool_limit
+        return max_queued
+
     @property
     def driver_name(self):
         """This function maps old backup services to backup drivers."""
@@ -171,8 +221,9 @@ class BackupManager(manager.SchedulerDependentManager):
             raise exception.InvalidBackup(reason=err)
 
         try:
-            backup_service = self.service.get_backup_driver(context)
-            self.driver.backup_volume(context, backup, backup_service)
+            with self.work_scheduler.admit('backup', backup['project_id']):
+                backup_service = self.service.get_backup_driver(context)
+                self.driver.backup_volume(context, backup, backup_service)
         except Exception as err:
             with excutils.save_and_reraise_exception():
                 self.db.volume_update(context, volume_id,
@@ -181,11 +232,17 @@ class BackupManager(manager.SchedulerDependentManager):
                                       {'status': 'error',
                                        'fail_reason': unicode(err)})
 
+        updates = {'status': 'available',
+                   'size': volume['size'],
+                   'availability_zone': self.az}
+        if backup['parent_id'] and not backup_service.SUPPORTS_INCREMENTAL:
+            # A full backup was made, it does not keep its parent from
+            # being deleted
+            LOG.warn(_('Backup driver does not support incremental backups, '
+                       'backup %s is a full backup') % backup_id)
+            updates['parent_id'] = None
         self.db.volume_update(context, volume_id, {'status': 'available'})
-        self.db.backup_update(context, backup_id, {'status': 'available',
-                                                   'size': volume['size'],
-                                                   'availability_zone':
-                                                   self.az})
+        self.db.backup_update(context, backup_id, updates)
         LOG.info(_('create_backup finished. backup: %s'), backup_id)
 
     def restore_backup(self, context, backup_id, volume_id):
@@ -244,9 +301,10 @@ class BackupManager(manager.SchedulerDependentManager):
             raise exception.InvalidBackup(reason=err)
 
         try:
-            backup_service = self.service.get_backup_driver(context)
-            self.driver.restore_backup(context, backup, volume,
-                                       backup_service)
+            with self.work_scheduler.admit('restore', backup['project_id']):
+                backup_service = self.service.get_backup_driver(context)
+                self.driver.restore_backup(context, backup, volume,
+                                           backup_service)
         except Exception as err:
             with excutils.save_and_reraise_exception():
                 self.db.volume_update(context, volume_id,
@@ -296,8 +354,10 @@ class BackupManager(manager.SchedulerDependentManager):
                 raise exception.InvalidBackup(reason=err)
 
             try:
-                backup_service = self.service.get_backup_driver(context)
-                backup_service.delete(backup)
+                with self.work_scheduler.admit('delete',
+                                               backup['project_id']):
+                    backup_service = self.service.get_backup_driver(context)
+                    backup_service.delete(backup)
             except Exception as err:
                 with excutils.save_and_reraise_exception():
                     self.db.backup_update(context, backup_id,
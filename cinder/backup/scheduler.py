@@ -0,0 +1,103 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Admission control for the operations run by a backup service.
+
+Every backup, restore and delete runs in its own RPC green thread. The
+work scheduler bounds how many operations of each kind run at the same
+time on a node. Operations beyond that limit wait in a bounded queue and
+are admitted round-robin across projects, in arrival order within a
+project, so that one tenant submitting many backups cannot starve the
+others. A waiting operation keeps its RPC green thread, so the queue must
+stay smaller than the RPC thread pool.
+"""
+
+import collections
+import contextlib
+
+from eventlet import event
+
+from cinder import exception
+from cinder.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class BackupWorkScheduler(object):
+    """Limits the number of concurrently running backup operations.
+
+    limits maps an operation kind (e.g. 'backup') to the maximum number of
+    operations of that kind allowed to run at once, 0 meaning no limit.
+    At most max_queued operations, 0 meaning no limit, wait for a slot
+    across all kinds; further ones are rejected with BackupQueueFull.
+    """
+
+    def __init__(self, limits, max_queued=0):
+        self.limits = limits
+        self.max_queued = max_queued
+        self._running = collections.defaultdict(int)
+        # Per kind, an ordered map of project id to its waiting operations.
+        # Projects are served round-robin by moving them to the end.
+        self._waiting = collections.defaultdict(collections.OrderedDict)
+        self._queued = 0
+
+    @contextlib.contextmanager
+    def admit(self, kind, project_id):
+        """Run the body once an operation of the given kind is admitted."""
+        self._acquire(kind, project_id)
+        try:
+            yield
+        finally:
+            self._release(kind)
+
+    def _has_slot(self, kind):
+        limit = self.limits.get(kind)
+        return not limit or self._running[kind] < limit
+
+    def _acquire(self, kind, project_id):
+        if self._has_slot(kind) and not self._waiting[kind]:
+            self._running[kind] += 1
+            return
+
+        if self.max_queued and self._queued >= self.max_queued:
+            raise exception.BackupQueueFull(operation=kind)
+
+        waiter = event.Event()
+        waiting = self._waiting[kind]
+        waiting.setdefault(project_id, collections.deque()).append(waiter)
+        self._queued += 1
+        LOG.debug(_('%(kind)s operation of project %(project_id)s queued, '
+                    '%(queued)d operations waiting') %
+                  {'kind': kind, 'project_id': project_id,
+                   'queued': self._queued})
+        # The slot is handed over by _dispatch() before the waiter is woken
+        waiter.wait()
+
+    def _release(self, kind):
+        self._running[kind] -= 1
+        self._dispatch(kind)
+
+    def _dispatch(self, kind):
+        waiting = self._waiting[kind]
+        while waiting and self._has_slot(kind):
+            project_id, waiters = waiting.popitem(last=False)
+            waiter = waiters.popleft()
+            if waiters:
+                waiting[project_id] = waiters
+            self._queued -= 1
+            self._running[kind] += 1
+            waiter.send()
@@ -217,9 +217,11 @@ def volume_get(context, volume_id):
     return IMPL.volume_get(context, volume_id)
 
 
-def volume_get_all(context, marker, limit, sort_key, sort_dir):
-    """Get all volumes."""
-    return IMPL.volume_get_all(context, marker, limit, sort_key, sort_dir)
+def volume_get_all(context, marker, limit, sort_key, sort_dir, filters=None,
+                   offset=None):
+    """Get all volumes matching the filters, a page at a time."""
+    return IMPL.volume_get_all(context, marker, limit, sort_key, sort_dir,
+                               filters=filters, offset=offset)
 
 
 def volume_get_all_by_host(context, host):
@@ -233,10 +235,11 @@ def volume_get_all_by_instance_uuid(context, instance_uuid):
 
 
 def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
-                              sort_dir):
-    """Get all volumes belonging to a project."""
+                              sort_dir, filters=None, offset=None):
+    """Get all volumes belonging to a project matching the filters."""
     return IMPL.volume_get_all_by_project(context, project_id, marker, limit,
-                                          sort_key, sort_dir)
+                                          sort_key, sort_dir, filters=filters,
+                                          offset=offset)
 
 
 def volume_get_iscsi_target_num(context, volume_id):
@@ -731,6 +734,11 @@ def backup_get_all_by_project(context, project_id):
     return IMPL.backup_get_all_by_project(context, project_id)
 
 
+def backup_get_all_by_volume(context, volume_id):
+    """Get all backups of a volume."""
+    return IMPL.backup_get_all_by_volume(context, volume_id)
+
+
 def backup_update(context, backup_id, values):
     """
     Set the given properties on a backup and update it.
@@ -748,6 +756,65 @@ def backup_destroy(context, backup_id):
 ###################
 
 
+def backup_chunk_ref(context, project_id, container, sha256):
+    """Take a reference on a stored backup chunk with the given digest.
+
+    Returns the chunk, or None if no such chunk is stored.
+    """
+    return IMPL.backup_chunk_ref(context, project_id, container, sha256)
+
+
+def backup_chunk_create(context, values):
+    """Record a newly stored backup chunk holding one reference."""
+    return IMPL.backup_chunk_create(context, values)
+
+
+def backup_chunk_unref(context, container, object_name):
+    """Drop a reference on a stored backup chunk.
+
+    The chunk is deleted once its last reference is dropped.  Returns the
+    chunk, or None if no such chunk is stored.
+    """
+    return IMPL.backup_chunk_unref(context, container, object_name)
+
+
+###################
+
+
+def image_volume_cache_get_and_update_last_used(context, image_id, host):
+    """Get the cache entry of an image on a host and mark it used now.
+
+    Returns None if the image is not cached on the host.
+    """
+    return IMPL.image_volume_cache_get_and_update_last_used(context,
+                                                            image_id, host)
+
+
+def image_volume_cache_get_all_for_host(context, host):
+    """Get all cache entries of a host, least recently used first."""
+    return IMPL.image_volume_cache_get_all_for_host(context, host)
+
+
+def image_volume_cache_create(context, values):
+    """Record a volume newly caching an image.
+
+    Raises ImageVolumeCacheEntryExists if the image is already cached on
+    the host.
+    """
+    return IMPL.image_volume_cache_create(context, values)
+
+
+def image_volume_cache_delete(context, entry_id):
+    """Delete an image volume cache entry.
+
+    Returns the number of entries deleted, 0 if it was already deleted.
+    """
+    return IMPL.image_volume_cache_delete(context, entry_id)
+
+
+###################
+
+
 def transfer_get(context, transfer_id):
     """Get a volume transfer record or raise if it does not exist."""
     return IMPL.transfer_get(context, transfer_id)
@@ -776,3 +843,17 @@ def transfer_destroy(context, transfer_id):
 def transfer_accept(context, transfer_id, user_id, project_id):
     """Accept a volume transfer."""
     return IMPL.transfer_accept(context, transfer_id, user_id, project_id)
+
+
+###################
+
+
+def purge_deleted_rows(context, age_in_days, batch_size=1000):
+    """Purge the rows soft deleted more than age_in_days days ago.
+
+    The rows are deleted batch_size at a time, from the tables holding
+    references before the tables they reference. Returns the number of
+    rows purged from each table.
+    """
+    return IMPL.purge_deleted_rows(context, age_in_days,
+                                   batch_size=batch_size)
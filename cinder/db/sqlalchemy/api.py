@@ -26,10 +26,14 @@ import uuid
 import warnings
 
 from oslo.config import cfg
+from sqlalchemy import and_
+from sqlalchemy import Boolean
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy import MetaData
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.expression import literal_column
+from sqlalchemy.sql.expression import select
 from sqlalchemy.sql import func
 
 from cinder.common import sqlalchemyutils
@@ -39,6 +43,7 @@ from cinder import exception
 from cinder.openstack.common.db import exception as db_exc
 from cinder.openstack.common.db.sqlalchemy import session as db_session
 from cinder.openstack.common import log as logging
+from cinder.openstack.common import strutils
 from cinder.openstack.common import timeutils
 from cinder.openstack.common import uuidutils
 
@@ -1126,9 +1131,56 @@ def volume_get(context, volume_id):
     return _volume_get(context, volume_id)
 
 
-@require_admin_context
-def volume_get_all(context, marker, limit, sort_key, sort_dir):
-    query = _volume_get_query(context)
+def _process_volume_filters(query, filters):
+    """Add the volume list filters to query.
+
+    'metadata' is a dict of key/value pairs the volume must all have,
+    'volume_type' the name of its volume type and 'no_migration_targets'
+    leaves out the temporary targets of volume migrations. Any other key
+    must be a volume column, and a list value matches any of its items.
+
+    :returns: the filtered query, or None when no volume can match
+    """
+    for key, value in filters.iteritems():
+        if key == 'metadata':
+            for meta_key, meta_value in value.iteritems():
+                query = query.filter(models.Volume.volume_metadata.any(
+                    key=meta_key, value=meta_value))
+        elif key == 'volume_type':
+            query = query.filter(models.Volume.volume_type.has(name=value))
+        elif key == 'no_migration_targets':
+            if value:
+                query = query.filter(or_(
+                    models.Volume.status == None,
+                    ~models.Volume.status.like('migration_target%')))
+        else:
+            column = models.Volume.__table__.c.get(key)
+            if column is None:
+                LOG.debug(_("Volumes cannot be filtered by %s"), key)
+                return None
+            if isinstance(column.type, Boolean):
+                if isinstance(value, list):
+                    value = [strutils.bool_from_string(v) for v in value]
+                else:
+                    value = strutils.bool_from_string(value)
+            if isinstance(value, list):
+                query = query.filter(column.in_(value))
+            else:
+                query = query.filter(column == value)
+    return query
+
+
+def _volume_get_page(context, query, marker, limit, sort_key, sort_dir,
+                     filters, offset):
+    """Filter, sort and page a volume query in the database.
+
+    The filters are applied first, so the marker, offset and limit count
+    only the volumes that match them.
+    """
+    if filters:
+        query = _process_volume_filters(query, filters)
+        if query is None:
+            return []
 
     marker_volume = None
     if marker is not None:
@@ -1138,10 +1190,20 @@ def volume_get_all(context, marker, limit, sort_key, sort_dir):
                                            [sort_key, 'created_at', 'id'],
                                            marker=marker_volume,
                                            sort_dir=sort_dir)
+    if offset:
+        query = query.offset(offset)
 
     return query.all()
 
 
+@require_admin_context
+def volume_get_all(context, marker, limit, sort_key, sort_dir, filters=None,
+                   offset=None):
+    query = _volume_get_query(context)
+    return _volume_get_page(context, query, marker, limit, sort_key, sort_dir,
+                            filters, offset)
+
+
 @require_admin_context
 def volume_get_all_by_host(context, host):
     return _volume_get_query(context).filter_by(host=host).all()
@@ -1163,20 +1225,11 @@ def volume_get_all_by_instance_uuid(context, instance_uuid):
 
 @require_context
 def volume_get_all_by_project(context, project_id, marker, limit, sort_key,
-                              sort_dir):
+                              sort_dir, filters=None, offset=None):
     authorize_project_context(context, project_id)
     query = _volume_get_query(context).filter_by(project_id=project_id)
-
-    marker_volume = None
-    if marker is not None:
-        marker_volume = _volume_get(context, marker)
-
-    query = sqlalchemyutils.paginate_query(query, models.Volume, limit,
-                                           [sort_key, 'created_at', 'id'],
-                                           marker=marker_volume,
-                                           sort_dir=sort_dir)
-
-    return query.all()
+    return _volume_get_page(context, query, marker, limit, sort_key, sort_dir,
+                            filters, offset)
 
 
 @require_admin_context
@@ -2070,6 +2123,13 @@ def backup_get_all_by_project(context, project_id):
         filter_by(project_id=project_id).all()
 
 
+@require_context
+def backup_get_all_by_volume(context, volume_id):
+    return model_query(context, models.Backup, project_only=True).\
+        filter_by(volume_id=volume_id).\
+        order_by(models.Backup.created_at.desc()).all()
+
+
 @require_context
 def backup_create(context, values):
     backup = models.Backup()
@@ -2112,6 +2172,115 @@ def backup_destroy(context, backup_id):
 ###############################
 
 
+@require_context
+def backup_chunk_ref(context, project_id, container, sha256):
+    session = get_session()
+    with session.begin():
+        chunk = model_query(context, models.BackupChunk,
+                            session=session, read_deleted="no").\
+            filter_by(project_id=project_id).\
+            filter_by(container=container).\
+            filter_by(sha256=sha256).\
+            with_lockmode('update').\
+            first()
+
+        if not chunk:
+            return None
+
+        chunk.refcount += 1
+        chunk.save(session=session)
+    return chunk
+
+
+@require_context
+def backup_chunk_create(context, values):
+    chunk = models.BackupChunk()
+    chunk.update(values)
+    chunk.refcount = 1
+    chunk.save()
+    return chunk
+
+
+@require_context
+def backup_chunk_unref(context, container, object_name):
+    session = get_session()
+    with session.begin():
+        chunk = model_query(context, models.BackupChunk,
+                            session=session, read_deleted="no").\
+            filter_by(container=container).\
+            filter_by(object_name=object_name).\
+            with_lockmode('update').\
+            first()
+
+        if not chunk:
+            return None
+
+        chunk.refcount -= 1
+        if chunk.refcount <= 0:
+            chunk.refcount = 0
+            chunk.deleted = True
+            chunk.deleted_at = timeutils.utcnow()
+        chunk.save(session=session)
+    return chunk
+
+
+###############################
+
+
+@require_admin_context
+def image_volume_cache_get_and_update_last_used(context, image_id, host):
+    session = get_session()
+    with session.begin():
+        entry = model_query(context, models.ImageVolumeCacheEntry,
+                            session=session, read_deleted="no").\
+            filter_by(image_id=image_id).\
+            filter_by(host=host).\
+            order_by(models.ImageVolumeCacheEntry.last_used.desc()).\
+            first()
+
+        if not entry:
+            return None
+
+        entry.last_used = timeutils.utcnow()
+        entry.save(session=session)
+    return entry
+
+
+@require_admin_context
+def image_volume_cache_get_all_for_host(context, host):
+    return model_query(context, models.ImageVolumeCacheEntry,
+                       read_deleted="no").\
+        filter_by(host=host).\
+        order_by(models.ImageVolumeCacheEntry.last_used.asc()).\
+        all()
+
+
+@require_admin_context
+def image_volume_cache_create(context, values):
+    entry = models.ImageVolumeCacheEntry()
+    entry.update(values)
+    if not entry.last_used:
+        entry.last_used = timeutils.utcnow()
+    try:
+        entry.save()
+    except db_exc.DBDuplicateEntry:
+        raise exception.ImageVolumeCacheEntryExists(
+            image_id=values['image_id'], host=values['host'])
+    return entry
+
+
+@require_admin_context
+def image_volume_cache_delete(context, entry_id):
+    # Not soft deleted, (host, image_id) is unique across all the rows
+    return model_query(context, models.ImageVolumeCacheEntry,
+                       read_deleted="no").\
+        filter_by(id=entry_id).\
+        delete()
+
+
+###############################
+
+
 @require_context
 def _transfer_get(context, transfer_id, session=None):
     query = model_query(context, models.Transfer,
@@ -2244,3 +2413,70 @@ def transfer_accept(context, transfer_id, user_id, project_id):
             update({'deleted': True,
                     'deleted_at': timeutils.utcnow(),
                     'updated_at': literal_column('updated_at')})
+
+
+###############################
+
+
+@require_admin_context
+def purge_deleted_rows(context, age_in_days, batch_size=1000):
+    try:
+        age_in_days = int(age_in_days)
+    except ValueError:
+        msg = _('Invalid value for age, %(age)s') % {'age': age_in_days}
+        raise exception.InvalidParameterValue(err=msg)
+    if age_in_days < 0:
+        msg = _('Must supply a non-negative value for age')
+        raise exception.InvalidParameterValue(err=msg)
+
+    deleted_before = timeutils.utcnow() - datetime.timedelta(days=age_in_days)
+    engine = get_engine()
+    metadata = MetaData()
+    metadata.bind = engine
+    metadata.reflect()
+
+    purged = {}
+    # Each batch is deleted in its own transaction, not to lock the
+    # tables for long
+    for table in reversed(metadata.sorted_tables):
+        if 'deleted' not in table.c or 'deleted_at' not in table.c:
+            continue
+        primary_key = list(table.primary_key.columns)[0]
+        select_batch = select([primary_key]).\
+            where(and_(table.c.deleted == True,
+                       table.c.deleted_at < deleted_before)).\
+            limit(batch_size)
+        count = 0
+        # Rows still referenced by rows that are not deleted
+        skipped = set()
+        while True:
+            query = select_batch
+            if skipped:
+                query = query.where(~primary_key.in_(list(skipped)))
+            ids = [row[0] for row in engine.execute(query)]
+            if not ids:
+                break
+            try:
+                engine.execute(table.delete().where(primary_key.in_(ids)))
+                count += len(ids)
+            except IntegrityError:
+                # Delete the rows of the batch one at a time, and leave
+                # out the referenced ones from the next batches
+                for row_id in ids:
+                    try:
+                        engine.execute(table.delete().
+                                       where(primary_key == row_id))
+                        count += 1
+                    except IntegrityError:
+                        skipped.add(row_id)
+            if len(ids) < batch_size:
+                break
+        if skipped:
+            LOG.warn(_('%(count)d rows of table %(table)s are still '
+                       'referenced and were not purged'),
+                     {'count': len(skipped), 'table': table.name})
+        if count:
+            LOG.info(_('Purged %(count)d rows from table %(table)s'),
+                     {'count': count, 'table': table.name})
+            purged[table.name] = count
+    return purged
@@ -0,0 +1,66 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer
+from sqlalchemy import MetaData, String, Table
+
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    # New table
+    backup_chunks = Table(
+        'backup_chunks', meta,
+        Column('created_at', DateTime(timezone=False)),
+        Column('updated_at', DateTime(timezone=False)),
+        Column('deleted_at', DateTime(timezone=False)),
+        Column('deleted', Boolean),
+        Column('id', Integer, primary_key=True, nullable=False),
+        Column('project_id', String(length=255)),
+        Column('container', String(length=255)),
+        Column('object_name', String(length=255)),
+        Column('sha256', String(length=64)),
+        Column('md5', String(length=32)),
+        Column('compression', String(length=255)),
+        Column('length', Integer),
+        Column('refcount', Integer, nullable=False, default=0),
+        mysql_engine='InnoDB'
+    )
+
+    try:
+        backup_chunks.create()
+    except Exception:
+        LOG.error(_("Table |%s| not created!"), repr(backup_chunks))
+        raise
+
+    Index('backup_chunks_sha256_idx', backup_chunks.c.sha256).create()
+    Index('backup_chunks_object_name_idx',
+          backup_chunks.c.object_name).create()
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+    backup_chunks = Table('backup_chunks',
+                          meta,
+                          autoload=True)
+    try:
+        backup_chunks.drop()
+    except Exception:
+        LOG.error(_("backup_chunks table not dropped"))
@@ -0,0 +1,70 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+from cinder.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Indexes for the queries filtering on a column of the non deleted rows
+INDEXES = (
+    # volume_get_all_by_host
+    ('volumes', 'volumes_host_deleted_idx', ('host', 'deleted')),
+    # volume_get_all_by_project, volume_data_get_for_project
+    ('volumes', 'volumes_project_id_deleted_idx', ('project_id', 'deleted')),
+    # volume_get_all_by_instance_uuid
+    ('volumes', 'volumes_instance_uuid_deleted_idx',
+     ('instance_uuid', 'deleted')),
+    # snapshot_get_all_by_project, snapshot_data_get_for_project
+    ('snapshots', 'snapshots_project_id_deleted_idx',
+     ('project_id', 'deleted')),
+    # backup_get_all_by_host
+    ('backups', 'backups_host_deleted_idx', ('host', 'deleted')),
+    # backup_get_all_by_project
+    ('backups', 'backups_project_id_deleted_idx', ('project_id', 'deleted')),
+)
+
+
+def _indexes(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+    tables = {}
+    for table_name, index_name, column_names in INDEXES:
+        if table_name not in tables:
+            tables[table_name] = Table(table_name, meta, autoload=True)
+        table = tables[table_name]
+        yield Index(index_name,
+                    *[table.c[column_name] for column_name in column_names])
+
+
+def upgrade(migrate_engine):
+    for index in _indexes(migrate_engine):
+        try:
+            index.create(migrate_engine)
+        except Exception:
+            LOG.error(_("Index |%s| not created!"), index.name)
+            raise
+
+
+def downgrade(migrate_engine):
+    for index in _indexes(migrate_engine):
+        try:
+            index.drop(migrate_engine)
+        except Exception:
+            LOG.error(_("Index |%s| not dropped!"), index.name)
+            raise
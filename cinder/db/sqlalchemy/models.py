@@ -371,6 +371,7 @@ class Backup(BASE, CinderBase):
     project_id = Column(String(255), nullable=False)
 
     volume_id = Column(String(36), nullable=False)
+    parent_id = Column(String(36))
     host = Column(String(255))
     availability_zone = Column(String(255))
     display_name = Column(String(255))
@@ -380,8 +381,37 @@ class Backup(BASE, CinderBase):
     fail_reason = Column(String(255))
     service_metadata = Column(String(255))
     service = Column(String(255))
+    compression = Column(String(255))
     size = Column(Integer)
     object_count = Column(Integer)
+    progress = Column(Text)
+
+
+class BackupChunk(BASE, CinderBase):
+    """Represents a deduplicated backup chunk stored in Swift."""
+    __tablename__ = 'backup_chunks'
+    id = Column(Integer, primary_key=True)
+    project_id = Column(String(255))
+    container = Column(String(255))
+    object_name = Column(String(255))
+    sha256 = Column(String(64))
+    md5 = Column(String(32))
+    compression = Column(String(255))
+    length = Column(Integer)
+    refcount = Column(Integer, nullable=False, default=0)
+
+
+class ImageVolumeCacheEntry(BASE, CinderBase):
+    """Represents a volume holding a cached copy of an image on a host."""
+    __tablename__ = 'image_volume_cache_entries'
+    id = Column(Integer, primary_key=True)
+    host = Column(String(255))
+    image_id = Column(String(36))
+    image_updated_at = Column(DateTime)
+    volume_id = Column(String(36))
+    size = Column(Integer)
+    provider_location = Column(String(255))
+    last_used = Column(DateTime)
 
 
 class Transfer(BASE, CinderBase):
@@ -409,6 +439,8 @@ def register_models():
     """
     from sqlalchemy import create_engine
     models = (Backup,
+              BackupChunk,
+              ImageVolumeCacheEntry,
               Service,
               SMBackendConf,
               SMFlavors,
@@ -413,6 +413,10 @@ class VolumeTypeExists(Duplicate):
     message = _("Volume Type %(id)s already exists.")
 
 
+class ImageVolumeCacheEntryExists(Duplicate):
+    message = _("Image %(image_id)s is already cached on host %(host)s.")
+
+
 class MigrationError(CinderException):
     message = _("Migration error") + ": %(reason)s"
 
@@ -592,6 +596,11 @@ class InvalidBackup(Invalid):
     message = _("Invalid backup: %(reason)s")
 
 
+class BackupQueueFull(CinderException):
+    message = _("Too many %(operation)s operations are queued on this backup "
+                "service.")
+
+
 class SwiftConnectionFailed(CinderException):
     message = _("Connection to swift failed") + ": %(reason)s"
 
@@ -0,0 +1,174 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Local cache of Glance images on volume nodes.
+
+Creating many volumes from the same image would otherwise download and
+convert it once per volume. The cache keeps raw copies of images, keyed by
+image id and checksum, in a directory shared by the volume services of a
+node. Entries are filled under an inter-process lock so that concurrent
+requests for the same image download it only once, and the least recently
+used entries are evicted once the cache grows beyond its size limit.
+Entries in use are share-locked so that eviction leaves them alone.
+"""
+
+
+import contextlib
+import fcntl
+import os
+import tempfile
+
+from oslo.config import cfg
+
+from cinder.openstack.common import fileutils
+from cinder.openstack.common import log as logging
+from cinder import units
+from cinder import utils
+
+
+LOG = logging.getLogger(__name__)
+
+image_cache_opts = [
+    cfg.StrOpt('image_cache_dir',
+               default=None,
+               help='Directory where raw copies of images are cached for '
+                    'creating volumes from them. Images are not cached '
+                    'when unset'),
+    cfg.IntOpt('image_cache_max_size',
+               default=20,
+               help='Maximum size in GB of the image cache, least recently '
+                    'used images are evicted beyond it'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(image_cache_opts)
+
+
+def get_cache():
+    """Return the configured image cache, or None when it is disabled."""
+    if not CONF.image_cache_dir:
+        return None
+    return ImageCache(CONF.image_cache_dir,
+                      CONF.image_cache_max_size * units.GiB)
+
+
+class ImageCache(object):
+    """Raw copies of images kept in a local directory."""
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    @staticmethod
+    def _entry_name(image_meta):
+        return '%s-%s' % (image_meta['id'], image_meta['checksum'])
+
+    @staticmethod
+    def is_cacheable(image_meta):
+        """Only images with a checksum can be told apart from updates."""
+        return bool(image_meta.get('checksum'))
+
+    @contextlib.contextmanager
+    def entry(self, image_meta, fill):
+        """Yield the path of the raw copy of an image.
+
+        On a cache miss, fill is called with a path to write the raw image
+        to. The entry cannot be evicted until the context exits.
+        """
+        fileutils.ensure_tree(self.cache_dir)
+        name = self._entry_name(image_meta)
+        path = os.path.join(self.cache_dir, name)
+
+        @utils.synchronized('image-cache-%s' % name, external=True)
+        def _open_entry():
+            while True:
+                try:
+                    entry_file = open(path, 'rb')
+                except IOError:
+                    LOG.debug(_('Image cache miss for %s') % name)
+                    self._fill(path, fill)
+                    continue
+                fcntl.flock(entry_file, fcntl.LOCK_SH)
+                if self._is_linked(entry_file, path):
+                    LOG.debug(_('Using cached image %s') % name)
+                    return entry_file
+                # Evicted before it could be locked
+                entry_file.close()
+
+        entry_file = _open_entry()
+        try:
+            # Keep the modification time as the last use for eviction
+            os.utime(path, None)
+            self.evict()
+            yield path
+        finally:
+            entry_file.close()
+
+    @staticmethod
+    def _is_linked(entry_file, path):
+        try:
+            st = os.fstat(entry_file.fileno())
+            return st.st_ino == os.stat(path).st_ino
+        except OSError:
+            return False
+
+    def _fill(self, path, fill):
+        # Hidden until complete, so that it is never used half written
+        fd, tmp = tempfile.mkstemp(prefix='.', dir=self.cache_dir)
+        os.close(fd)
+        with fileutils.remove_path_on_error(tmp):
+            fill(tmp)
+            os.rename(tmp, path)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            # Raw images are sparse, account for what they really use.
+            entries.append((st.st_mtime, st.st_blocks * 512, path))
+        return sorted(entries)
+
+    def evict(self):
+        """Remove least recently used entries beyond the size limit."""
+        entries = self._entries()
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                entry_file = open(path, 'rb')
+            except IOError:
+                # Evicted by another service
+                total -= size
+                continue
+            with entry_file:
+                try:
+                    fcntl.flock(entry_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except IOError:
+                    # In use
+                    continue
+                if self._is_linked(entry_file, path):
+                    LOG.debug(_('Evicting %s from the image cache') % path)
+                    os.unlink(path)
+            total -= size
@@ -145,6 +145,11 @@ class GlanceClientWrapper(object):
         for attempt in xrange(1, num_attempts + 1):
             client = self.client or self._create_onetime_client(context,
                                                                 version)
+            data = kwargs.get('data')
+            if attempt > 1 and hasattr(data, 'seek'):
+                # Send the whole image again, not what the failed attempt
+                # left unread
+                data.seek(0)
             try:
                 return getattr(client.images, method)(*args, **kwargs)
             except retry_excs as e:
@@ -227,8 +232,7 @@ class GlanceImageService(object):
         or None if this attribute is not shown by Glance.
         """
         try:
-            client = GlanceClientWrapper()
-            image_meta = client.call(context, 'get', image_id)
+            image_meta = self._client.call(context, 'get', image_id)
         except Exception:
             _reraise_translated_image_exception(image_id)
 
@@ -334,6 +338,36 @@ class GlanceImageService(object):
         return str(user_id) == str(context.user_id)
 
 
+class CachingImageService(object):
+    """Image service remembering image metadata for a single request.
+
+    Creating a volume from an image looks the image up several times, from
+    the volume manager down to the driver and image_utils. Wrapping the
+    image service of the request in this class makes these lookups hit
+    Glance once. Other calls go straight to the wrapped image service.
+    """
+
+    def __init__(self, image_service):
+        self._image_service = image_service
+        self._images = {}
+        self._locations = {}
+
+    def show(self, context, image_id):
+        if image_id not in self._images:
+            self._images[image_id] = self._image_service.show(context,
+                                                              image_id)
+        return copy.deepcopy(self._images[image_id])
+
+    def get_location(self, context, image_id):
+        if image_id not in self._locations:
+            self._locations[image_id] = self._image_service.get_location(
+                context, image_id)
+        return self._locations[image_id]
+
+    def __getattr__(self, name):
+        return getattr(self._image_service, name)
+
+
 def _convert_timestamps_to_datetimes(image_meta):
     """Returns image with timestamp fields converted to datetime objects."""
     for attr in ['created_at', 'updated_at', 'deleted_at']:
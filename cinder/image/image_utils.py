@@ -26,17 +26,22 @@ we should look at maybe pushign this up to OSLO
 """
 
 
+import collections
 import contextlib
 import os
 import re
+import stat
 import tempfile
 
 from oslo.config import cfg
 
 from cinder import exception
+from cinder.image import cache as image_cache
+from cinder.image import probe
 from cinder.openstack.common import fileutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import strutils
+from cinder import units
 from cinder import utils
 
 
@@ -44,11 +49,27 @@ LOG = logging.getLogger(__name__)
 
 image_helper_opt = [cfg.StrOpt('image_conversion_dir',
                     default='/tmp',
-                    help='parent dir for tempdir used for image conversion'), ]
+                    help='parent dir for tempdir used for image conversion'),
+                    cfg.BoolOpt('image_probe_use_qemu_img',
+                                default=False,
+                                help='Always run qemu-img info to find the '
+                                     'format of images, instead of reading '
+                                     'the headers of the formats cinder '
+                                     'knows itself'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(image_helper_opt)
 
+# Leading bytes of a raw image checked by 'qemu-img info' before it is
+# written to the volume, and size of the writes to the volume
+RAW_PROBE_SIZE = units.MiB
+RAW_WRITE_BUFFER_SIZE = 4 * units.MiB
+
+# qemu_img_info results of regular files, by path, inode, mtime and size,
+# least recently used first
+_IMAGE_INFO_CACHE = collections.OrderedDict()
+_IMAGE_INFO_CACHE_MAX = 128
+
 
 class QemuImgInfo(object):
     BACKING_FILE_RE = re.compile((r"^(.*?)\s*\(actual\s+path\s*:"
@@ -181,17 +202,63 @@ class QemuImgInfo(object):
         return contents
 
 
-def qemu_img_info(path):
-    """Return a object containing the parsed output from qemu-img info."""
+def _qemu_img_info(path):
     out, err = utils.execute('env', 'LC_ALL=C', 'LANG=C',
                              'qemu-img', 'info', path,
                              run_as_root=True)
     return QemuImgInfo(out)
 
 
-def convert_image(source, dest, out_format):
-    """Convert image to other format"""
+def _probe_image_info(path):
+    details = probe.probe(path)
+    if details is None:
+        return None
+    data = QemuImgInfo(None)
+    for key, value in details.items():
+        setattr(data, key, value)
+    return data
+
+
+def qemu_img_info(path):
+    """Return a object containing the parsed output from qemu-img info.
+
+    The headers of qcow2, vmdk and vhd images are read directly unless
+    image_probe_use_qemu_img is set; other images, raw ones included, go
+    through 'qemu-img info'. Results for regular files are remembered for
+    as long as the file is unchanged.
+    """
+    key = None
+    try:
+        st = os.stat(path)
+    except OSError:
+        pass
+    else:
+        if stat.S_ISREG(st.st_mode):
+            key = (path, st.st_ino, st.st_mtime, st.st_size)
+    data = _IMAGE_INFO_CACHE.pop(key, None) if key else None
+
+    if data is None and not CONF.image_probe_use_qemu_img:
+        data = _probe_image_info(path)
+    if data is None:
+        data = _qemu_img_info(path)
+
+    if key:
+        if len(_IMAGE_INFO_CACHE) >= _IMAGE_INFO_CACHE_MAX:
+            _IMAGE_INFO_CACHE.popitem(last=False)
+        _IMAGE_INFO_CACHE[key] = data
+    return data
+
+
+def convert_image(source, dest, out_format, src_format=None):
+    """Convert image to other format.
+
+    The format of source should be given when it is known, so qemu-img
+    reads it as that format rather than guessing it again.
+    """
     cmd = ('qemu-img', 'convert', '-O', out_format, source, dest)
+    if src_format:
+        cmd = ('qemu-img', 'convert', '-f', src_format, '-O', out_format,
+               source, dest)
     utils.execute(*cmd, run_as_root=True)
 
 
@@ -235,10 +302,101 @@ def fetch_verify_image(context, image_service, image_id, dest,
 def fetch_to_raw(context, image_service,
                  image_id, dest,
                  user_id=None, project_id=None):
+    cache = image_cache.get_cache()
+    if cache:
+        image_meta = image_service.show(context, image_id)
+        if cache.is_cacheable(image_meta):
+            def fill(path):
+                _fetch_to_raw(context, image_service, image_id, path,
+                              user_id, project_id)
+
+            with cache.entry(image_meta, fill) as cached:
+                # The cached copy was checked to be raw when it was filled
+                LOG.debug(_('Copying cached image %s') % image_id)
+                convert_image(cached, dest, 'raw', src_format='raw')
+            return
+
+    _fetch_to_raw(context, image_service, image_id, dest,
+                  user_id, project_id)
+
+
+def _is_raw_image(image_meta):
+    return (image_meta.get('disk_format') == 'raw' and
+            image_meta.get('container_format') in (None, 'bare'))
+
+
+def _check_raw_image(image_id, path):
+    """Raise ImageUnacceptable unless path holds a raw image."""
+    data = qemu_img_info(path)
+    if data.file_format != 'raw' or data.backing_file is not None:
+        raise exception.ImageUnacceptable(
+            image_id=image_id,
+            reason=_("Glance reports raw, but fmt=%(fmt)s backed by: "
+                     "%(backing_file)s") %
+            {'fmt': data.file_format, 'backing_file': data.backing_file})
+
+
+class _RawImageWriter(object):
+    """File-like object writing a raw image straight to its destination.
+
+    Nothing is written until the first RAW_PROBE_SIZE bytes of the image
+    have been checked to be a raw image, so that an image in another format
+    with a backing file, which may be malicious, never reaches the volume.
+    """
+
+    def __init__(self, image_id, dest_file):
+        self.image_id = image_id
+        self.dest_file = dest_file
+        self.prefix = []
+        self.prefix_len = 0
+        self.probed = False
+
+    def write(self, data):
+        if self.probed:
+            self.dest_file.write(data)
+            return
+        self.prefix.append(data)
+        self.prefix_len += len(data)
+        if self.prefix_len >= RAW_PROBE_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.probed:
+            prefix = ''.join(self.prefix)
+            with temporary_file() as tmp:
+                with open(tmp, 'wb') as tmp_file:
+                    tmp_file.write(prefix[:RAW_PROBE_SIZE])
+                _check_raw_image(self.image_id, tmp)
+            self.probed = True
+            self.prefix = None
+            self.dest_file.write(prefix)
+        self.dest_file.flush()
+
+
+def _fetch_raw_to_dest(context, image_service, image_id, dest):
+    """Stream a raw image from the image service into dest."""
+    LOG.debug(_('%s is raw, writing it directly') % image_id)
+    with utils.temporary_chown(dest):
+        with open(dest, 'wb', RAW_WRITE_BUFFER_SIZE) as dest_file:
+            writer = _RawImageWriter(image_id, dest_file)
+            image_service.download(context, image_id, writer)
+            writer.flush()
+            os.fsync(dest_file.fileno())
+
+
+def _fetch_to_raw(context, image_service, image_id, dest,
+                  user_id=None, project_id=None):
     if (CONF.image_conversion_dir and not
             os.path.exists(CONF.image_conversion_dir)):
         os.makedirs(CONF.image_conversion_dir)
 
+    image_meta = image_service.show(context, image_id)
+    if _is_raw_image(image_meta):
+        # Raw images need no conversion, so they are not staged in
+        # image_conversion_dir. Only a prefix is staged to be checked.
+        _fetch_raw_to_dest(context, image_service, image_id, dest)
+        return
+
     # NOTE(avishay): I'm not crazy about creating temp files which may be
     # large and cause disk full errors which would confuse users.
     # Unfortunately it seems that you can't pipe to 'qemu-img convert' because
@@ -246,7 +404,7 @@ def fetch_to_raw(context, image_service,
     with temporary_file() as tmp:
         fetch(context, image_service, image_id, tmp, user_id, project_id)
 
-        if is_xenserver_image(context, image_service, image_id):
+        if is_xenserver_format(image_meta):
             replace_xenserver_image_with_coalesced_vhd(tmp)
 
         data = qemu_img_info(tmp)
@@ -268,13 +426,8 @@ def fetch_to_raw(context, image_service,
 
         # NOTE(jdg): I'm using qemu-img convert to write
         # to the volume regardless if it *needs* conversion or not
-        # TODO(avishay): We can speed this up by checking if the image is raw
-        # and if so, writing directly to the device. However, we need to keep
-        # check via 'qemu-img info' that what we copied was in fact a raw
-        # image and not a different format with a backing file, which may be
-        # malicious.
         LOG.debug("%s was %s, converting to raw" % (image_id, fmt))
-        convert_image(tmp, dest, 'raw')
+        convert_image(tmp, dest, 'raw', src_format=fmt)
 
         data = qemu_img_info(dest)
         if data.file_format != "raw":
@@ -284,26 +437,85 @@ def fetch_to_raw(context, image_service,
                 data.file_format)
 
 
-def upload_volume(context, image_service, image_meta, volume_path):
+class ImageUploadReader(object):
+    """File-like object reading an image file for upload to Glance.
+
+    Reads are passed through to the image file, and progress is reported
+    to progress_callback(bytes_sent, total_bytes), if given, and logged
+    every tenth of the image. seek and tell let glanceclient send the image
+    size, and a retried upload start again from the beginning of the image
+    rather than where the failed attempt stopped reading.
+    """
+
+    def __init__(self, image_file, image_id, progress_callback=None):
+        self.image_file = image_file
+        self.image_id = image_id
+        self.progress_callback = progress_callback
+        self.image_file.seek(0, os.SEEK_END)
+        self.size = self.image_file.tell()
+        self.image_file.seek(0)
+        self.offset = 0
+        self.logged_tenths = 0
+
+    def read(self, length=-1):
+        data = self.image_file.read(length)
+        self.offset += len(data)
+        self._report()
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.image_file.seek(offset, whence)
+        self.offset = self.image_file.tell()
+        self.logged_tenths = 0
+
+    def tell(self):
+        return self.offset
+
+    def _report(self):
+        if self.progress_callback:
+            self.progress_callback(self.offset, self.size)
+        if not self.size:
+            return
+        tenths = self.offset * 10 // self.size
+        if tenths > self.logged_tenths:
+            self.logged_tenths = tenths
+            LOG.debug(_('Uploaded %(percent)d%% of image %(image_id)s') %
+                      {'percent': tenths * 10, 'image_id': self.image_id})
+
+
+def _upload_file(context, image_service, image_id, path, progress_callback):
+    with fileutils.file_open(path, 'rb') as image_file:
+        reader = ImageUploadReader(image_file, image_id, progress_callback)
+        image_service.update(context, image_id, {}, reader)
+
+
+def upload_volume(context, image_service, image_meta, volume_path,
+                  progress_callback=None):
+    """Upload the volume at volume_path to the image of image_meta.
+
+    progress_callback, if given, is called with the number of bytes sent
+    so far and the total number of bytes to send as the upload proceeds.
+    """
     image_id = image_meta['id']
     if (image_meta['disk_format'] == 'raw'):
         LOG.debug("%s was raw, no need to convert to %s" %
                   (image_id, image_meta['disk_format']))
         with utils.temporary_chown(volume_path):
-            with fileutils.file_open(volume_path) as image_file:
-                image_service.update(context, image_id, {}, image_file)
+            _upload_file(context, image_service, image_id, volume_path,
+                         progress_callback)
         return
 
     if (CONF.image_conversion_dir and not
             os.path.exists(CONF.image_conversion_dir)):
         os.makedirs(CONF.image_conversion_dir)
 
-    fd, tmp = tempfile.mkstemp(dir=CONF.image_conversion_dir)
-    os.close(fd)
-    with fileutils.remove_path_on_error(tmp):
+    # 'qemu-img convert' leaves the zeroed regions of the volume out
+    # of formats such as qcow2, so only allocated data is uploaded.
+    with temporary_file() as tmp:
         LOG.debug("%s was raw, converting to %s" %
                   (image_id, image_meta['disk_format']))
-        convert_image(volume_path, tmp, image_meta['disk_format'])
+        convert_image(volume_path, tmp, image_meta['disk_format'],
+                      src_format='raw')
 
         data = qemu_img_info(tmp)
         if data.file_format != image_meta['disk_format']:
@@ -312,9 +524,8 @@ def upload_volume(context, image_service, image_meta, volume_path):
                 reason=_("Converted to %(f1)s, but format is now %(f2)s") %
                 {'f1': image_meta['disk_format'], 'f2': data.file_format})
 
-        with fileutils.file_open(tmp) as image_file:
-            image_service.update(context, image_id, {}, image_file)
-        os.unlink(tmp)
+        _upload_file(context, image_service, image_id, tmp,
+                     progress_callback)
 
 
 def is_xenserver_image(context, image_service, image_id):
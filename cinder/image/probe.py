@@ -0,0 +1,144 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Read the format of disk images from their headers.
+
+Probing an image this way gives what 'qemu-img info' reports for qcow2,
+sparse vmdk and vhd images without running a subprocess. Only images whose
+header positively identifies one of these formats are probed. Everything
+else, raw images included, is left to 'qemu-img info': qemu knows more
+formats than are parsed here, and an image reported as raw that qemu reads
+as another format could have it follow a backing file or extents on the
+host.
+"""
+
+
+import os
+import re
+import struct
+
+
+HEADER_SIZE = 1024
+SECTOR_SIZE = 512
+
+QCOW2_MAGIC = 'QFI\xfb'
+# magic, version, backing_file_offset, backing_file_size, cluster_bits,
+# size, crypt_method
+QCOW2_HEADER = struct.Struct('>4sIQIIQI')
+
+VMDK_MAGIC = 'KDMV'
+# magic, version, flags, capacity, grain_size, descriptor_offset,
+# descriptor_size
+VMDK_HEADER = struct.Struct('<4sIIQQQQ')
+VMDK_PARENT_RE = re.compile(r'^parentFileNameHint\s*=\s*"(.*)"\s*$', re.M)
+
+VHD_MAGIC = 'conectix'
+# data_offset, current_size, cylinders, heads, sectors_per_track, disk_type
+VHD_FOOTER = struct.Struct('>16xQ24xQHBBI')
+VHD_DIFFERENCING = 4
+# parent_locator, parent_name
+VHD_DYNAMIC_PARENT_NAME = struct.Struct('>64x512s')
+VHD_MAX_GEOMETRY_SECTORS = 65535 * 16 * 255
+
+
+def probe(path):
+    """Return the 'qemu-img info' details of the image at path, or None.
+
+    The details are a dict of file_format, virtual_size, backing_file,
+    cluster_size, disk_size and encryption. None is returned for any other
+    image than a qcow2, vmdk or vhd one, raw images included.
+    """
+    try:
+        with open(path, 'rb') as image_file:
+            header = image_file.read(HEADER_SIZE)
+            stat = os.fstat(image_file.fileno())
+            info = {'image': path,
+                    'file_format': None,
+                    'virtual_size': None,
+                    'backing_file': None,
+                    'cluster_size': None,
+                    'disk_size': stat.st_blocks * SECTOR_SIZE,
+                    'encryption': None}
+            if header.startswith(QCOW2_MAGIC):
+                return _probe_qcow2(image_file, header, info)
+            if header.startswith(VMDK_MAGIC):
+                return _probe_vmdk(image_file, header, info)
+            if header.startswith(VHD_MAGIC):
+                return _probe_vhd(image_file, header, info)
+            return None
+    except (IOError, OSError, ValueError, struct.error):
+        return None
+
+
+def _read(image_file, offset, length):
+    image_file.seek(offset)
+    data = image_file.read(length)
+    if len(data) != length:
+        raise struct.error('image truncated')
+    return data
+
+
+def _probe_qcow2(image_file, header, info):
+    (_magic, version, backing_file_offset, backing_file_size, cluster_bits,
+     size, crypt_method) = QCOW2_HEADER.unpack_from(header)
+    if version not in (2, 3):
+        # qcow version 1 is another format for qemu
+        return None
+    info['file_format'] = 'qcow2'
+    info['virtual_size'] = size
+    info['cluster_size'] = 1 << cluster_bits
+    if crypt_method:
+        info['encryption'] = 'yes'
+    if backing_file_offset:
+        info['backing_file'] = _read(image_file, backing_file_offset,
+                                     backing_file_size)
+    return info
+
+
+def _probe_vmdk(image_file, header, info):
+    (_magic, _version, _flags, capacity, grain_size, descriptor_offset,
+     descriptor_size) = VMDK_HEADER.unpack_from(header)
+    info['file_format'] = 'vmdk'
+    info['virtual_size'] = capacity * SECTOR_SIZE
+    info['cluster_size'] = grain_size * SECTOR_SIZE
+    if descriptor_offset:
+        descriptor = _read(image_file, descriptor_offset * SECTOR_SIZE,
+                           descriptor_size * SECTOR_SIZE)
+        parent = VMDK_PARENT_RE.search(descriptor.split('\0', 1)[0])
+        if parent:
+            info['backing_file'] = parent.group(1)
+    return info
+
+
+def _probe_vhd(image_file, header, info):
+    (data_offset, current_size, cylinders, heads, sectors,
+     disk_type) = VHD_FOOTER.unpack_from(header)
+    # qemu sizes images by their geometry, unless it is the largest one
+    total_sectors = cylinders * heads * sectors
+    if total_sectors == VHD_MAX_GEOMETRY_SECTORS:
+        info['virtual_size'] = current_size
+    else:
+        info['virtual_size'] = total_sectors * SECTOR_SIZE
+    info['file_format'] = 'vpc'
+    if disk_type == VHD_DIFFERENCING:
+        dynamic_header = _read(image_file, data_offset,
+                               VHD_DYNAMIC_PARENT_NAME.size)
+        parent_name, = VHD_DYNAMIC_PARENT_NAME.unpack(dynamic_header)
+        parent_name = parent_name.decode('utf-16-be').rstrip(u'\0')
+        info['backing_file'] = parent_name.encode('utf-8') or 'unknown'
+    return info
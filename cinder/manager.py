@@ -53,6 +53,7 @@ This module provides Manager, a base class for managers.
 
 """
 
+import copy
 
 from oslo.config import cfg
 
@@ -60,11 +61,25 @@ from cinder.db import base
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import periodic_task
 from cinder.openstack.common.rpc import dispatcher as rpc_dispatcher
+from cinder.openstack.common import timeutils
 from cinder.scheduler import rpcapi as scheduler_rpcapi
 from cinder import version
 
 
+manager_opts = [
+    cfg.IntOpt('capabilities_full_report_interval',
+               default=0,
+               help='seconds between reports of all the capabilities of '
+                    'a service to the schedulers, the periodic reports in '
+                    'between only carry the capabilities that changed. '
+                    'Only set it once all the schedulers take changed '
+                    'capabilities (scheduler RPC API 1.5). (Always report '
+                    'all of them, as older schedulers expect, by setting '
+                    'to 0)'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(manager_opts)
 LOG = logging.getLogger(__name__)
 
 
@@ -116,25 +131,77 @@ class SchedulerDependentManager(Manager):
     manager.Manager directly. Updates are only sent after
     update_service_capabilities is called with non-None values.
 
+    When capabilities_full_report_interval is set, every update carries a
+    version number. A full report sends all the capabilities, the updates
+    that follow it only send the capabilities that differ from that full
+    report along with its version, until the next full report is due.
+    Otherwise every update is a full report without a version.
+
     """
 
     def __init__(self, host=None, db_driver=None, service_name='undefined'):
         self.last_capabilities = None
         self.service_name = service_name
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
+        self._capabilities_version = 0
+        self._reported_capabilities = None
+        self._reported_capabilities_version = None
+        self._reported_capabilities_at = None
         super(SchedulerDependentManager, self).__init__(host, db_driver)
 
     def update_service_capabilities(self, capabilities):
         """Remember these capabilities to send on next periodic update."""
         self.last_capabilities = capabilities
 
+    def _full_report_due(self):
+        interval = CONF.capabilities_full_report_interval
+        return (self._reported_capabilities is None or
+                timeutils.is_older_than(self._reported_capabilities_at,
+                                        interval) or
+                any(key not in self.last_capabilities
+                    for key in self._reported_capabilities))
+
     @periodic_task.periodic_task
-    def _publish_service_capabilities(self, context):
+    def _publish_service_capabilities(self, context, full_report=False):
         """Pass data back to the scheduler at a periodic interval."""
-        if self.last_capabilities:
+        if not self.last_capabilities:
+            return
+        if CONF.capabilities_full_report_interval <= 0:
+            LOG.debug(_('Notifying Schedulers of capabilities ...'))
+            self.scheduler_rpcapi.update_service_capabilities(
+                context,
+                self.service_name,
+                self.host,
+                self.last_capabilities)
+            return
+
+        self._capabilities_version += 1
+        if full_report or self._full_report_due():
             LOG.debug(_('Notifying Schedulers of capabilities ...'))
             self.scheduler_rpcapi.update_service_capabilities(
                 context,
                 self.service_name,
                 self.host,
+                self.last_capabilities,
+                capabilities_version=self._capabilities_version)
+            self._reported_capabilities = copy.deepcopy(
                 self.last_capabilities)
+            self._reported_capabilities_version = self._capabilities_version
+            self._reported_capabilities_at = timeutils.utcnow()
+            return
+
+        # An update is sent even when nothing changed, the schedulers
+        # reset what they assumed was consumed on the service from it
+        changed = dict((key, value) for key, value
+                       in self.last_capabilities.iteritems()
+                       if (key not in self._reported_capabilities or
+                           self._reported_capabilities[key] != value))
+        LOG.debug(_('Notifying Schedulers of changed capabilities %s'),
+                  changed.keys())
+        self.scheduler_rpcapi.update_service_capabilities(
+            context,
+            self.service_name,
+            self.host,
+            copy.deepcopy(changed),
+            capabilities_version=self._capabilities_version,
+            base_version=self._reported_capabilities_version)
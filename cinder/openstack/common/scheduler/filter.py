@@ -30,6 +30,15 @@ class BaseFilter(object):
         """
         return True
 
+    def _compile_filter(self, filter_properties):
+        """Return a function telling if an object passes the filter.
+
+        The function is called for each object filtered in a request.
+        Override this in a subclass to work out what only depends on the
+        filter_properties once for all the objects.
+        """
+        return lambda obj: self._filter_one(obj, filter_properties)
+
     def filter_all(self, filter_obj_list, filter_properties):
         """Yield objects that pass the filter.
 
@@ -37,8 +46,9 @@ class BaseFilter(object):
         decisions on all objects.  Otherwise, one can just override
         _filter_one() to filter a single object.
         """
+        passes = self._compile_filter(filter_properties)
         for obj in filter_obj_list:
-            if self._filter_one(obj, filter_properties):
+            if passes(obj):
                 yield obj
 
 
@@ -51,6 +61,7 @@ class BaseFilterHandler(object):
         self.namespace = filter_namespace
         self.filter_class_type = filter_class_type
         self.filter_manager = extension.ExtensionManager(filter_namespace)
+        self._filters = {}
 
     def _is_correct_class(self, obj):
         """Return whether an object is a class of the correct type and
@@ -64,8 +75,16 @@ class BaseFilterHandler(object):
         return [x.plugin for x in self.filter_manager
                 if self._is_correct_class(x.plugin)]
 
+    def _get_filter(self, filter_cls):
+        """Return the instance of filter_cls shared by the requests."""
+        try:
+            return self._filters[filter_cls]
+        except KeyError:
+            return self._filters.setdefault(filter_cls, filter_cls())
+
     def get_filtered_objects(self, filter_classes, objs,
                              filter_properties):
         for filter_cls in filter_classes:
-            objs = filter_cls().filter_all(objs, filter_properties)
+            objs = self._get_filter(filter_cls).filter_all(objs,
+                                                           filter_properties)
         return list(objs)
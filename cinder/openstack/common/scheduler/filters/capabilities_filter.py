@@ -24,13 +24,14 @@ LOG = logging.getLogger(__name__)
 class CapabilitiesFilter(filters.BaseHostFilter):
     """HostFilter to work with resource (instance & volume) type records."""
 
-    def _satisfies_extra_specs(self, capabilities, resource_type):
-        """Check that the capabilities provided by the services
-        satisfy the extra specs associated with the instance type"""
+    def _compile_extra_specs(self, resource_type):
+        """Return the capability path and matcher of each extra spec
+        that applies to the capabilities of the services"""
         extra_specs = resource_type.get('extra_specs', [])
         if not extra_specs:
-            return True
+            return []
 
+        requirements = []
         for key, req in extra_specs.iteritems():
             # Either not scope format, or in capabilities scope
             scope = key.split(':')
@@ -38,26 +39,39 @@ class CapabilitiesFilter(filters.BaseHostFilter):
                 continue
             elif scope[0] == "capabilities":
                 del scope[0]
+            requirements.append(
+                (scope, extra_specs_ops.compile_requirement(req)))
+        return requirements
 
+    def _satisfies_requirements(self, capabilities, requirements):
+        for scope, matches in requirements:
             cap = capabilities
-            for index in range(0, len(scope)):
+            for item in scope:
                 try:
-                    cap = cap.get(scope[index], None)
+                    cap = cap.get(item, None)
                 except AttributeError:
                     return False
                 if cap is None:
                     return False
-            if not extra_specs_ops.match(cap, req):
+            if not matches(cap):
                 return False
         return True
 
-    def host_passes(self, host_state, filter_properties):
-        """Return a list of hosts that can create instance_type."""
+    def _satisfies_extra_specs(self, capabilities, resource_type):
+        """Check that the capabilities provided by the services
+        satisfy the extra specs associated with the instance type"""
+        return self._satisfies_requirements(
+            capabilities, self._compile_extra_specs(resource_type))
+
+    def _compile_filter(self, filter_properties):
         # Note(zhiteng) Currently only Cinder and Nova are using
         # this filter, so the resource type is either instance or
         # volume.
-        resource_type = filter_properties.get('resource_type')
-        if not self._satisfies_extra_specs(host_state.capabilities,
-                                           resource_type):
-            return False
-        return True
+        requirements = self._compile_extra_specs(
+            filter_properties.get('resource_type'))
+        return lambda host_state: self._satisfies_requirements(
+            host_state.capabilities, requirements)
+
+    def host_passes(self, host_state, filter_properties):
+        """Return a list of hosts that can create instance_type."""
+        return self._compile_filter(filter_properties)(host_state)
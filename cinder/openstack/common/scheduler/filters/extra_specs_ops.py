@@ -38,35 +38,40 @@ _op_methods = {'=': lambda x, y: float(x) >= float(y),
                's>=': operator.ge}
 
 
-def match(value, req):
+def compile_requirement(req):
+    """Return a function telling if a value satisfies the requirement.
+
+    The requirement is parsed once, so the function can be applied to
+    the values of many hosts.
+    """
     words = req.split()
 
     op = method = None
     if words:
-        op = words.pop(0)
+        op = words[0]
         method = _op_methods.get(op)
 
     if op != '<or>' and not method:
-        return value == req
-
-    if value is None:
-        return False
+        return lambda value: value == req
 
     if op == '<or>':  # Ex: <or> v1 <or> v2 <or> v3
-        while True:
-            if words.pop(0) == value:
-                return True
-            if not words:
-                break
-            op = words.pop(0)  # remove a keyword <or>
-            if not words:
-                break
-        return False
+        choices = words[1::2]
+        return lambda value: value is not None and value in choices
+
+    if len(words) < 2:
+        return lambda value: False
+    operand = words[1]
 
-    try:
-        if words and method(value, words[0]):
-            return True
-    except ValueError:
-        pass
+    def _match(value):
+        if value is None:
+            return False
+        try:
+            return bool(method(value, operand))
+        except ValueError:
+            return False
 
-    return False
+    return _match
+
+
+def match(value, req):
+    return compile_requirement(req)(value)
@@ -86,48 +86,59 @@ class JsonFilter(filters.BaseHostFilter):
         'and': _and,
     }
 
-    def _parse_string(self, string, host_state):
+    def _compile_string(self, string):
         """Strings prefixed with $ are capability lookups in the
         form '$variable' where 'variable' is an attribute in the
         HostState class.  If $variable is a dictionary, you may
         use: $variable.dictkey
         """
         if not string:
-            return None
+            return lambda host_state: None
         if not string.startswith("$"):
-            return string
+            return lambda host_state: string
 
         path = string[1:].split(".")
-        obj = getattr(host_state, path[0], None)
-        if obj is None:
-            return None
-        for item in path[1:]:
-            obj = obj.get(item, None)
+
+        def _lookup(host_state):
+            obj = getattr(host_state, path[0], None)
             if obj is None:
                 return None
-        return obj
+            for item in path[1:]:
+                obj = obj.get(item, None)
+                if obj is None:
+                    return None
+            return obj
+
+        return _lookup
 
-    def _process_filter(self, query, host_state):
-        """Recursively parse the query structure."""
+    def _compile_query(self, query):
+        """Recursively turn the query structure into a function of the
+        host state.
+        """
         if not query:
-            return True
+            return lambda host_state: True
         cmd = query[0]
         method = self.commands[cmd]
-        cooked_args = []
+        arg_getters = []
         for arg in query[1:]:
             if isinstance(arg, list):
-                arg = self._process_filter(arg, host_state)
+                arg_getters.append(self._compile_query(arg))
             elif isinstance(arg, basestring):
-                arg = self._parse_string(arg, host_state)
-            if arg is not None:
-                cooked_args.append(arg)
-        result = method(self, cooked_args)
-        return result
+                arg_getters.append(self._compile_string(arg))
+            else:
+                arg_getters.append(lambda host_state, arg=arg: arg)
 
-    def host_passes(self, host_state, filter_properties):
-        """Return a list of hosts that can fulfill the requirements
-        specified in the query.
-        """
+        def _process(host_state):
+            cooked_args = []
+            for get_arg in arg_getters:
+                arg = get_arg(host_state)
+                if arg is not None:
+                    cooked_args.append(arg)
+            return method(self, cooked_args)
+
+        return _process
+
+    def _compile_filter(self, filter_properties):
         # TODO(zhiteng) Add description for filter_properties structure
         # and scheduler_hints.
         try:
@@ -135,16 +146,24 @@ class JsonFilter(filters.BaseHostFilter):
         except KeyError:
             query = None
         if not query:
-            return True
+            return lambda host_state: True
 
         # NOTE(comstud): Not checking capabilities or service for
         # enabled/disabled so that a provided json filter can decide
 
-        result = self._process_filter(jsonutils.loads(query), host_state)
-        if isinstance(result, list):
-            # If any succeeded, include the host
-            result = any(result)
-        if result:
-            # Filter it out.
-            return True
-        return False
+        process = self._compile_query(jsonutils.loads(query))
+
+        def _passes(host_state):
+            result = process(host_state)
+            if isinstance(result, list):
+                # If any succeeded, include the host
+                result = any(result)
+            return bool(result)
+
+        return _passes
+
+    def host_passes(self, host_state, filter_properties):
+        """Return a list of hosts that can fulfill the requirements
+        specified in the query.
+        """
+        return self._compile_filter(filter_properties)(host_state)
@@ -63,6 +63,7 @@ class BaseWeightHandler(object):
         self.namespace = weight_namespace
         self.weighed_object_type = weighed_object_type
         self.weight_manager = extension.ExtensionManager(weight_namespace)
+        self._weighers = {}
 
     def _is_correct_class(self, obj):
         """Return whether an object is a class of the correct type and
@@ -76,6 +77,13 @@ class BaseWeightHandler(object):
         return [x.plugin for x in self.weight_manager
                 if self._is_correct_class(x.plugin)]
 
+    def _get_weigher(self, weigher_cls):
+        """Return the instance of weigher_cls shared by the requests."""
+        try:
+            return self._weighers[weigher_cls]
+        except KeyError:
+            return self._weighers.setdefault(weigher_cls, weigher_cls())
+
     def get_weighed_objects(self, weigher_classes, obj_list,
                             weighing_properties):
         """Return a sorted (highest score first) list of WeighedObjects."""
@@ -85,7 +93,7 @@ class BaseWeightHandler(object):
 
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
         for weigher_cls in weigher_classes:
-            weigher = weigher_cls()
+            weigher = self._get_weigher(weigher_cls)
             weigher.weigh_objects(weighed_objs, weighing_properties)
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
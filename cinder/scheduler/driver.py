@@ -24,7 +24,9 @@ Scheduler base class that all Schedulers should inherit from
 from oslo.config import cfg
 
 from cinder import db
+from cinder import exception
 from cinder.openstack.common import importutils
+from cinder.openstack.common import log as logging
 from cinder.openstack.common import timeutils
 from cinder import utils
 from cinder.volume import rpcapi as volume_rpcapi
@@ -42,6 +44,8 @@ scheduler_driver_opts = [
 CONF = cfg.CONF
 CONF.register_opts(scheduler_driver_opts)
 
+LOG = logging.getLogger(__name__)
+
 
 def volume_update_db(context, volume_id, host):
     '''Set the host and set the scheduled_at field of a volume.
@@ -70,11 +74,14 @@ class Scheduler(object):
         """
         return self.host_manager.get_service_capabilities()
 
-    def update_service_capabilities(self, service_name, host, capabilities):
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    capabilities_version=None,
+                                    base_version=None):
         """Process a capability update from a service node."""
-        self.host_manager.update_service_capabilities(service_name,
-                                                      host,
-                                                      capabilities)
+        self.host_manager.update_service_capabilities(
+            service_name, host, capabilities,
+            capabilities_version=capabilities_version,
+            base_version=base_version)
 
     def hosts_up(self, context, topic):
         """Return the list of hosts that have a running service for topic."""
@@ -95,3 +102,27 @@ class Scheduler(object):
     def schedule_create_volume(self, context, request_spec, filter_properties):
         """Must override schedule method for scheduler to work."""
         raise NotImplementedError(_("Must implement schedule_create_volume"))
+
+    def schedule_create_volumes(self, context, request_specs,
+                                filter_properties_list):
+        """Schedule the creation of several volumes.
+
+        Returns, for each volume, the exception that kept it from being
+        created or None. Schedulers that can place several volumes at
+        once override this, by default they are scheduled one by one.
+        """
+        errors = []
+        for request_spec, filter_properties in zip(request_specs,
+                                                   filter_properties_list):
+            try:
+                self.schedule_create_volume(context, request_spec,
+                                            filter_properties)
+            except exception.NoValidHost as ex:
+                errors.append(ex)
+            except Exception as ex:
+                LOG.exception(_("Failed to schedule volume %s") %
+                              request_spec.get('volume_id'))
+                errors.append(ex)
+            else:
+                errors.append(None)
+        return errors
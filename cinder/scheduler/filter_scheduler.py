@@ -20,9 +20,12 @@ You can customize this scheduler by specifying your own volume Filters and
 Weighing Functions.
 """
 
+import copy
+
 from oslo.config import cfg
 
 from cinder import exception
+from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
 from cinder.scheduler import driver
 from cinder.scheduler import scheduler_options
@@ -66,14 +69,90 @@ class FilterScheduler(driver.Scheduler):
         if not weighed_host:
             raise exception.NoValidHost(reason="")
 
-        host = weighed_host.obj.host
+        self._create_volume_on_host(context, request_spec,
+                                    filter_properties, weighed_host.obj)
+
+    def schedule_create_volumes(self, context, request_specs,
+                                filter_properties_list):
+        """Schedule the creation of several volumes in one pass.
+
+        Hosts are filtered and weighed once for all the volumes whose
+        request specs only differ by volume id. These volumes are then
+        placed one after the other, each consuming its size from the host
+        it is placed on, so that the next placement accounts for it.
+        """
+        errors = [None] * len(request_specs)
+        batches = {}
+        for index, request_spec in enumerate(request_specs):
+            key = (jsonutils.dumps(dict(request_spec, volume_id=None),
+                                   sort_keys=True),
+                   jsonutils.dumps(filter_properties_list[index],
+                                   sort_keys=True))
+            batches.setdefault(key, []).append(index)
+
+        for indexes in batches.itervalues():
+            try:
+                self._schedule_batch(context, request_specs,
+                                     filter_properties_list, indexes, errors)
+            except Exception as ex:
+                LOG.exception(_("Failed to schedule volumes"))
+                for index in indexes:
+                    if errors[index] is None:
+                        errors[index] = ex
+        return errors
+
+    def _schedule_batch(self, context, request_specs,
+                        filter_properties_list, indexes, errors):
+        request_spec = request_specs[indexes[0]]
+        filter_properties = dict(filter_properties_list[indexes[0]])
+        weighed_hosts = self._get_weighted_candidates(context, request_spec,
+                                                      filter_properties)
+        hosts = [weighed_host.obj for weighed_host in weighed_hosts or []]
+        volume_properties = request_spec['volume_properties']
+
+        for index in indexes:
+            if not hosts:
+                errors[index] = exception.NoValidHost(reason="")
+                continue
+            if weighed_hosts is None:
+                weighed_hosts = self.host_manager.get_weighed_hosts(
+                    hosts, filter_properties)
+            host_state = weighed_hosts[0].obj
+            weighed_hosts = None
+            LOG.debug(_("Choosing %s") % host_state)
+            host_state.consume_from_volume(volume_properties)
+            if not self.host_manager.get_filtered_hosts([host_state],
+                                                        filter_properties):
+                # No room left for another volume of the batch
+                hosts.remove(host_state)
+
+            volume_request_spec = request_specs[index]
+            volume_request_spec['resource_properties'] = \
+                volume_properties.copy()
+            volume_filter_properties = dict(filter_properties,
+                                            request_spec=volume_request_spec)
+            if 'retry' in filter_properties:
+                volume_filter_properties['retry'] = copy.deepcopy(
+                    filter_properties['retry'])
+            try:
+                self._create_volume_on_host(context, volume_request_spec,
+                                            volume_filter_properties,
+                                            host_state)
+            except Exception as ex:
+                LOG.exception(_("Failed to create volume %s") %
+                              volume_request_spec['volume_id'])
+                errors[index] = ex
+
+    def _create_volume_on_host(self, context, request_spec,
+                               filter_properties, host_state):
+        host = host_state.host
         volume_id = request_spec['volume_id']
         snapshot_id = request_spec['snapshot_id']
         image_id = request_spec['image_id']
 
         updated_volume = driver.volume_update_db(context, volume_id, host)
         self._post_select_populate_filter_properties(filter_properties,
-                                                     weighed_host.obj)
+                                                     host_state)
 
         # context is not serializable
         filter_properties.pop('context', None)
@@ -16,8 +16,6 @@
 #    under the License.
 
 
-import math
-
 from cinder.openstack.common import log as logging
 from cinder.openstack.common.scheduler import filters
 
@@ -38,15 +36,11 @@ class CapacityFilter(filters.BaseHostFilter):
                         "volume node info collection broken."))
             return False
 
-        free_space = host_state.free_capacity_gb
-        if free_space == 'infinite' or free_space == 'unknown':
-            # NOTE(zhiteng) for those back-ends cannot report actual
-            # available capacity, we assume it is able to serve the
-            # request.  Even if it was not, the retry mechanism is
-            # able to handle the failure by rescheduling
-            return True
-        reserved = float(host_state.reserved_percentage) / 100
-        free = math.floor(free_space * (1 - reserved))
+        # Back-ends reporting 'infinite' or 'unknown' free capacity are
+        # assumed to be able to serve the request.  Even if they were
+        # not, the retry mechanism is able to handle the failure by
+        # rescheduling
+        free = host_state.usable_capacity_gb
         if free < volume_size:
             LOG.warning(_("Insufficient free space for volume creation "
                         "(requested / avail): "
@@ -17,10 +17,12 @@
 Manage hosts in the current zone.
 """
 
+import math
 import UserDict
 
 from oslo.config import cfg
 
+from cinder import context
 from cinder import db
 from cinder import exception
 from cinder.openstack.common import log as logging
@@ -28,6 +30,7 @@ from cinder.openstack.common.scheduler import filters
 from cinder.openstack.common.scheduler import weights
 from cinder.openstack.common import timeutils
 from cinder import utils
+from cinder.volume import rpcapi as volume_rpcapi
 
 
 host_manager_opts = [
@@ -43,7 +46,13 @@ host_manager_opts = [
                 default=[
                     'CapacityWeigher'
                 ],
-                help='Which weigher class names to use for weighing hosts.')
+                help='Which weigher class names to use for weighing hosts.'),
+    cfg.IntOpt('scheduler_host_state_refresh_interval',
+               default=10,
+               help='Seconds between refreshes of the volume services '
+                    'known to the scheduler from the database, 0 to '
+                    'refresh them for every request. Capabilities are '
+                    'updated as the services report them.'),
 ]
 
 CONF = cfg.CONF
@@ -99,11 +108,49 @@ class HostState(object):
         # Mutable available resources.
         # These will change as resources are virtually "consumed".
         self.total_capacity_gb = 0
-        self.free_capacity_gb = None
-        self.reserved_percentage = 0
+        self._free_capacity_gb = None
+        self._reserved_percentage = 0
+        self.usable_capacity_gb = None
 
         self.updated = None
 
+    def _get_free_capacity_gb(self):
+        return self._free_capacity_gb
+
+    def _set_free_capacity_gb(self, free_capacity_gb):
+        self._free_capacity_gb = free_capacity_gb
+        self._update_usable_capacity()
+
+    free_capacity_gb = property(_get_free_capacity_gb, _set_free_capacity_gb)
+
+    def _get_reserved_percentage(self):
+        return self._reserved_percentage
+
+    def _set_reserved_percentage(self, reserved_percentage):
+        self._reserved_percentage = reserved_percentage
+        self._update_usable_capacity()
+
+    reserved_percentage = property(_get_reserved_percentage,
+                                   _set_reserved_percentage)
+
+    def _update_usable_capacity(self):
+        """Work out the free capacity left to volumes.
+
+        It is worked out whenever the capacity changes, so the capacity
+        filters and weighers only compare it for each request.
+        """
+        free_space = self._free_capacity_gb
+        if free_space is None:
+            self.usable_capacity_gb = None
+        elif free_space == 'infinite' or free_space == 'unknown':
+            # NOTE(zhiteng) for those back-ends cannot report actual
+            # available capacity, we assume it is able to serve the
+            # request.
+            self.usable_capacity_gb = float('inf')
+        else:
+            reserved = float(self._reserved_percentage) / 100
+            self.usable_capacity_gb = math.floor(free_space * (1 - reserved))
+
     def update_capabilities(self, capabilities=None, service=None):
         # Read-only capability dicts
 
@@ -157,7 +204,14 @@ class HostManager(object):
 
     def __init__(self):
         self.service_states = {}  # { <host>: {<service>: {cap k : v}}}
+        # Last full capability report of each host and its version, with
+        # the version of the last update applied on top of it
+        self.service_reports = {}  # { <host>: (<report>, <version>, <last>)}
+        # Version of the missed full report each host was asked again for
+        self.full_reports_requested = {}  # { <host>: <version>}
+        self.volume_rpcapi = volume_rpcapi.VolumeAPI()
         self.host_state_map = {}
+        self.host_states_refreshed_at = None
         self.filter_handler = filters.HostFilterHandler('cinder.scheduler.'
                                                         'filters')
         self.filter_classes = self.filter_handler.get_all_classes()
@@ -234,8 +288,14 @@ class HostManager(object):
                                                        hosts,
                                                        weight_properties)
 
-    def update_service_capabilities(self, service_name, host, capabilities):
-        """Update the per-service capabilities based on this notification."""
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    capabilities_version=None,
+                                    base_version=None):
+        """Update the per-service capabilities based on this notification.
+
+        When base_version is given, capabilities only holds the ones that
+        changed since the full report of that version.
+        """
         if service_name != 'volume':
             LOG.debug(_('Ignoring %(service_name)s service update '
                         'from %(host)s'),
@@ -246,24 +306,63 @@ class HostManager(object):
                     "%(host)s.") %
                   {'service_name': service_name, 'host': host})
 
-        # Copy the capabilities, so we don't modify the original dict
-        capab_copy = dict(capabilities)
+        if base_version is None:
+            # Copy the capabilities, so we don't modify the original dict
+            capab_copy = dict(capabilities)
+            self.service_reports[host] = (dict(capabilities),
+                                          capabilities_version,
+                                          capabilities_version)
+        else:
+            report, report_version, last_version = \
+                self.service_reports.get(host, (None, None, None))
+            if report is not None and capabilities_version <= last_version:
+                LOG.debug(_("Ignoring out of date service update from "
+                            "%(host)s.") % {'host': host})
+                return
+            if report is None or report_version != base_version:
+                # Missed the full report the changes are based on
+                self._request_full_report(host, base_version)
+                return
+            capab_copy = dict(report)
+            capab_copy.update(capabilities)
+            self.service_reports[host] = (report, report_version,
+                                          capabilities_version)
         capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
         self.service_states[host] = capab_copy
 
-    def get_all_host_states(self, context):
-        """Returns a dict of all the hosts the HostManager
-          knows about. Also, each of the consumable resources in HostState
-          are pre-populated and adjusted based on data in the db.
+        host_state = self.host_state_map.get(host)
+        if host_state:
+            host_state.update_capabilities(capab_copy, host_state.service)
+            host_state.update_from_volume_capability(capab_copy)
+        else:
+            # Pick up the service of a new host on the next request
+            self.host_states_refreshed_at = None
 
-          For example:
-          {'192.168.1.100': HostState(), ...}
-        """
+    def _request_full_report(self, host, base_version):
+        """Ask host for a full capability report.
 
-        # Get resource usage across the available volume nodes:
+        It is only asked once for each full report that was missed.
+        """
+        if self.full_reports_requested.get(host) == base_version:
+            return
+        self.full_reports_requested[host] = base_version
+        LOG.debug(_("Missed the capability report %(version)s of "
+                    "%(host)s, asking it for a full report.") %
+                  {'version': base_version, 'host': host})
+        self.volume_rpcapi.publish_service_capabilities(
+            context.get_admin_context(), host=host)
+
+    def _host_states_expired(self):
+        interval = CONF.scheduler_host_state_refresh_interval
+        return (interval <= 0 or self.host_states_refreshed_at is None or
+                timeutils.is_older_than(self.host_states_refreshed_at,
+                                        interval))
+
+    def _refresh_host_states(self, context):
+        """Rebuild the host states from the volume services in the db."""
         topic = CONF.volume_topic
         volume_services = db.service_get_all_by_topic(context, topic)
-        self.host_state_map.clear()
+        host_state_map = {}
         for service in volume_services:
             host = service['host']
             if not utils.service_is_up(service) or service['disabled']:
@@ -281,8 +380,28 @@ class HostManager(object):
                                                  capabilities=capabilities,
                                                  service=
                                                  dict(service.iteritems()))
-                self.host_state_map[host] = host_state
+            host_state_map[host] = host_state
             # update host_state
             host_state.update_from_volume_capability(capabilities)
 
+        # Replaced rather than updated, as other requests may be going
+        # through the current one
+        self.host_state_map = host_state_map
+        self.host_states_refreshed_at = timeutils.utcnow()
+
+    def get_all_host_states(self, context):
+        """Returns a dict of all the hosts the HostManager
+          knows about. Also, each of the consumable resources in HostState
+          are pre-populated and adjusted based on data in the db.
+
+          For example:
+          {'192.168.1.100': HostState(), ...}
+
+          Host states are kept between requests. Capability updates are
+          applied to them as they arrive, and the volume services are
+          only read from the db every scheduler_host_state_refresh_interval
+          seconds.
+        """
+        if self._host_states_expired():
+            self._refresh_host_states(context)
         return self.host_state_map.itervalues()
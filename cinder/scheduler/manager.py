@@ -48,7 +48,7 @@ LOG = logging.getLogger(__name__)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes."""
 
-    RPC_API_VERSION = '1.3'
+    RPC_API_VERSION = '1.5'
 
     def __init__(self, scheduler_driver=None, service_name=None,
                  *args, **kwargs):
@@ -70,13 +70,16 @@ class SchedulerManager(manager.Manager):
         return self.driver.get_service_capabilities()
 
     def update_service_capabilities(self, context, service_name=None,
-                                    host=None, capabilities=None, **kwargs):
+                                    host=None, capabilities=None,
+                                    capabilities_version=None,
+                                    base_version=None, **kwargs):
         """Process a capability update from a service node."""
         if capabilities is None:
             capabilities = {}
-        self.driver.update_service_capabilities(service_name,
-                                                host,
-                                                capabilities)
+        self.driver.update_service_capabilities(
+            service_name, host, capabilities,
+            capabilities_version=capabilities_version,
+            base_version=base_version)
 
     def create_volume(self, context, topic, volume_id, snapshot_id=None,
                       image_id=None, request_spec=None,
@@ -114,6 +117,20 @@ class SchedulerManager(manager.Manager):
                                                   volume_state,
                                                   context, ex, request_spec)
 
+    def create_volumes(self, context, topic, request_specs,
+                       filter_properties_list=None):
+        """Schedule the creation of several volumes in one request."""
+        if filter_properties_list is None:
+            filter_properties_list = [{} for spec in request_specs]
+        errors = self.driver.schedule_create_volumes(context, request_specs,
+                                                     filter_properties_list)
+        for request_spec, ex in zip(request_specs, errors):
+            if ex is not None:
+                volume_state = {'volume_state': {'status': 'error'}}
+                self._set_volume_state_and_notify('create_volume',
+                                                  volume_state,
+                                                  context, ex, request_spec)
+
     def _set_volume_state_and_notify(self, method, updates, context, ex,
                                      request_spec):
         LOG.error(_("Failed to schedule_%(method)s: %(ex)s") %
@@ -37,6 +37,9 @@ class SchedulerAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
         1.2 - Add request_spec, filter_properties arguments
               to create_volume()
         1.3 - Add migrate_volume_to_host() method
+        1.4 - Add create_volumes() method
+        1.5 - Add capabilities_version, base_version arguments
+              to update_service_capabilities()
     '''
 
     RPC_API_VERSION = '1.0'
@@ -60,6 +63,16 @@ class SchedulerAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
             filter_properties=filter_properties),
             version='1.2')
 
+    def create_volumes(self, ctxt, topic, request_specs,
+                       filter_properties_list):
+        request_specs_p = jsonutils.to_primitive(request_specs)
+        return self.cast(ctxt, self.make_msg(
+            'create_volumes',
+            topic=topic,
+            request_specs=request_specs_p,
+            filter_properties_list=filter_properties_list),
+            version='1.4')
+
     def migrate_volume_to_host(self, ctxt, topic, volume_id, host,
                                force_host_copy=False, request_spec=None,
                                filter_properties=None):
@@ -76,7 +89,17 @@ class SchedulerAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
 
     def update_service_capabilities(self, ctxt,
                                     service_name, host,
-                                    capabilities):
+                                    capabilities, capabilities_version=None,
+                                    base_version=None):
+        if capabilities_version is None:
+            # A full report the schedulers older than 1.5 understand
+            self.fanout_cast(ctxt, self.make_msg('update_service_capabilities',
+                             service_name=service_name, host=host,
+                             capabilities=capabilities))
+            return
         self.fanout_cast(ctxt, self.make_msg('update_service_capabilities',
                          service_name=service_name, host=host,
-                         capabilities=capabilities))
+                         capabilities=capabilities,
+                         capabilities_version=capabilities_version,
+                         base_version=base_version),
+                         version='1.5')
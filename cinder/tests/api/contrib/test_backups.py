@@ -55,10 +55,11 @@ class BackupsAPITestCase(test.TestCase):
                        display_description='this is a test backup',
                        container='volumebackups',
                        status='creating',
-                       size=0, object_count=0):
+                       size=0, object_count=0, parent_id=None):
         """Create a backup object."""
         backup = {}
         backup['volume_id'] = volume_id
+        backup['parent_id'] = parent_id
         backup['user_id'] = 'fake'
         backup['project_id'] = 'fake'
         backup['host'] = 'testhost'
@@ -128,6 +129,39 @@ class BackupsAPITestCase(test.TestCase):
         db.backup_destroy(context.get_admin_context(), backup_id)
         db.volume_destroy(context.get_admin_context(), volume_id)
 
+    def test_show_backup_progress(self):
+        volume_id = self._create_volume(size=5)
+        backup_id = self._create_backup(volume_id)
+        progress = {'volume_bytes': 1024, 'backend_bytes': 512,
+                    'total_bytes': 4096, 'compression_ratio': 2.0,
+                    'throughput': 128.0, 'chunk_latency': 0.5,
+                    'percent': 25, 'eta': 24}
+        db.backup_update(context.get_admin_context(), backup_id,
+                         {'progress': json.dumps(progress)})
+        req = webob.Request.blank('/v2/fake/backups/%s' %
+                                  backup_id)
+        req.method = 'GET'
+        req.headers['Content-Type'] = 'application/json'
+        res = req.get_response(fakes.wsgi_app())
+        res_dict = json.loads(res.body)
+
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(res_dict['backup']['progress'], progress)
+
+        req = webob.Request.blank('/v2/fake/backups/%s' % backup_id)
+        req.method = 'GET'
+        req.headers['Content-Type'] = 'application/xml'
+        req.headers['Accept'] = 'application/xml'
+        res = req.get_response(fakes.wsgi_app())
+        self.assertEqual(res.status_int, 200)
+        dom = minidom.parseString(res.body)
+        progress_elem = dom.getElementsByTagName('progress').item(0)
+        self.assertEqual(progress_elem.getAttribute('volume_bytes'), '1024')
+        self.assertEqual(progress_elem.getAttribute('percent'), '25')
+
+        db.backup_destroy(context.get_admin_context(), backup_id)
+        db.volume_destroy(context.get_admin_context(), volume_id)
+
     def test_show_backup_xml_content_type(self):
         volume_id = self._create_volume(size=5)
         backup_id = self._create_backup(volume_id)
@@ -226,7 +260,7 @@ class BackupsAPITestCase(test.TestCase):
         res_dict = json.loads(res.body)
 
         self.assertEqual(res.status_int, 200)
-        self.assertEqual(len(res_dict['backups'][0]), 12)
+        self.assertEqual(len(res_dict['backups'][0]), 14)
         self.assertEqual(res_dict['backups'][0]['availability_zone'], 'az1')
         self.assertEqual(res_dict['backups'][0]['container'],
                          'volumebackups')
@@ -240,7 +274,7 @@ class BackupsAPITestCase(test.TestCase):
         self.assertEqual(res_dict['backups'][0]['status'], 'creating')
         self.assertEqual(res_dict['backups'][0]['volume_id'], '1')
 
-        self.assertEqual(len(res_dict['backups'][1]), 12)
+        self.assertEqual(len(res_dict['backups'][1]), 14)
         self.assertEqual(res_dict['backups'][1]['availability_zone'], 'az1')
         self.assertEqual(res_dict['backups'][1]['container'],
                          'volumebackups')
@@ -254,7 +288,7 @@ class BackupsAPITestCase(test.TestCase):
         self.assertEqual(res_dict['backups'][1]['status'], 'creating')
         self.assertEqual(res_dict['backups'][1]['volume_id'], '1')
 
-        self.assertEqual(len(res_dict['backups'][2]), 12)
+        self.assertEqual(len(res_dict['backups'][2]), 14)
         self.assertEqual(res_dict['backups'][2]['availability_zone'], 'az1')
         self.assertEqual(res_dict['backups'][2]['container'],
                          'volumebackups')
@@ -287,7 +321,7 @@ class BackupsAPITestCase(test.TestCase):
         dom = minidom.parseString(res.body)
         backup_detail = dom.getElementsByTagName('backup')
 
-        self.assertEqual(backup_detail.item(0).attributes.length, 11)
+        self.assertEqual(backup_detail.item(0).attributes.length, 12)
         self.assertEqual(
             backup_detail.item(0).getAttribute('availability_zone'), 'az1')
         self.assertEqual(
@@ -308,7 +342,7 @@ class BackupsAPITestCase(test.TestCase):
         self.assertEqual(
             int(backup_detail.item(0).getAttribute('volume_id')), 1)
 
-        self.assertEqual(backup_detail.item(1).attributes.length, 11)
+        self.assertEqual(backup_detail.item(1).attributes.length, 12)
         self.assertEqual(
             backup_detail.item(1).getAttribute('availability_zone'), 'az1')
         self.assertEqual(
@@ -329,7 +363,7 @@ class BackupsAPITestCase(test.TestCase):
         self.assertEqual(
             int(backup_detail.item(1).getAttribute('volume_id')), 1)
 
-        self.assertEqual(backup_detail.item(2).attributes.length, 11)
+        self.assertEqual(backup_detail.item(2).attributes.length, 12)
         self.assertEqual(
             backup_detail.item(2).getAttribute('availability_zone'), 'az1')
         self.assertEqual(
@@ -401,6 +435,105 @@ class BackupsAPITestCase(test.TestCase):
 
         db.volume_destroy(context.get_admin_context(), volume_id)
 
+    def test_create_incremental_backup_json(self):
+        self.stubs.Set(cinder.db, 'service_get_all_by_topic',
+                       self._stub_service_get_all_by_topic)
+        volume_id = self._create_volume(status='available', size=5)
+        parent_id = self._create_backup(volume_id, status='available',
+                                        container='nightlybackups')
+        body = {"backup": {"display_name": "nightly001",
+                           "display_description":
+                           "Nightly Backup 03-Sep-2012",
+                           "volume_id": volume_id,
+                           "incremental": True,
+                           }
+                }
+        req = webob.Request.blank('/v2/fake/backups')
+        req.method = 'POST'
+        req.headers['Content-Type'] = 'application/json'
+        req.body = json.dumps(body)
+        res = req.get_response(fakes.wsgi_app())
+
+        res_dict = json.loads(res.body)
+        self.assertEqual(res.status_int, 202)
+        backup_id = res_dict['backup']['id']
+        self.assertEqual(self._get_backup_attrib(backup_id, 'parent_id'),
+                         parent_id)
+        self.assertEqual(self._get_backup_attrib(backup_id, 'container'),
+                         'nightlybackups')
+
+        db.backup_destroy(context.get_admin_context(), backup_id)
+        db.backup_destroy(context.get_admin_context(), parent_id)
+        db.volume_destroy(context.get_admin_context(), volume_id)
+
+    def test_create_backup_with_compression_json(self):
+        self.stubs.Set(cinder.db, 'service_get_all_by_topic',
+                       self._stub_service_get_all_by_topic)
+        volume_id = self._create_volume(status='available', size=5)
+        body = {"backup": {"display_name": "nightly001",
+                           "volume_id": volume_id,
+                           "compression": "bz2",
+                           }
+                }
+        req = webob.Request.blank('/v2/fake/backups')
+        req.method = 'POST'
+        req.headers['Content-Type'] = 'application/json'
+        req.body = json.dumps(body)
+        res = req.get_response(fakes.wsgi_app())
+
+        res_dict = json.loads(res.body)
+        self.assertEqual(res.status_int, 202)
+        backup_id = res_dict['backup']['id']
+        self.assertEqual(self._get_backup_attrib(backup_id, 'compression'),
+                         'bz2')
+
+        db.backup_destroy(context.get_admin_context(), backup_id)
+        db.volume_destroy(context.get_admin_context(), volume_id)
+
+    def test_create_backup_with_unsupported_compression(self):
+        volume_id = self._create_volume(status='available', size=5)
+        body = {"backup": {"display_name": "nightly001",
+                           "volume_id": volume_id,
+                           "compression": "fake",
+                           }
+                }
+        req = webob.Request.blank('/v2/fake/backups')
+        req.method = 'POST'
+        req.headers['Content-Type'] = 'application/json'
+        req.body = json.dumps(body)
+        res = req.get_response(fakes.wsgi_app())
+
+        res_dict = json.loads(res.body)
+        self.assertEqual(res.status_int, 400)
+        self.assertEqual(res_dict['badRequest']['code'], 400)
+        self.assertEqual(db.volume_get(context.get_admin_context(),
+                                       volume_id)['status'], 'available')
+
+        db.volume_destroy(context.get_admin_context(), volume_id)
+
+    def test_create_incremental_backup_without_parent(self):
+        self.stubs.Set(cinder.db, 'service_get_all_by_topic',
+                       self._stub_service_get_all_by_topic)
+        volume_id = self._create_volume(status='available', size=5)
+        body = {"backup": {"display_name": "nightly001",
+                           "volume_id": volume_id,
+                           "incremental": True,
+                           }
+                }
+        req = webob.Request.blank('/v2/fake/backups')
+        req.method = 'POST'
+        req.headers['Content-Type'] = 'application/json'
+        req.body = json.dumps(body)
+        res = req.get_response(fakes.wsgi_app())
+
+        res_dict = json.loads(res.body)
+        self.assertEqual(res.status_int, 400)
+        self.assertEqual(res_dict['badRequest']['code'], 400)
+        self.assertEqual(db.volume_get(context.get_admin_context(),
+                                       volume_id)['status'], 'available')
+
+        db.volume_destroy(context.get_admin_context(), volume_id)
+
     def test_create_backup_with_no_body(self):
         # omit body from the request
         req = webob.Request.blank('/v2/fake/backups')
@@ -600,6 +733,25 @@ class BackupsAPITestCase(test.TestCase):
 
         db.backup_destroy(context.get_admin_context(), backup_id)
 
+    def test_delete_backup_with_incremental_children(self):
+        parent_id = self._create_backup(status='available')
+        backup_id = self._create_backup(status='available',
+                                        parent_id=parent_id)
+        req = webob.Request.blank('/v2/fake/backups/%s' %
+                                  parent_id)
+        req.method = 'DELETE'
+        req.headers['Content-Type'] = 'application/json'
+        res = req.get_response(fakes.wsgi_app())
+        res_dict = json.loads(res.body)
+
+        self.assertEqual(res.status_int, 400)
+        self.assertEqual(res_dict['badRequest']['message'],
+                         'Invalid backup: Incremental backups exist for '
+                         'this backup')
+
+        db.backup_destroy(context.get_admin_context(), backup_id)
+        db.backup_destroy(context.get_admin_context(), parent_id)
+
     def test_delete_backup_with_backup_NotFound(self):
         req = webob.Request.blank('/v2/fake/backups/9999')
         req.method = 'DELETE'
@@ -23,6 +23,7 @@ import webob
 import webob.exc
 
 from cinder.api import common
+from cinder import exception
 from cinder import test
 
 
@@ -204,6 +205,31 @@ class PaginationParamsTest(test.TestCase):
                          {'marker': marker, 'limit': 20})
 
 
+class GetLimitTest(test.TestCase):
+    """
+    Unit tests for the `cinder.api.common.get_limit` method which returns
+    the number of items to fetch for a requested limit.
+    """
+
+    def test_no_limit(self):
+        """Test a missing limit is max_limit."""
+        self.assertEqual(common.get_limit(None, 1000), 1000)
+
+    def test_zero_limit(self):
+        """Test a limit of 0 is max_limit."""
+        self.assertEqual(common.get_limit('0', 1000), 1000)
+
+    def test_limit_over_max(self):
+        """Test a limit over max_limit is lowered to it."""
+        self.assertEqual(common.get_limit('3000', 1000), 1000)
+        self.assertEqual(common.get_limit('20', 1000), 20)
+
+    def test_invalid_limit(self):
+        """Test invalid limit params."""
+        self.assertRaises(exception.InvalidInput, common.get_limit, '-1')
+        self.assertRaises(exception.InvalidInput, common.get_limit, 'a')
+
+
 class MiscFunctionsTest(test.TestCase):
 
     def test_remove_major_version_from_href(self):
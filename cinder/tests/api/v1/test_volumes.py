@@ -342,12 +342,14 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_list_by_name(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
-            return [
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            volumes = [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
                 stubs.stub_volume(3, display_name='vol3'),
             ]
+            return stubs.stub_filter_volumes(volumes, filters)
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
 
@@ -367,8 +369,9 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_list_by_metadata(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
-            return [
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            volumes = [
                 stubs.stub_volume(1, display_name='vol1',
                                   status='available',
                                   volume_metadata=[{'key': 'key1',
@@ -382,6 +385,7 @@ class VolumeApiTest(test.TestCase):
                                   volume_metadata=[{'key': 'key1',
                                                     'value': 'value2'}]),
             ]
+            return stubs.stub_filter_volumes(volumes, filters)
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
 
@@ -425,12 +429,14 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_list_by_status(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
-            return [
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            volumes = [
                 stubs.stub_volume(1, display_name='vol1', status='available'),
                 stubs.stub_volume(2, display_name='vol2', status='available'),
                 stubs.stub_volume(3, display_name='vol3', status='in-use'),
             ]
+            return stubs.stub_filter_volumes(volumes, filters)
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
         # no status filter
@@ -549,11 +555,13 @@ class VolumeApiTest(test.TestCase):
     def test_volume_detail_limit_offset(self):
         def volume_detail_limit_offset(is_admin):
             def stub_volume_get_all_by_project(context, project_id, marker,
-                                               limit, sort_key, sort_dir):
-                return [
+                                               limit, sort_key, sort_dir,
+                                               filters=None, offset=None):
+                volumes = [
                     stubs.stub_volume(1, display_name='vol1'),
                     stubs.stub_volume(2, display_name='vol2'),
                 ]
+                return volumes[offset:]
 
             self.stubs.Set(db, 'volume_get_all_by_project',
                            stub_volume_get_all_by_project)
@@ -570,6 +578,26 @@ class VolumeApiTest(test.TestCase):
         #non_admin case
         volume_detail_limit_offset(is_admin=False)
 
+    def test_volume_list_limit(self):
+        limits = []
+
+        def stub_volume_get_all_by_project(context, project_id, marker, limit,
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            limits.append(limit)
+            return [stubs.stub_volume(1, display_name='vol1')]
+        self.stubs.Set(db, 'volume_get_all_by_project',
+                       stub_volume_get_all_by_project)
+
+        over_max = CONF.osapi_max_limit + 1
+        for query in ('', '?limit=0', '?limit=%d' % over_max):
+            req = fakes.HTTPRequest.blank('/v1/volumes%s' % query)
+            res_dict = self.controller.index(req)
+            self.assertEqual(len(res_dict['volumes']), 1)
+        req = fakes.HTTPRequest.blank('/v1/volumes?limit=1')
+        self.controller.index(req)
+        self.assertEqual(limits, [CONF.osapi_max_limit] * 3 + [1])
+
     def test_volume_delete(self):
         req = fakes.HTTPRequest.blank('/v1/volumes/1')
         resp = self.controller.delete(req, 1)
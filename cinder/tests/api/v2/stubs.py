@@ -100,17 +100,38 @@ def stub_volume_get_notfound(self, context, volume_id):
 
 
 def stub_volume_get_all(context, search_opts=None, marker=None, limit=None,
-                        sort_key='created_at', sort_dir='desc'):
+                        sort_key='created_at', sort_dir='desc', filters=None,
+                        offset=None):
     return [stub_volume(100, project_id='fake'),
             stub_volume(101, project_id='superfake'),
             stub_volume(102, project_id='superduperfake')]
 
 
 def stub_volume_get_all_by_project(self, context, marker, limit, sort_key,
-                                   sort_dir, filters={}):
+                                   sort_dir, filters={}, offset=None):
     return [stub_volume_get(self, context, '1')]
 
 
+def stub_filter_volumes(volumes, filters):
+    """Return the volumes matching filters, as the database would."""
+    result = []
+    for volume in volumes:
+        for key, value in (filters or {}).iteritems():
+            if key == 'metadata':
+                metadata = dict((item['key'], item['value'])
+                                for item in volume['volume_metadata'])
+                if any(metadata.get(k) != v for k, v in value.iteritems()):
+                    break
+            elif key == 'no_migration_targets':
+                if volume['status'].startswith('migration_target'):
+                    break
+            elif volume.get(key) != value:
+                break
+        else:
+            result.append(volume)
+    return result
+
+
 def stub_snapshot(id, **kwargs):
     snapshot = {'id': id,
                 'volume_id': 12,
@@ -401,7 +401,8 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_index_with_marker(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -433,6 +434,34 @@ class VolumeApiTest(test.TestCase):
                           self.controller.index,
                           req)
 
+    def _stub_volume_get_all_limit(self):
+        limits = []
+
+        def stub_volume_get_all_by_project(context, project_id, marker, limit,
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            limits.append(limit)
+            return [stubs.stub_volume(1, display_name='vol1')]
+        self.stubs.Set(db, 'volume_get_all_by_project',
+                       stub_volume_get_all_by_project)
+        return limits
+
+    def test_volume_index_limit_zero(self):
+        limits = self._stub_volume_get_all_limit()
+        req = fakes.HTTPRequest.blank('/v2/volumes?limit=0')
+        res_dict = self.controller.index(req)
+        self.assertEquals(len(res_dict['volumes']), 1)
+        self.assertEquals(limits, [CONF.osapi_max_limit])
+
+    def test_volume_index_limit_over_max(self):
+        limits = self._stub_volume_get_all_limit()
+        req = fakes.HTTPRequest.blank('/v2/volumes?limit=%d' %
+                                      (CONF.osapi_max_limit + 1))
+        self.controller.index(req)
+        req = fakes.HTTPRequest.blank('/v2/volumes')
+        self.controller.index(req)
+        self.assertEquals(limits, [CONF.osapi_max_limit] * 2)
+
     def test_volume_index_limit_marker(self):
         req = fakes.HTTPRequest.blank('/v2/volumes?marker=1&limit=1')
         res_dict = self.controller.index(req)
@@ -442,11 +471,13 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_index_limit_offset(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
-            return [
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            volumes = [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
             ]
+            return volumes[offset:]
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
         req = fakes.HTTPRequest.blank('/v2/volumes?limit=2&offset=1')
@@ -467,7 +498,8 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_detail_with_marker(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
             return [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
@@ -508,11 +540,13 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_detail_limit_offset(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
-            return [
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            volumes = [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
             ]
+            return volumes[offset:]
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
         req = fakes.HTTPRequest.blank('/v2/volumes/detail?limit=2&offset=1')
@@ -540,12 +574,14 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_list_by_name(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
-            return [
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            volumes = [
                 stubs.stub_volume(1, display_name='vol1'),
                 stubs.stub_volume(2, display_name='vol2'),
                 stubs.stub_volume(3, display_name='vol3'),
             ]
+            return stubs.stub_filter_volumes(volumes, filters)
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
 
@@ -565,8 +601,9 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_list_by_metadata(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
-            return [
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            volumes = [
                 stubs.stub_volume(1, display_name='vol1',
                                   status='available',
                                   volume_metadata=[{'key': 'key1',
@@ -580,6 +617,7 @@ class VolumeApiTest(test.TestCase):
                                   volume_metadata=[{'key': 'key1',
                                                     'value': 'value2'}]),
             ]
+            return stubs.stub_filter_volumes(volumes, filters)
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
 
@@ -623,12 +661,14 @@ class VolumeApiTest(test.TestCase):
 
     def test_volume_list_by_status(self):
         def stub_volume_get_all_by_project(context, project_id, marker, limit,
-                                           sort_key, sort_dir):
-            return [
+                                           sort_key, sort_dir, filters=None,
+                                           offset=None):
+            volumes = [
                 stubs.stub_volume(1, display_name='vol1', status='available'),
                 stubs.stub_volume(2, display_name='vol2', status='available'),
                 stubs.stub_volume(3, display_name='vol3', status='in-use'),
             ]
+            return stubs.stub_filter_volumes(volumes, filters)
         self.stubs.Set(db, 'volume_get_all_by_project',
                        stub_volume_get_all_by_project)
         # no status filter
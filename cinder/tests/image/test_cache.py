@@ -0,0 +1,141 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the image cache of volume nodes."""
+
+import os
+import shutil
+import tempfile
+
+from cinder import context
+from cinder.image import cache as image_cache
+from cinder.image import image_utils
+from cinder import test
+from cinder import units
+
+
+class FakeImageService(object):
+    def __init__(self, checksum='abc'):
+        self.checksum = checksum
+
+    def show(self, context, image_id):
+        return {'id': image_id, 'checksum': self.checksum}
+
+
+class ImageCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(ImageCacheTestCase, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.flags(lock_path=self.tmpdir)
+        self.cache = image_cache.ImageCache(self.cache_dir, 3 * units.MiB)
+        self.filled = []
+
+    def _fill(self, path):
+        self.filled.append(path)
+        with open(path, 'wb') as f:
+            f.write('x' * units.MiB)
+
+    def _use(self, image_id):
+        with self.cache.entry({'id': image_id, 'checksum': 'abc'},
+                              self._fill) as path:
+            return path
+
+    def test_entry_filled_once(self):
+        path = self._use('image1')
+        self.assertEqual(path, os.path.join(self.cache_dir, 'image1-abc'))
+        self.assertEqual(os.path.getsize(path), units.MiB)
+        self.assertEqual(self._use('image1'), path)
+        self.assertEqual(len(self.filled), 1)
+        self.assertNotEqual(self.filled[0], path)
+
+    def test_fill_failure_leaves_no_entry(self):
+        def fail(path):
+            raise IOError()
+
+        meta = {'id': 'image1', 'checksum': 'abc'}
+
+        def use():
+            with self.cache.entry(meta, fail):
+                pass
+
+        self.assertRaises(IOError, use)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_least_recently_used_evicted(self):
+        for image_id in ('image1', 'image2', 'image3'):
+            self._use(image_id)
+            # Entries must not share a modification time
+            path = os.path.join(self.cache_dir, '%s-abc' % image_id)
+            mtime = os.stat(path).st_mtime - 10 * len(self.filled)
+            os.utime(path, (mtime, mtime))
+        self._use('image1')
+        self._use('image4')
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         ['image1-abc', 'image2-abc', 'image4-abc'])
+
+    def test_entry_in_use_not_evicted(self):
+        cache = image_cache.ImageCache(self.cache_dir, 0)
+        with cache.entry({'id': 'image1', 'checksum': 'abc'},
+                         self._fill) as path:
+            cache.evict()
+            self.assertTrue(os.path.exists(path))
+        cache.evict()
+        self.assertFalse(os.path.exists(path))
+
+
+class FetchToRawCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(FetchToRawCacheTestCase, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.flags(image_cache_dir=self.tmpdir, lock_path=self.tmpdir)
+        self.context = context.get_admin_context()
+        self.fetched = []
+        self.converted = []
+
+        def fake_fetch_to_raw(context, image_service, image_id, dest,
+                              user_id=None, project_id=None):
+            self.fetched.append(dest)
+
+        def fake_convert_image(source, dest, out_format, src_format=None):
+            self.converted.append((source, dest))
+
+        self.stubs.Set(image_utils, '_fetch_to_raw', fake_fetch_to_raw)
+        self.stubs.Set(image_utils, 'convert_image', fake_convert_image)
+
+    def test_fetch_to_raw_cached(self):
+        for dest in ('/dev/vol1', '/dev/vol2'):
+            image_utils.fetch_to_raw(self.context, FakeImageService(),
+                                     'image1', dest)
+        cached = os.path.join(self.tmpdir, 'image1-abc')
+        self.assertEqual(len(self.fetched), 1)
+        self.assertEqual(self.converted, [(cached, '/dev/vol1'),
+                                          (cached, '/dev/vol2')])
+
+    def test_fetch_to_raw_without_checksum(self):
+        image_utils.fetch_to_raw(self.context, FakeImageService(None),
+                                 'image1', '/dev/vol1')
+        self.assertEqual(self.fetched, ['/dev/vol1'])
+        self.assertEqual(self.converted, [])
+
+    def test_fetch_to_raw_cache_disabled(self):
+        self.flags(image_cache_dir=None)
+        image_utils.fetch_to_raw(self.context, FakeImageService(),
+                                 'image1', '/dev/vol1')
+        self.assertEqual(self.fetched, ['/dev/vol1'])
@@ -17,6 +17,7 @@
 
 
 import datetime
+import StringIO
 
 import glanceclient.exc
 from glanceclient.v2.client import Client as glanceclient_v2
@@ -440,6 +441,27 @@ class TestGlanceImageService(test.TestCase):
         self.assertEqual(image_meta['created_at'], self.NOW_DATETIME)
         self.assertEqual(image_meta['updated_at'], self.NOW_DATETIME)
 
+    def test_update_retry_sends_whole_image(self):
+        sent = []
+
+        class MyGlanceStubClient(glance_stubs.StubGlanceClient):
+            """A client that fails halfway the first time."""
+            def update(self, image_id, **metadata):
+                sent.append(metadata['data'].read(3))
+                if len(sent) == 1:
+                    raise glanceclient.exc.CommunicationError('')
+                return super(MyGlanceStubClient, self).update(image_id,
+                                                              **metadata)
+
+        fixture = self._make_fixture(name='test image')
+        client = MyGlanceStubClient(images=[])
+        service = self._create_image_service(client)
+        image_id = service.create(self.context, fixture)['id']
+        self.flags(glance_num_retries=1)
+        service.update(self.context, image_id, {},
+                       StringIO.StringIO('abcdef'))
+        self.assertEqual(sent, ['abc', 'abc'])
+
     def test_download_with_retries(self):
         tries = [0]
 
@@ -589,6 +611,39 @@ class TestGlanceClientVersion(test.TestCase):
                           'glanceclient.v2.client')
 
 
+class TestCachingImageService(test.TestCase):
+    class FakeImageService(object):
+        def __init__(self):
+            self.calls = []
+
+        def show(self, context, image_id):
+            self.calls.append(('show', image_id))
+            return {'id': image_id, 'properties': {}}
+
+        def get_location(self, context, image_id):
+            self.calls.append(('get_location', image_id))
+            return 'location-%s' % image_id
+
+        def download(self, context, image_id, data):
+            self.calls.append(('download', image_id))
+
+    def test_lookups_cached(self):
+        image_service = self.FakeImageService()
+        service = glance.CachingImageService(image_service)
+        image_meta = service.show(None, 'image1')
+        image_meta['properties']['changed'] = True
+        self.assertEqual(service.show(None, 'image1'),
+                         {'id': 'image1', 'properties': {}})
+        self.assertEqual(service.get_location(None, 'image1'),
+                         'location-image1')
+        service.get_location(None, 'image1')
+        service.show(None, 'image2')
+        service.download(None, 'image1', None)
+        self.assertEqual(image_service.calls,
+                         [('show', 'image1'), ('get_location', 'image1'),
+                          ('show', 'image2'), ('download', 'image1')])
+
+
 def _create_failing_glance_client(info):
     class MyGlanceStubClient(glance_stubs.StubGlanceClient):
         """A client that fails the first time, then succeeds."""
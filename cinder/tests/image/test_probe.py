@@ -0,0 +1,110 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for reading image formats from their headers."""
+
+import os
+import shutil
+import struct
+import tempfile
+
+from cinder.image import probe
+from cinder import test
+from cinder import units
+
+
+class ProbeTestCase(test.TestCase):
+    def setUp(self):
+        super(ProbeTestCase, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'image')
+
+    def _probe(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        return probe.probe(self.path)
+
+    def test_raw_left_to_qemu(self):
+        self.assertEqual(self._probe('\0' * 4096), None)
+
+    def test_qcow2(self):
+        header = probe.QCOW2_HEADER.pack('QFI\xfb', 2, 0, 0, 16, units.GiB, 0)
+        info = self._probe(header)
+        self.assertEqual(info['file_format'], 'qcow2')
+        self.assertEqual(info['virtual_size'], units.GiB)
+        self.assertEqual(info['cluster_size'], 65536)
+        self.assertEqual(info['backing_file'], None)
+
+    def test_qcow2_backing_file(self):
+        header = probe.QCOW2_HEADER.pack('QFI\xfb', 3, 512, 11, 16,
+                                         units.GiB, 0)
+        info = self._probe(header.ljust(512, '\0') + '/etc/shadow')
+        self.assertEqual(info['file_format'], 'qcow2')
+        self.assertEqual(info['backing_file'], '/etc/shadow')
+
+    def test_qcow_version_1_left_to_qemu(self):
+        header = probe.QCOW2_HEADER.pack('QFI\xfb', 1, 0, 0, 16, units.GiB, 0)
+        self.assertEqual(self._probe(header), None)
+
+    def test_vmdk(self):
+        descriptor = ('# Disk DescriptorFile\n'
+                      'parentFileNameHint="parent.vmdk"\n')
+        header = probe.VMDK_HEADER.pack('KDMV', 1, 3, 2048, 128, 1, 1)
+        info = self._probe(header.ljust(512, '\0') +
+                           descriptor.ljust(512, '\0'))
+        self.assertEqual(info['file_format'], 'vmdk')
+        self.assertEqual(info['virtual_size'], units.MiB)
+        self.assertEqual(info['cluster_size'], 65536)
+        self.assertEqual(info['backing_file'], 'parent.vmdk')
+
+    def test_vhd(self):
+        footer = ('conectix' + '\0' * 8 +
+                  struct.pack('>Q', 0xffffffffffffffff) + '\0' * 24 +
+                  struct.pack('>QHBBI', units.GiB, 1024, 16, 63, 2))
+        info = self._probe(footer)
+        self.assertEqual(info['file_format'], 'vpc')
+        self.assertEqual(info['virtual_size'], 1024 * 16 * 63 * 512)
+        self.assertEqual(info['backing_file'], None)
+
+    def test_vhd_differencing(self):
+        footer = ('conectix' + '\0' * 8 + struct.pack('>Q', 512) +
+                  '\0' * 24 +
+                  struct.pack('>QHBBI', units.GiB, 1024, 16, 63, 4))
+        dynamic_header = ('cxsparse'.ljust(64, '\0') +
+                          u'parent.vhd'.encode('utf-16-be').ljust(512, '\0'))
+        info = self._probe(footer.ljust(512, '\0') + dynamic_header)
+        self.assertEqual(info['file_format'], 'vpc')
+        self.assertEqual(info['backing_file'], 'parent.vhd')
+
+    def test_other_formats_left_to_qemu(self):
+        self.assertEqual(self._probe('QED\0' + '\0' * 4096), None)
+        self.assertEqual(self._probe('\0' * 64 + '\x7f\x10\xda\xbe'), None)
+        self.assertEqual(self._probe('# Disk DescriptorFile\n'), None)
+        self.assertEqual(self._probe('OOOM' + '\0' * 4096), None)
+        self.assertEqual(self._probe('vhdxfile' + '\0' * 4096), None)
+        self.assertEqual(self._probe('\n# Disk DescriptorFile\n'
+                                     'RW 8 FLAT "/etc/shadow" 0\n'), None)
+
+    def test_truncated_image_left_to_qemu(self):
+        header = probe.QCOW2_HEADER.pack('QFI\xfb', 2, 512, 11, 16,
+                                         units.GiB, 0)
+        self.assertEqual(self._probe(header), None)
+
+    def test_unreadable_image_left_to_qemu(self):
+        self.assertEqual(probe.probe(os.path.join(self.tmpdir, 'missing')),
+                         None)
@@ -117,6 +117,61 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         weighed_host = sched._schedule(fake_context, request_spec, {})
         self.assertTrue(weighed_host.obj is not None)
 
+    @testtools.skipIf(not test_utils.is_cinder_installed(),
+                      'Test requires Cinder installed (try setup.py develop')
+    def test_schedule_create_volumes_consumes_capacity(self):
+        """Volumes of a batch are spread as each one fills its host."""
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+        fakes.mox_host_manager_db_calls(self.mox, fake_context)
+
+        chosen_hosts = []
+
+        def _fake_create_volume_on_host(context, request_spec,
+                                        filter_properties, host_state):
+            chosen_hosts.append((request_spec['volume_id'], host_state.host))
+
+        self.stubs.Set(sched, '_create_volume_on_host',
+                       _fake_create_volume_on_host)
+
+        request_specs = []
+        for volume_id in range(4):
+            request_specs.append({'volume_id': volume_id,
+                                  'volume_type': {'name': 'LVM_iSCSI'},
+                                  'volume_properties': {'project_id': 1,
+                                                        'size': 400}})
+        self.mox.ReplayAll()
+        errors = sched.schedule_create_volumes(fake_context, request_specs,
+                                               [{}, {}, {}, {}])
+        self.assertEqual(chosen_hosts,
+                         [(0, 'host1'), (1, 'host1'), (2, 'host3')])
+        self.assertEqual(errors[:3], [None, None, None])
+        self.assertTrue(isinstance(errors[3], exception.NoValidHost))
+
+    def test_schedule_create_volumes_groups_requests(self):
+        """Only volumes with the same request are weighed together."""
+        sched = fakes.FakeFilterScheduler()
+        candidates_calls = []
+
+        def _fake_get_weighted_candidates(context, request_spec,
+                                          filter_properties):
+            candidates_calls.append(request_spec['volume_properties'])
+
+        self.stubs.Set(sched, '_get_weighted_candidates',
+                       _fake_get_weighted_candidates)
+
+        request_specs = [{'volume_id': 1, 'volume_properties': {'size': 1}},
+                         {'volume_id': 2, 'volume_properties': {'size': 2}},
+                         {'volume_id': 3, 'volume_properties': {'size': 1}}]
+        errors = sched.schedule_create_volumes(None, request_specs,
+                                               [{}, {}, {}])
+        self.assertEqual(sorted(candidates_calls),
+                         [{'size': 1}, {'size': 2}])
+        for error in errors:
+            self.assertTrue(isinstance(error, exception.NoValidHost))
+
     def test_max_attempts(self):
         self.flags(scheduler_max_attempts=4)
 
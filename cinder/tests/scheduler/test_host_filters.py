@@ -24,6 +24,9 @@ from cinder import db
 from cinder import exception
 from cinder.openstack.common import jsonutils
 from cinder.openstack.common.scheduler import filters
+from cinder.openstack.common.scheduler.filters import capabilities_filter
+from cinder.openstack.common.scheduler.filters import extra_specs_ops
+from cinder.openstack.common.scheduler.filters import json_filter
 from cinder import test
 from cinder.tests.scheduler import fakes
 from cinder.tests import utils as test_utils
@@ -159,3 +162,90 @@ class HostFiltersTestCase(test.TestCase):
         retry = dict(num_attempts=1, hosts=['host1'])
         filter_properties = dict(retry=retry)
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
+
+    def test_json_filter_parses_query_once(self):
+        filt_cls = json_filter.JsonFilter()
+        filter_properties = {'scheduler_hints': {'query': self.json_query}}
+        hosts = [fakes.FakeHostState('host1',
+                                     {'free_capacity_gb': 1024,
+                                      'total_capacity_gb': 10 * 1024}),
+                 fakes.FakeHostState('host2',
+                                     {'free_capacity_gb': 1023,
+                                      'total_capacity_gb': 10 * 1024}),
+                 fakes.FakeHostState('host3',
+                                     {'free_capacity_gb': 2048,
+                                      'total_capacity_gb': 20 * 1024})]
+        query = jsonutils.loads(self.json_query)
+        self.mox.StubOutWithMock(json_filter.jsonutils, 'loads')
+        json_filter.jsonutils.loads(self.json_query).AndReturn(query)
+        self.mox.ReplayAll()
+
+        passed = list(filt_cls.filter_all(hosts, filter_properties))
+        self.assertEqual([host.host for host in passed], ['host1', 'host3'])
+
+    def test_json_filter_nested_query(self):
+        filt_cls = json_filter.JsonFilter()
+        query = jsonutils.dumps(
+            ['or',
+                ['=', '$capabilities.vendor_name', 'Open Source'],
+                ['>=', '$free_capacity_gb', 100]])
+        filter_properties = {'scheduler_hints': {'query': query}}
+        host = fakes.FakeHostState('host1',
+                                   {'free_capacity_gb': 50,
+                                    'capabilities': {}})
+        self.assertFalse(filt_cls.host_passes(host, filter_properties))
+        host.capabilities = {'vendor_name': 'Open Source'}
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+
+    def test_capabilities_filter(self):
+        filt_cls = capabilities_filter.CapabilitiesFilter()
+        extra_specs = {'capabilities:QoS_support': '<is> True',
+                       'capabilities:volume_backend_name': 'lvm',
+                       'qos:max_iops': '1000',
+                       'free_capacity_gb': '>= 100'}
+        filter_properties = {'resource_type': {'extra_specs': extra_specs}}
+        capabilities = {'QoS_support': True, 'volume_backend_name': 'lvm',
+                        'free_capacity_gb': 200}
+        hosts = []
+        for host, changes in (('host1', {}),
+                              ('host2', {'QoS_support': False}),
+                              ('host3', {'free_capacity_gb': 50})):
+            hosts.append(fakes.FakeHostState(
+                host, {'capabilities': dict(capabilities, **changes)}))
+        passed = list(filt_cls.filter_all(hosts, filter_properties))
+        self.assertEqual([host.host for host in passed], ['host1'])
+
+    def test_extra_specs_ops(self):
+        self.assertTrue(extra_specs_ops.match('lvm', 'lvm'))
+        self.assertTrue(extra_specs_ops.match('12', '= 11'))
+        self.assertFalse(extra_specs_ops.match('10', '= 11'))
+        self.assertFalse(extra_specs_ops.match('abc', '== 11'))
+        self.assertTrue(extra_specs_ops.match('abc', 's< abd'))
+        self.assertTrue(extra_specs_ops.match(True, '<is> True'))
+        self.assertTrue(extra_specs_ops.match('thin,thick', '<in> thin'))
+        self.assertTrue(extra_specs_ops.match('v2', '<or> v1 <or> v2'))
+        self.assertFalse(extra_specs_ops.match('v3', '<or> v1 <or> v2'))
+        self.assertFalse(extra_specs_ops.match(None, '>= 1'))
+
+        matches = extra_specs_ops.compile_requirement('>= 2')
+        self.assertEqual([matches(value) for value in (1, 2, 3)],
+                         [False, True, True])
+
+    def test_filter_handler_reuses_filters(self):
+        filter_handler = filters.HostFilterHandler('cinder.scheduler.filters')
+        instances = []
+
+        class FakeFilter(filters.BaseHostFilter):
+            def __init__(self):
+                instances.append(self)
+
+            def host_passes(self, host_state, filter_properties):
+                return host_state.host != 'host2'
+
+        hosts = [fakes.FakeHostState('host1', {}),
+                 fakes.FakeHostState('host2', {})]
+        for i in range(2):
+            passed = filter_handler.get_filtered_objects([FakeFilter], hosts,
+                                                         {})
+            self.assertEqual(passed, hosts[:1])
+        self.assertEqual(len(instances), 1)
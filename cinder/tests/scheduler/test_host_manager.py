@@ -16,6 +16,7 @@
 Tests For HostManager
 """
 
+import mox
 from oslo.config import cfg
 
 from cinder import db
@@ -135,9 +136,59 @@ class HostManagerTestCase(test.TestCase):
                     'host3': host3_volume_capabs}
         self.assertDictMatch(service_states, expected)
 
+    def test_update_service_capabilities_changes(self):
+        self.mox.StubOutWithMock(timeutils, 'utcnow')
+        timeutils.utcnow().AndReturn(31337)
+        timeutils.utcnow().AndReturn(31338)
+        timeutils.utcnow().AndReturn(31339)
+        # Hosts whose full report was missed are asked for one, once
+        self.mox.StubOutWithMock(self.host_manager.volume_rpcapi,
+                                 'publish_service_capabilities')
+        self.host_manager.volume_rpcapi.publish_service_capabilities(
+            mox.IgnoreArg(), host='host1')
+        self.host_manager.volume_rpcapi.publish_service_capabilities(
+            mox.IgnoreArg(), host='host2')
+
+        self.mox.ReplayAll()
+        service_name = 'volume'
+        self.host_manager.update_service_capabilities(
+            service_name, 'host1',
+            dict(free_capacity_gb=4321, total_capacity_gb=8000),
+            capabilities_version=1)
+        self.host_manager.update_service_capabilities(
+            service_name, 'host1', dict(free_capacity_gb=1234),
+            capabilities_version=3, base_version=1)
+        # Changes received out of order or with a missed full report
+        self.host_manager.update_service_capabilities(
+            service_name, 'host1', dict(free_capacity_gb=2345),
+            capabilities_version=2, base_version=1)
+        self.host_manager.update_service_capabilities(
+            service_name, 'host1', dict(free_capacity_gb=2345),
+            capabilities_version=5, base_version=4)
+        self.host_manager.update_service_capabilities(
+            service_name, 'host1', dict(free_capacity_gb=2345),
+            capabilities_version=6, base_version=4)
+        self.host_manager.update_service_capabilities(
+            service_name, 'host2', dict(free_capacity_gb=2345),
+            capabilities_version=2, base_version=1)
+        self.assertDictMatch(self.host_manager.service_states,
+                             {'host1': dict(free_capacity_gb=1234,
+                                            total_capacity_gb=8000,
+                                            timestamp=31338)})
+
+        # Changes are relative to the full report, not the last changes
+        self.host_manager.update_service_capabilities(
+            service_name, 'host1', dict(),
+            capabilities_version=4, base_version=1)
+        self.assertDictMatch(self.host_manager.service_states,
+                             {'host1': dict(free_capacity_gb=4321,
+                                            total_capacity_gb=8000,
+                                            timestamp=31339)})
+
     def test_get_all_host_states(self):
         context = 'fake_context'
         topic = CONF.volume_topic
+        self.flags(scheduler_host_state_refresh_interval=0)
 
         self.mox.StubOutWithMock(db, 'service_get_all_by_topic')
         self.mox.StubOutWithMock(host_manager.LOG, 'warn')
@@ -190,6 +241,46 @@ class HostManagerTestCase(test.TestCase):
                              volume_node)
 
 
+    def test_get_all_host_states_cached(self):
+        context = 'fake_context'
+        topic = CONF.volume_topic
+        self.flags(scheduler_host_state_refresh_interval=10)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.stubs.Set(host_manager.utils, 'service_is_up',
+                       lambda service: True)
+
+        self.mox.StubOutWithMock(db, 'service_get_all_by_topic')
+        ret_services = fakes.VOLUME_SERVICES[:1]
+        db.service_get_all_by_topic(context, topic).AndReturn(ret_services)
+        db.service_get_all_by_topic(context, topic).AndReturn(ret_services)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        host_state = self.host_manager.host_state_map['host1']
+
+        # Capability updates are applied without reading the db
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(total_capacity_gb=1024,
+                                    free_capacity_gb=512,
+                                    reserved_percentage=0))
+        host_states = list(self.host_manager.get_all_host_states(context))
+        self.assertEqual(host_states, [host_state])
+        self.assertEqual(host_state.free_capacity_gb, 512)
+
+        # The db is read again once the host states expire
+        timeutils.advance_time_seconds(11)
+        host_states = list(self.host_manager.get_all_host_states(context))
+        self.assertEqual(host_states, [host_state])
+        self.mox.VerifyAll()
+
+    def test_new_host_expires_host_states(self):
+        self.host_manager.host_states_refreshed_at = timeutils.utcnow()
+        self.host_manager.update_service_capabilities(
+            'volume', 'host9', dict(free_capacity_gb=512))
+        self.assertEqual(self.host_manager.host_states_refreshed_at, None)
+
+
 class HostStateTestCase(test.TestCase):
     """Test case for HostState class"""
 
@@ -204,6 +295,7 @@ class HostStateTestCase(test.TestCase):
 
         fake_host.update_from_volume_capability(volume_capability)
         self.assertEqual(fake_host.free_capacity_gb, 512)
+        self.assertEqual(fake_host.usable_capacity_gb, 512)
 
     def test_update_from_volume_infinite_capability(self):
         fake_host = host_manager.HostState('host1')
@@ -217,6 +309,7 @@ class HostStateTestCase(test.TestCase):
         fake_host.update_from_volume_capability(volume_capability)
         self.assertEqual(fake_host.total_capacity_gb, 'infinite')
         self.assertEqual(fake_host.free_capacity_gb, 'infinite')
+        self.assertEqual(fake_host.usable_capacity_gb, float('inf'))
 
     def test_update_from_volume_unknown_capability(self):
         fake_host = host_manager.HostState('host1')
@@ -230,3 +323,21 @@ class HostStateTestCase(test.TestCase):
         fake_host.update_from_volume_capability(volume_capability)
         self.assertEqual(fake_host.total_capacity_gb, 'infinite')
         self.assertEqual(fake_host.free_capacity_gb, 'unknown')
+        self.assertEqual(fake_host.usable_capacity_gb, float('inf'))
+
+    def test_usable_capacity_follows_consumption(self):
+        fake_host = host_manager.HostState('host1')
+        self.assertEqual(fake_host.usable_capacity_gb, None)
+
+        volume_capability = {'total_capacity_gb': 1024,
+                             'free_capacity_gb': 512,
+                             'reserved_percentage': 10,
+                             'timestamp': None}
+        fake_host.update_from_volume_capability(volume_capability)
+        self.assertEqual(fake_host.usable_capacity_gb, 460)
+
+        fake_host.consume_from_volume({'size': 112})
+        self.assertEqual(fake_host.usable_capacity_gb, 360)
+
+        fake_host.reserved_percentage = 0
+        self.assertEqual(fake_host.usable_capacity_gb, 400)
@@ -65,6 +65,16 @@ class SchedulerRpcAPITestCase(test.TestCase):
             self.assertEqual(arg, expected_arg)
 
     def test_update_service_capabilities(self):
+        self._test_scheduler_api('update_service_capabilities',
+                                 rpc_method='fanout_cast',
+                                 service_name='fake_name',
+                                 host='fake_host',
+                                 capabilities='fake_capabilities',
+                                 capabilities_version=2,
+                                 base_version=1,
+                                 version='1.5')
+
+    def test_update_service_capabilities_full_report(self):
         self._test_scheduler_api('update_service_capabilities',
                                  rpc_method='fanout_cast',
                                  service_name='fake_name',
@@ -82,6 +92,14 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  filter_properties='filter_properties',
                                  version='1.2')
 
+    def test_create_volumes(self):
+        self._test_scheduler_api('create_volumes',
+                                 rpc_method='cast',
+                                 topic='topic',
+                                 request_specs=['fake_request_spec'],
+                                 filter_properties_list=['filter_properties'],
+                                 version='1.4')
+
     def test_migrate_volume_to_host(self):
         self._test_scheduler_api('migrate_volume_to_host',
                                  rpc_method='cast',
@@ -61,8 +61,9 @@ class SchedulerManagerTestCase(test.TestCase):
                                  'update_service_capabilities')
 
         # Test no capabilities passes empty dictionary
-        self.manager.driver.update_service_capabilities(service_name,
-                                                        host, {})
+        self.manager.driver.update_service_capabilities(
+            service_name, host, {}, capabilities_version=None,
+            base_version=None)
         self.mox.ReplayAll()
         result = self.manager.update_service_capabilities(
             self.context,
@@ -73,14 +74,15 @@ class SchedulerManagerTestCase(test.TestCase):
         self.mox.ResetAll()
         # Test capabilities passes correctly
         capabilities = {'fake_capability': 'fake_value'}
-        self.manager.driver.update_service_capabilities(service_name,
-                                                        host,
-                                                        capabilities)
+        self.manager.driver.update_service_capabilities(
+            service_name, host, capabilities, capabilities_version=2,
+            base_version=1)
         self.mox.ReplayAll()
         result = self.manager.update_service_capabilities(
             self.context,
             service_name=service_name, host=host,
-            capabilities=capabilities)
+            capabilities=capabilities, capabilities_version=2,
+            base_version=1)
 
     def test_create_volume_exception_puts_volume_in_error_state(self):
         """Test NoValidHost exception behavior for create_volume.
@@ -105,6 +107,25 @@ class SchedulerManagerTestCase(test.TestCase):
                                    request_spec=request_spec,
                                    filter_properties={})
 
+    def test_create_volumes_puts_failed_volumes_in_error_state(self):
+        """Test create_volumes with some volumes failing to schedule.
+
+        Only the failed volumes are put in 'error' state.
+        """
+        self._mox_schedule_method_helper('schedule_create_volumes')
+        self.mox.StubOutWithMock(db, 'volume_update')
+
+        request_specs = [{'volume_id': 1}, {'volume_id': 2}]
+        self.manager.driver.schedule_create_volumes(
+            self.context, request_specs, [{}, {}]).AndReturn(
+                [None, exception.NoValidHost(reason="")])
+        db.volume_update(self.context, 2, {'status': 'error'})
+
+        self.mox.ReplayAll()
+        self.manager.create_volumes(self.context, 'fake_topic',
+                                    request_specs,
+                                    filter_properties_list=[{}, {}])
+
     def test_migrate_volume_exception_puts_volume_in_error_state(self):
         """Test NoValidHost exception behavior for migrate_volume_to_host.
 
@@ -161,9 +182,9 @@ class SchedulerTestCase(test.TestCase):
                                  'update_service_capabilities')
 
         capabilities = {'fake_capability': 'fake_value'}
-        self.driver.host_manager.update_service_capabilities(service_name,
-                                                             host,
-                                                             capabilities)
+        self.driver.host_manager.update_service_capabilities(
+            service_name, host, capabilities, capabilities_version=None,
+            base_version=None)
         self.mox.ReplayAll()
         result = self.driver.update_service_capabilities(service_name,
                                                          host,
@@ -192,6 +213,20 @@ class SchedulerDriverBaseTestCase(SchedulerTestCase):
        that can't will fail if the driver is changed.
     """
 
+    def test_schedule_create_volumes_one_by_one(self):
+        self.mox.StubOutWithMock(self.driver, 'schedule_create_volume')
+        self.driver.schedule_create_volume(self.context, {'volume_id': 1},
+                                           {})
+        self.driver.schedule_create_volume(
+            self.context, {'volume_id': 2},
+            {}).AndRaise(exception.NoValidHost(reason=""))
+
+        self.mox.ReplayAll()
+        errors = self.driver.schedule_create_volumes(
+            self.context, [{'volume_id': 1}, {'volume_id': 2}], [{}, {}])
+        self.assertEqual(errors[0], None)
+        self.assertTrue(isinstance(errors[1], exception.NoValidHost))
+
     def test_unimplemented_schedule(self):
         fake_args = (1, 2, 3)
         fake_kwargs = {'cat': 'meow'}
@@ -18,13 +18,19 @@ Tests for Backup code.
 """
 
 import tempfile
+import time
 
+import eventlet
+from eventlet import event
 from oslo.config import cfg
 
+from cinder.backup import driver
+from cinder.backup import scheduler
 from cinder import context
 from cinder import db
 from cinder import exception
 from cinder.openstack.common import importutils
+from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import timeutils
 from cinder import test
@@ -169,6 +175,45 @@ class BackupTestCase(test.TestCase):
         backup = db.backup_get(self.ctxt, backup_id)
         self.assertEquals(backup['status'], 'error')
 
+    def test_create_backup_queue_full(self):
+        """Test error handling when too many backups are queued"""
+        vol_id = self._create_volume_db_entry(size=1)
+        backup_id = self._create_backup_db_entry(volume_id=vol_id)
+        work_scheduler = scheduler.BackupWorkScheduler({'backup': 1},
+                                                       max_queued=1)
+        self.backup_mgr.work_scheduler = work_scheduler
+        done = event.Event()
+
+        def hold_slot():
+            with work_scheduler.admit('backup', 'other_project'):
+                done.wait()
+
+        # One backup running and one queued
+        threads = [eventlet.spawn(hold_slot) for i in xrange(2)]
+        eventlet.sleep(0)
+
+        self.assertRaises(exception.BackupQueueFull,
+                          self.backup_mgr.create_backup,
+                          self.ctxt,
+                          backup_id)
+        done.send()
+        for thread in threads:
+            thread.wait()
+        vol = db.volume_get(self.ctxt, vol_id)
+        self.assertEquals(vol['status'], 'available')
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'error')
+
+    def test_max_queued_operations_capped(self):
+        """Test the backup queue is kept below the RPC thread pool size"""
+        self.flags(rpc_thread_pool_size=64)
+        self.flags(backup_max_queued_operations=10)
+        self.assertEqual(self.backup_mgr._max_queued_operations(), 10)
+        self.flags(backup_max_queued_operations=100)
+        self.assertEqual(self.backup_mgr._max_queued_operations(), 32)
+        self.flags(backup_max_queued_operations=0)
+        self.assertEqual(self.backup_mgr._max_queued_operations(), 32)
+
     def test_create_backup(self):
         """Test normal backup creation"""
         vol_size = 1
@@ -188,6 +233,27 @@ class BackupTestCase(test.TestCase):
         self.assertEquals(backup['status'], 'available')
         self.assertEqual(backup['size'], vol_size)
 
+    def test_create_incremental_backup_unsupported(self):
+        """Test a driver without incremental backups makes a full one"""
+        vol_id = self._create_volume_db_entry(size=1)
+        parent_id = self._create_backup_db_entry(volume_id=vol_id,
+                                                 status='available')
+        backup_id = self._create_backup_db_entry(volume_id=vol_id)
+        db.backup_update(self.ctxt, backup_id, {'parent_id': parent_id})
+
+        class FakeBackupDriver(driver.BackupDriver):
+            pass
+
+        self.stubs.Set(self.backup_mgr.driver, 'backup_volume',
+                       lambda context, backup, backup_service: None)
+        self.stubs.Set(self.backup_mgr.service, 'get_backup_driver',
+                       lambda context: FakeBackupDriver())
+
+        self.backup_mgr.create_backup(self.ctxt, backup_id)
+        backup = db.backup_get(self.ctxt, backup_id)
+        self.assertEquals(backup['status'], 'available')
+        self.assertEqual(backup['parent_id'], None)
+
     def test_restore_backup_with_bad_volume_status(self):
         """Test error handling when restoring a backup to a volume
         with a bad status
@@ -418,3 +484,71 @@ class BackupTestCase(test.TestCase):
         self.assertEqual('cinder.backup.drivers.swift',
                          backup_mgr.driver_name)
         setattr(cfg.CONF, 'backup_driver', old_setting)
+
+
+class BackupProgressTestCase(test.TestCase):
+    """Test Case for recording the progress of backups."""
+
+    def setUp(self):
+        super(BackupProgressTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.backup_id = db.backup_create(self.ctxt,
+                                          {'volume_id': 1,
+                                           'size': 1})['id']
+        self.now = 100.0
+        self.stubs.Set(time, 'time', lambda: self.now)
+
+    def _get_progress(self):
+        progress = db.backup_get(self.ctxt, self.backup_id)['progress']
+        return progress and jsonutils.loads(progress)
+
+    def test_progress(self):
+        self.flags(backup_progress_interval=10)
+        progress = driver.BackupProgress(self.ctxt, db, self.backup_id, 4096)
+        self.now += 2
+        progress.update(1024, 256, 1.0)
+        progress.update(1024, 0)
+        self.assertEqual(self._get_progress(), None)
+
+        self.now += 8
+        progress.update(1024, 256, 3.0)
+        self.assertEqual(self._get_progress(),
+                         {'volume_bytes': 3072,
+                          'backend_bytes': 512,
+                          'total_bytes': 4096,
+                          'compression_ratio': 6.0,
+                          'throughput': 307.2,
+                          'chunk_latency': 2.0,
+                          'percent': 75,
+                          'eta': 3})
+
+        self.now += 2
+        progress.update(1024, 256, 2.0)
+        self.assertEqual(self._get_progress()['percent'], 75)
+        progress.finish()
+        self.assertEqual(self._get_progress()['percent'], 100)
+        self.assertEqual(self._get_progress()['eta'], 0)
+
+    def test_progress_throttled(self):
+        self.flags(backup_max_bandwidth=1024)
+        sleeps = []
+        self.stubs.Set(eventlet, 'sleep', lambda delay: sleeps.append(delay))
+        progress = driver.BackupProgress(self.ctxt, db, self.backup_id, 4096)
+        self.now += 1
+        progress.update(1024, 1024, 1.0)
+        self.now += 1
+        progress.update(4096, 3072, 1.0)
+        self.assertEqual(sleeps, [2.0])
+
+    def test_progress_nothing_transferred(self):
+        progress = driver.BackupProgress(self.ctxt, db, self.backup_id, 0)
+        progress.finish()
+        self.assertEqual(self._get_progress(),
+                         {'volume_bytes': 0,
+                          'backend_bytes': 0,
+                          'total_bytes': 0,
+                          'compression_ratio': None,
+                          'throughput': None,
+                          'chunk_latency': None,
+                          'percent': None,
+                          'eta': None})
@@ -276,6 +276,69 @@ class BackupCephTestCase(test.TestCase):
             # Ensure the files are equal
             self.assertEquals(checksum.digest(), self.checksum.digest())
 
+    def _set_sparse_rbd_stubs(self):
+        self.volume_file.seek(0)
+        data = self.volume_file.read(self.length)
+        extents = [(0, 3 * self.chunk_size),
+                   (10 * self.chunk_size, 2 * self.chunk_size)]
+
+        def read_data(inst, offset, length):
+            return data[offset:offset + length]
+
+        def rbd_size(inst):
+            return self.length
+
+        class SparseImage(self.service.rbd.Image):
+            def diff_iterate(inst, offset, length, from_snapshot, iter_cb):
+                for ext_offset, ext_length in extents:
+                    iter_cb(ext_offset, ext_length, True)
+
+        self.stubs.Set(self.service.rbd.Image, 'read', read_data)
+        self.stubs.Set(self.service.rbd.Image, 'size', rbd_size)
+
+        expected = bytearray(self.length)
+        for ext_offset, ext_length in extents:
+            end = ext_offset + ext_length
+            expected[ext_offset:end] = data[ext_offset:end]
+        return SparseImage(), extents, str(expected)
+
+    def test_transfer_data_sparse_rbd_to_file(self):
+        src_image, extents, expected = self._set_sparse_rbd_stubs()
+        self.service.chunk_size = self.chunk_size
+
+        with tempfile.NamedTemporaryFile() as test_file:
+            test_file.write('\xff' * self.length)
+            test_file.seek(0)
+
+            rbd_io = self._get_wrapped_rbd_io(src_image)
+            self.service._transfer_data(rbd_io, 'src_foo', test_file,
+                                        'dest_foo', self.length)
+
+            test_file.seek(0)
+            self.assertEquals(test_file.read(), expected)
+
+    def test_transfer_data_sparse_rbd_to_zeroed_rbd(self):
+        src_image, extents, expected = self._set_sparse_rbd_stubs()
+        self.service.chunk_size = self.chunk_size
+        writes = []
+
+        def write_data(inst, data, offset):
+            writes.append((offset, len(data)))
+
+        self.stubs.Set(self.service.rbd.Image, 'write', write_data)
+
+        src_rbd_io = self._get_wrapped_rbd_io(src_image)
+        dest_rbd_io = self._get_wrapped_rbd_io(self.service.rbd.Image())
+        self.service._transfer_data(src_rbd_io, 'src_foo', dest_rbd_io,
+                                    'dest_foo', self.length, dest_zeroed=True)
+
+        expected_writes = [(offset, self.chunk_size)
+                           for ext_offset, ext_length in extents
+                           for offset in xrange(ext_offset,
+                                                ext_offset + ext_length,
+                                                self.chunk_size)]
+        self.assertEquals(writes, expected_writes)
+
     def test_backup_volume_from_file(self):
         self._create_volume_db_entry(self.volume_id, 1)
         backup = db.backup_get(self.ctxt, self.backup_id)
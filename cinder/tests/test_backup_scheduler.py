@@ -0,0 +1,142 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the backup work scheduler.
+"""
+
+import eventlet
+from eventlet import event
+
+from cinder.backup import scheduler
+from cinder import exception
+from cinder import test
+
+
+class BackupWorkSchedulerTestCase(test.TestCase):
+    """Test Case for backup admission control."""
+
+    def setUp(self):
+        super(BackupWorkSchedulerTestCase, self).setUp()
+        self.order = []
+        self.done = event.Event()
+
+    def _run(self, work_scheduler, kind, project_id, name):
+        with work_scheduler.admit(kind, project_id):
+            self.order.append(name)
+            self.done.wait()
+
+    def _wait_for(self, count):
+        while len(self.order) < count:
+            eventlet.sleep(0)
+
+    def test_no_limit(self):
+        work_scheduler = scheduler.BackupWorkScheduler({'backup': 0})
+        threads = [eventlet.spawn(self._run, work_scheduler, 'backup',
+                                  'project', i) for i in xrange(5)]
+        eventlet.sleep(0)
+        self.assertEqual(self.order, range(5))
+        self.done.send()
+        for thread in threads:
+            thread.wait()
+
+    def test_limit_per_kind(self):
+        work_scheduler = scheduler.BackupWorkScheduler({'backup': 1,
+                                                        'delete': 1})
+        threads = [eventlet.spawn(self._run, work_scheduler, kind,
+                                  'project', kind + str(i))
+                   for i in xrange(2) for kind in ('backup', 'delete')]
+        eventlet.sleep(0)
+        self.assertEqual(self.order, ['backup0', 'delete0'])
+        self.done.send()
+        for thread in threads:
+            thread.wait()
+        self.assertEqual(sorted(self.order),
+                         ['backup0', 'backup1', 'delete0', 'delete1'])
+
+    def test_round_robin_across_projects(self):
+        work_scheduler = scheduler.BackupWorkScheduler({'backup': 1})
+        gates = {}
+
+        def run(project_id, name):
+            with work_scheduler.admit('backup', project_id):
+                self.order.append(name)
+                gates[name] = event.Event()
+                gates[name].wait()
+
+        submitted = [('a', 'a1'), ('a', 'a2'), ('a', 'a3'),
+                     ('b', 'b1'), ('b', 'b2'), ('c', 'c1')]
+        threads = [eventlet.spawn(run, project_id, name)
+                   for project_id, name in submitted]
+        for i in xrange(len(submitted)):
+            while len(self.order) <= i:
+                eventlet.sleep(0)
+            gates[self.order[i]].send()
+        for thread in threads:
+            thread.wait()
+        self.assertEqual(self.order, ['a1', 'a2', 'b1', 'c1', 'a3', 'b2'])
+
+    def test_queue_full(self):
+        work_scheduler = scheduler.BackupWorkScheduler({'restore': 1},
+                                                       max_queued=1)
+        threads = [eventlet.spawn(self._run, work_scheduler, 'restore',
+                                  'project', i) for i in xrange(2)]
+        eventlet.sleep(0)
+        self.assertRaises(exception.BackupQueueFull,
+                          self._run, work_scheduler, 'restore', 'project', 2)
+        self.done.send()
+        for thread in threads:
+            thread.wait()
+        self.assertEqual(self.order, [0, 1])
+
+        # The queue has room again once the operations are done
+        self._run(work_scheduler, 'restore', 'project', 3)
+        self.assertEqual(self.order, [0, 1, 3])
+
+    def test_release_admits_next(self):
+        work_scheduler = scheduler.BackupWorkScheduler({'backup': 1})
+        first_done = event.Event()
+
+        def run_first():
+            with work_scheduler.admit('backup', 'project'):
+                self.order.append('first')
+                first_done.wait()
+
+        first = eventlet.spawn(run_first)
+        second = eventlet.spawn(self._run, work_scheduler, 'backup',
+                                'project', 'second')
+        eventlet.sleep(0)
+        self.assertEqual(self.order, ['first'])
+        first_done.send()
+        first.wait()
+        self._wait_for(2)
+        self.assertEqual(self.order, ['first', 'second'])
+        self.done.send()
+        second.wait()
+
+    def test_release_on_error(self):
+        work_scheduler = scheduler.BackupWorkScheduler({'backup': 1})
+
+        def fail():
+            with work_scheduler.admit('backup', 'project'):
+                raise exception.BackupOperationError()
+
+        self.assertRaises(exception.BackupOperationError, fail)
+        # The slot was released, the next operation runs right away
+        thread = eventlet.spawn(self._run, work_scheduler, 'backup',
+                                'project', 'next')
+        eventlet.sleep(0)
+        self.assertEqual(self.order, ['next'])
+        self.done.send()
+        thread.wait()
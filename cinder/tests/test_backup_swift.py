@@ -18,13 +18,17 @@ Tests for Backup swift code.
 """
 
 import bz2
+import eventlet
 import hashlib
+import json
 import os
 import tempfile
 import zlib
 
 from swiftclient import client as swift
 
+from cinder.backup import compression
+from cinder.backup.drivers import swift as swift_driver
 from cinder.backup.drivers.swift import SwiftBackupDriver
 from cinder import context
 from cinder import db
@@ -32,6 +36,7 @@ from cinder import exception
 from cinder.openstack.common import log as logging
 from cinder import test
 from cinder.tests.backup.fake_swift_client import FakeSwiftClient
+from cinder.tests.backup.fake_swift_client import FakeSwiftConnection
 
 
 LOG = logging.getLogger(__name__)
@@ -55,11 +60,13 @@ class BackupSwiftTestCase(test.TestCase):
                'status': 'available'}
         return db.volume_create(self.ctxt, vol)['id']
 
-    def _create_backup_db_entry(self, container='test-container'):
-        backup = {'id': 123,
+    def _create_backup_db_entry(self, container='test-container',
+                                backup_id=123, parent_id=None):
+        backup = {'id': backup_id,
                   'size': 1,
                   'container': container,
-                  'volume_id': '1234-5678-1234-8888'}
+                  'volume_id': '1234-5678-1234-8888',
+                  'parent_id': parent_id}
         return db.backup_create(self.ctxt, backup)['id']
 
     def setUp(self):
@@ -102,6 +109,255 @@ class BackupSwiftTestCase(test.TestCase):
         backup = db.backup_get(self.ctxt, 123)
         service.backup(backup, self.volume_file)
 
+    def test_backup_pipelined(self):
+        self._create_backup_db_entry()
+        self.flags(backup_swift_object_size=8 * 1024)
+        self.flags(backup_swift_upload_concurrency=4)
+        self.flags(backup_swift_compress_concurrency=2)
+        self.flags(backup_swift_max_chunks_in_flight=6)
+        service = SwiftBackupDriver(self.ctxt)
+        object_lists = []
+
+        def fake_write_metadata(backup, volume_id, container, object_list):
+            object_lists.append(object_list)
+
+        self.stubs.Set(service, '_write_metadata', fake_write_metadata)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        object_list = object_lists[0]
+        self.assertEquals(len(object_list), 16)
+        names = [obj.keys()[0] for obj in object_list]
+        self.assertEquals(names, sorted(names))
+        offsets = [obj.values()[0]['offset'] for obj in object_list]
+        self.assertEquals(offsets, range(8 * 1024, 129 * 1024, 8 * 1024))
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertEquals(backup['object_count'], 17)
+
+    def test_backup_records_progress(self):
+        self._create_backup_db_entry()
+        self.flags(backup_swift_object_size=8 * 1024)
+        self.flags(backup_compression_algorithm='none')
+        service = SwiftBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        backup = db.backup_get(self.ctxt, 123)
+        progress = json.loads(backup['progress'])
+        self.assertEquals(progress['volume_bytes'], 128 * 1024)
+        self.assertEquals(progress['backend_bytes'], 128 * 1024)
+        self.assertEquals(progress['total_bytes'], 1024 * 1024 * 1024)
+        self.assertEquals(progress['compression_ratio'], 1.0)
+
+    def test_backup_pipelined_put_object_wraps_socket_error(self):
+        container_name = 'socket_error_on_put'
+        self._create_backup_db_entry(container=container_name)
+        self.flags(backup_swift_upload_concurrency=2)
+        service = SwiftBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertRaises(exception.SwiftConnectionFailed,
+                          service.backup,
+                          backup, self.volume_file)
+
+    def _parent_metadata(self, chunk_size, changed):
+        """Return parent metadata matching the volume except for changed."""
+        objects = []
+        self.volume_file.seek(0)
+        for i in xrange(0, 128 * 1024 / chunk_size):
+            data = self.volume_file.read(chunk_size)
+            if i in changed:
+                data = 'x' * chunk_size
+            objects.append({'parent-%05d' % (i + 1): {
+                'offset': (i + 1) * chunk_size,
+                'length': chunk_size,
+                'compression': 'zlib',
+                'md5': 'fake-md5-sum',
+                'sha256': hashlib.sha256(data).hexdigest()}})
+        self.volume_file.seek(0)
+        return {'version': '1.1.0', 'objects': objects}
+
+    def _test_backup_incremental(self):
+        chunk_size = 8 * 1024
+        self.flags(backup_swift_object_size=chunk_size)
+        self._create_backup_db_entry(backup_id=122)
+        self._create_backup_db_entry(parent_id=122)
+        service = SwiftBackupDriver(self.ctxt)
+        parent_metadata = self._parent_metadata(chunk_size, [2, 7])
+        object_lists = []
+        put_names = []
+        real_put_object = service.conn.put_object
+
+        def fake_put_object(container, name, reader, **kwargs):
+            put_names.append(name)
+            return real_put_object(container, name, reader, **kwargs)
+
+        def fake_write_metadata(backup, volume_id, container, object_list):
+            object_lists.append(object_list)
+
+        self.stubs.Set(service, '_read_metadata',
+                       lambda backup: parent_metadata)
+        self.stubs.Set(service, '_write_metadata', fake_write_metadata)
+        self.stubs.Set(service, '_create_connection', lambda: service.conn)
+        self.stubs.Set(service.conn, 'put_object', fake_put_object)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        self.assertEquals(len(put_names), 2)
+        names = [obj.keys()[0] for obj in object_lists[0]]
+        self.assertEquals(len(names), 16)
+        self.assertEquals(names[2], put_names[0])
+        self.assertEquals(names[7], put_names[1])
+        for i in xrange(0, 16):
+            if i not in (2, 7):
+                self.assertEquals(names[i], 'parent-%05d' % (i + 1))
+
+    def test_backup_incremental(self):
+        self._test_backup_incremental()
+
+    def test_backup_incremental_pipelined(self):
+        self.flags(backup_swift_upload_concurrency=4)
+        self._test_backup_incremental()
+
+    def test_restore_v1_1_with_parent_objects(self):
+        self._create_backup_db_entry()
+        db.backup_update(self.ctxt, 123, {'service_metadata': 'child'})
+        service = SwiftBackupDriver(self.ctxt)
+        metadata = {'version': '1.1.0',
+                    'parent_id': 122,
+                    'objects': [{'parent-00001': {'compression': 'zlib'}},
+                                {'child-00001': {'compression': 'zlib'}}]}
+        restored = []
+        real_get_object = service.conn.get_object
+
+        def fake_get_object(container, name):
+            restored.append(name)
+            return real_get_object(container, name)
+
+        self.stubs.Set(service, '_generate_object_names',
+                       lambda backup: ['child-00001', 'child_metadata'])
+        self.stubs.Set(service.conn, 'get_object', fake_get_object)
+        with tempfile.NamedTemporaryFile() as volume_file:
+            backup = db.backup_get(self.ctxt, 123)
+            service._restore_v1_1(backup, '1234-5678-1234-8888', metadata,
+                                  volume_file)
+        self.assertEquals(restored, ['parent-00001', 'child-00001'])
+
+    def test_restore_v1_1_missing_own_object(self):
+        self._create_backup_db_entry()
+        db.backup_update(self.ctxt, 123, {'service_metadata': 'child'})
+        service = SwiftBackupDriver(self.ctxt)
+        metadata = {'version': '1.1.0',
+                    'objects': [{'parent-00001': {'compression': 'zlib'}},
+                                {'child-00001': {'compression': 'zlib'}}]}
+        self.stubs.Set(service, '_generate_object_names',
+                       lambda backup: ['child_metadata'])
+        with tempfile.NamedTemporaryFile() as volume_file:
+            backup = db.backup_get(self.ctxt, 123)
+            self.assertRaises(exception.InvalidBackup,
+                              service._restore_v1_1,
+                              backup, '1234-5678-1234-8888', metadata,
+                              volume_file)
+
+    def _test_backup_zero_chunks(self):
+        chunk_size = 8 * 1024
+        self.flags(backup_swift_object_size=chunk_size)
+        self._create_backup_db_entry()
+        service = SwiftBackupDriver(self.ctxt)
+        object_lists = []
+
+        def fake_write_metadata(backup, volume_id, container, object_list):
+            object_lists.append(object_list)
+
+        self.stubs.Set(service, '_write_metadata', fake_write_metadata)
+        self.volume_file.seek(chunk_size * 3)
+        self.volume_file.write('\0' * chunk_size * 2)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        object_list = object_lists[0]
+        self.assertEquals(len(object_list), 16)
+        holes = [i for i, obj in enumerate(object_list)
+                 if obj.values()[0].get('hole')]
+        self.assertEquals(holes, [3, 4])
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertEquals(backup['object_count'], 15)
+
+    def test_backup_zero_chunks(self):
+        self._test_backup_zero_chunks()
+
+    def test_backup_zero_chunks_pipelined(self):
+        self.flags(backup_swift_upload_concurrency=4)
+        self._test_backup_zero_chunks()
+
+    def test_restore_hole(self):
+        self._create_backup_db_entry()
+        db.backup_update(self.ctxt, 123, {'service_metadata': 'prefix'})
+        service = SwiftBackupDriver(self.ctxt)
+        metadata = {'version': '1.1.0',
+                    'objects': [{'prefix-zero-10': {'compression': 'none',
+                                                    'length': 10,
+                                                    'hole': True}},
+                                {'prefix-00001': {'compression': 'zlib'}}]}
+        self.stubs.Set(service, '_generate_object_names',
+                       lambda backup: ['prefix-00001', 'prefix_metadata'])
+        with tempfile.NamedTemporaryFile() as volume_file:
+            backup = db.backup_get(self.ctxt, 123)
+            service._restore_v1_1(backup, '1234-5678-1234-8888', metadata,
+                                  volume_file)
+            volume_file.seek(0)
+            data = volume_file.read()
+        self.assertEquals(data[:10], '\0' * 10)
+        self.assertEquals(len(data), 10 + 1024 * 1024)
+
+    def _test_restore_objects(self, concurrency, fsync_interval):
+        self.flags(backup_swift_restore_concurrency=concurrency)
+        self.flags(backup_swift_restore_fsync_interval=fsync_interval)
+        self._create_backup_db_entry()
+        service = SwiftBackupDriver(self.ctxt)
+        objects = [{'object-%05d' % i: {'compression': 'zlib'}}
+                   for i in xrange(1, 11)]
+        fsyncs = []
+
+        def fake_get_object(conn, container, name):
+            # Complete the downloads out of order
+            eventlet.sleep(0.001 * (10 - int(name[-5:])))
+            return None, zlib.compress(name)
+
+        self.stubs.Set(FakeSwiftConnection, 'get_object', fake_get_object)
+        self.stubs.Set(os, 'fsync', lambda fileno: fsyncs.append(fileno))
+        with tempfile.NamedTemporaryFile() as volume_file:
+            backup = db.backup_get(self.ctxt, 123)
+            service._restore_objects(backup, '1234-5678-1234-8888', objects,
+                                     volume_file)
+            volume_file.seek(0)
+            data = volume_file.read()
+        self.assertEquals(data, ''.join('object-%05d' % i
+                                        for i in xrange(1, 11)))
+        return len(fsyncs)
+
+    def test_restore_objects_serial(self):
+        self.assertEquals(self._test_restore_objects(1, 1), 10)
+
+    def test_restore_objects_prefetch(self):
+        self.assertEquals(self._test_restore_objects(4, 3), 4)
+
+    def test_restore_objects_prefetch_wraps_socket_error(self):
+        self.flags(backup_swift_restore_concurrency=4)
+        container_name = 'socket_error_on_get'
+        self._create_backup_db_entry(container=container_name)
+        service = SwiftBackupDriver(self.ctxt)
+        objects = [{'object-%05d' % i: {'compression': 'zlib'}}
+                   for i in xrange(1, 11)]
+
+        with tempfile.NamedTemporaryFile() as volume_file:
+            backup = db.backup_get(self.ctxt, 123)
+            self.assertRaises(exception.SwiftConnectionFailed,
+                              service._restore_objects,
+                              backup, '1234-5678-1234-8888', objects,
+                              volume_file)
+
     def test_backup_default_container(self):
         self._create_backup_db_entry(container=None)
         service = SwiftBackupDriver(self.ctxt)
@@ -177,6 +433,91 @@ class BackupSwiftTestCase(test.TestCase):
         backup = db.backup_get(self.ctxt, 123)
         service.delete(backup)
 
+    def _test_delete_from_metadata(self):
+        self._create_backup_db_entry()
+        db.backup_update(self.ctxt, 123, {'service_metadata': 'child'})
+        service = SwiftBackupDriver(self.ctxt)
+        metadata = {'objects': [{'parent-00001': {'compression': 'zlib'}},
+                                {'child-zero-2': {'hole': True}},
+                                {'child-00001': {'compression': 'zlib'}},
+                                {'child-00002': {'compression': 'zlib'}},
+                                {'child-00003': {'compression': 'zlib'}}]}
+
+        def fake_generate_object_names(backup):
+            self.fail('the container should not be listed')
+
+        self.stubs.Set(service, '_read_metadata', lambda backup: metadata)
+        self.stubs.Set(service, '_generate_object_names',
+                       fake_generate_object_names)
+        return service
+
+    def test_delete_from_metadata(self):
+        self.flags(backup_swift_delete_concurrency=3)
+        service = self._test_delete_from_metadata()
+        deleted = []
+
+        def fake_delete_object(conn, container, name):
+            eventlet.sleep(0.001 * (4 - len(deleted)))
+            deleted.append(name)
+
+        self.stubs.Set(FakeSwiftConnection, 'delete_object',
+                       fake_delete_object)
+        backup = db.backup_get(self.ctxt, 123)
+        service.delete(backup)
+        self.assertEquals(sorted(deleted[:3]),
+                          ['child-00001', 'child-00002', 'child-00003'])
+        self.assertEquals(deleted[3:], ['child_metadata'])
+
+    def test_delete_bulk(self):
+        service = self._test_delete_from_metadata()
+        requests = []
+
+        def fake_swift_request(func, *args):
+            if func is swift_driver._get_swift_info:
+                return {'bulk_delete': {'max_deletes_per_request': 2}}
+            requests.append(args[0])
+            return {'Number Deleted': len(args[0]), 'Errors': []}
+
+        self.stubs.Set(service, '_swift_request', fake_swift_request)
+        backup = db.backup_get(self.ctxt, 123)
+        service.delete(backup)
+        self.assertEquals(requests,
+                          [['/test-container/child-00001',
+                            '/test-container/child-00002'],
+                           ['/test-container/child-00003'],
+                           ['/test-container/child_metadata']])
+
+    def test_delete_bulk_rejected(self):
+        service = self._test_delete_from_metadata()
+        deleted = []
+
+        def fake_swift_request(func, *args):
+            if func is swift_driver._get_swift_info:
+                return {'bulk_delete': {}}
+            raise swift.ClientException('fake exception', http_status=400)
+
+        self.stubs.Set(service, '_swift_request', fake_swift_request)
+        self.stubs.Set(service.conn, 'delete_object',
+                       lambda container, name: deleted.append(name))
+        backup = db.backup_get(self.ctxt, 123)
+        service.delete(backup)
+        self.assertEquals(deleted, ['child-00001', 'child-00002',
+                                    'child-00003', 'child_metadata'])
+
+    def test_swift_request(self):
+        service = SwiftBackupDriver(self.ctxt)
+        service.conn.url = 'http://swift/v1/AUTH_fake'
+        service.conn.token = 'token'
+        self.stubs.Set(swift, 'http_connection',
+                       lambda url: ('parsed-%s' % url, 'conn'))
+
+        def fake_func(url, token, arg, http_conn=None):
+            return url, token, arg, http_conn
+
+        self.assertEquals(service._swift_request(fake_func, 'arg'),
+                          ('http://swift/v1/AUTH_fake', 'token', 'arg',
+                           ('parsed-http://swift/v1/AUTH_fake', 'conn')))
+
     def test_delete_wraps_socket_error(self):
         container_name = 'socket_error_on_delete'
         self._create_backup_db_entry(container=container_name)
@@ -196,6 +537,174 @@ class BackupSwiftTestCase(test.TestCase):
         self.assertEquals(compressor, bz2)
         self.assertRaises(ValueError, service._get_compressor, 'fake')
 
+    def test_get_compressor_with_level(self):
+        self.flags(backup_compression_level=1)
+        service = SwiftBackupDriver(self.ctxt)
+        data = os.urandom(1024) * 64
+        compressor = service._get_compressor('zlib')
+        self.assertEquals(compressor.compress(data), zlib.compress(data, 1))
+        self.assertEquals(compressor.decompress(zlib.compress(data)), data)
+        compressor = service._get_compressor('bz2')
+        self.assertEquals(compressor.compress(data), bz2.compress(data, 1))
+
+    def test_get_compressor_clamps_level(self):
+        data = os.urandom(1024) * 64
+        self.flags(backup_compression_level=22)
+        service = SwiftBackupDriver(self.ctxt)
+        compressor = service._get_compressor('zlib')
+        self.assertEquals(compressor.compress(data), zlib.compress(data, 9))
+        compressor = service._get_compressor('bz2')
+        self.assertEquals(compressor.compress(data), bz2.compress(data, 9))
+        self.flags(backup_compression_level=0)
+        compressor = service._get_compressor('bz2')
+        self.assertEquals(compressor.compress(data), bz2.compress(data, 1))
+
+    def test_get_compressor_missing_library(self):
+        def fake_compressor(level):
+            raise ImportError()
+
+        service = SwiftBackupDriver(self.ctxt)
+        self.stubs.Set(compression, 'COMPRESSORS',
+                       {'fake': fake_compressor})
+        self.assertRaises(ValueError, service._get_compressor, 'fake')
+        self.assertFalse(compression.is_supported('fake'))
+        self.assertTrue(compression.is_supported('None'))
+
+    def test_backup_per_backup_compression(self):
+        self._create_backup_db_entry()
+        db.backup_update(self.ctxt, 123, {'compression': 'bz2'})
+        self.flags(backup_compression_algorithm='zlib')
+        service = SwiftBackupDriver(self.ctxt)
+        object_lists = []
+
+        def fake_write_metadata(backup, volume_id, container, object_list):
+            object_lists.append(object_list)
+
+        self.stubs.Set(service, '_write_metadata', fake_write_metadata)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        for obj in object_lists[0]:
+            self.assertEquals(obj.values()[0]['compression'], 'bz2')
+
+    def test_backup_unsupported_per_backup_compression(self):
+        self._create_backup_db_entry()
+        db.backup_update(self.ctxt, 123, {'compression': 'fake'})
+        service = SwiftBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertRaises(ValueError, service.backup, backup,
+                          self.volume_file)
+
+    def _write_dedup_volume_file(self, blocks):
+        self.volume_file.seek(0)
+        self.volume_file.truncate()
+        for block in blocks:
+            self.volume_file.write(block)
+        self.volume_file.seek(0)
+
+    def test_backup_dedup(self):
+        self.flags(backup_swift_dedup=True)
+        self.flags(backup_swift_object_size=8 * 1024)
+        block = os.urandom(8 * 1024)
+        self._write_dedup_volume_file([block] * 4)
+        service = SwiftBackupDriver(self.ctxt)
+        object_lists = []
+
+        def fake_write_metadata(backup, volume_id, container, object_list):
+            object_lists.append(object_list)
+
+        self.stubs.Set(service, '_write_metadata', fake_write_metadata)
+        for backup_id in (123, 124):
+            self._create_backup_db_entry(backup_id=backup_id)
+            backup = db.backup_get(self.ctxt, backup_id)
+            self.volume_file.seek(0)
+            service.backup(backup, self.volume_file)
+
+        names = set(obj.keys()[0]
+                    for object_list in object_lists for obj in object_list)
+        self.assertEquals(len(names), 1)
+        object_name = names.pop()
+        sha256 = hashlib.sha256(block).hexdigest()
+        self.assertTrue(object_name.startswith('chunk_%s_' % sha256))
+        for object_list in object_lists:
+            for obj in object_list:
+                chunk = obj.values()[0]
+                self.assertEquals(chunk['container'], 'volumebackups_chunks')
+                self.assertTrue(chunk['dedup'])
+        for backup_id in (123, 124):
+            backup = db.backup_get(self.ctxt, backup_id)
+            self.assertEquals(backup['object_count'], 4)
+        stored = db.backup_chunk_unref(self.ctxt, 'volumebackups_chunks',
+                                       object_name)
+        self.assertEquals(stored['refcount'], 7)
+
+    def test_backup_dedup_failure_releases_refs(self):
+        self.flags(backup_swift_dedup=True)
+        self.flags(backup_swift_dedup_container='socket_error_on_put')
+        self.flags(backup_swift_object_size=8 * 1024)
+        block = os.urandom(8 * 1024)
+        self._write_dedup_volume_file([block, os.urandom(8 * 1024)])
+        sha256 = hashlib.sha256(block).hexdigest()
+        db.backup_chunk_create(self.ctxt,
+                               {'project_id': self.ctxt.project_id,
+                                'container': 'socket_error_on_put',
+                                'object_name': 'stored_chunk',
+                                'sha256': sha256,
+                                'md5': 'fake-md5-sum',
+                                'compression': 'zlib',
+                                'length': 8 * 1024})
+        self._create_backup_db_entry()
+        service = SwiftBackupDriver(self.ctxt)
+        backup = db.backup_get(self.ctxt, 123)
+        self.assertRaises(exception.SwiftConnectionFailed,
+                          service.backup,
+                          backup, self.volume_file)
+        stored = db.backup_chunk_ref(self.ctxt, self.ctxt.project_id,
+                                     'socket_error_on_put', sha256)
+        self.assertEquals(stored['refcount'], 2)
+
+    def test_delete_dedup_releases_chunks(self):
+        self._create_backup_db_entry()
+        for object_name, sha256 in (('shared_chunk', 'sha-1'),
+                                    ('owned_chunk', 'sha-2')):
+            db.backup_chunk_create(self.ctxt,
+                                   {'project_id': self.ctxt.project_id,
+                                    'container': 'volumebackups_chunks',
+                                    'object_name': object_name,
+                                    'sha256': sha256,
+                                    'md5': 'fake-md5-sum',
+                                    'compression': 'zlib',
+                                    'length': 10})
+        db.backup_chunk_ref(self.ctxt, self.ctxt.project_id,
+                            'volumebackups_chunks', 'sha-1')
+        service = SwiftBackupDriver(self.ctxt)
+        metadata = {'objects': [
+            {'shared_chunk': {'container': 'volumebackups_chunks',
+                              'dedup': True}},
+            {'owned_chunk': {'container': 'volumebackups_chunks',
+                             'dedup': True}},
+            {'parent_chunk': {'container': 'volumebackups_chunks'}}]}
+        deleted = []
+
+        def fake_delete_object(container, object_name):
+            deleted.append((container, object_name))
+
+        self.stubs.Set(service, '_read_metadata', lambda backup: metadata)
+        self.stubs.Set(service, '_generate_object_names', lambda backup: [])
+        self.stubs.Set(service.conn, 'delete_object', fake_delete_object)
+        backup = db.backup_get(self.ctxt, 123)
+        service.delete(backup)
+        self.assertEquals(deleted, [('volumebackups_chunks', 'owned_chunk')])
+        self.assertEquals(db.backup_chunk_ref(self.ctxt,
+                                              self.ctxt.project_id,
+                                              'volumebackups_chunks',
+                                              'sha-1')['refcount'], 2)
+        self.assertEquals(db.backup_chunk_ref(self.ctxt,
+                                              self.ctxt.project_id,
+                                              'volumebackups_chunks',
+                                              'sha-2'), None)
+
     def test_check_container_exists(self):
         service = SwiftBackupDriver(self.ctxt)
         exists = service._check_container_exists('fake_container')
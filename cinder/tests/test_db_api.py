@@ -19,7 +19,9 @@ from oslo.config import cfg
 
 from cinder import context
 from cinder import db
+from cinder.db.sqlalchemy import api as sqlalchemy_api
 from cinder import exception
+from cinder.openstack.common import timeutils
 from cinder.openstack.common import uuidutils
 from cinder.quota import ReservableResource
 from cinder import test
@@ -393,6 +395,64 @@ class DBAPIVolumeTestCase(BaseTest):
                                             self.ctxt, 'p%d' % i, None,
                                             None, 'host', None))
 
+    def test_volume_get_all_by_project_with_filters(self):
+        vols = [db.volume_create(self.ctxt,
+                                 {'project_id': 'p1',
+                                  'display_name': 'vol%d' % i,
+                                  'status': 'available' if i % 2 else 'in-use',
+                                  'metadata': {'key1': 'value%d' % (i % 2)}})
+                for i in xrange(4)]
+        db.volume_create(self.ctxt, {'project_id': 'p2',
+                                     'status': 'available'})
+
+        def get_all(filters, limit=None, offset=None):
+            volumes = db.volume_get_all_by_project(self.ctxt, 'p1', None,
+                                                   limit, 'display_name',
+                                                   'asc', filters=filters,
+                                                   offset=offset)
+            return [volume['id'] for volume in volumes]
+
+        self.assertEqual([vols[1]['id'], vols[3]['id']],
+                         get_all({'status': 'available'}))
+        self.assertEqual([vols[2]['id']], get_all({'display_name': 'vol2'}))
+        self.assertEqual([vols[0]['id'], vols[2]['id']],
+                         get_all({'metadata': {'key1': 'value0'}}))
+        self.assertEqual([vols[0]['id'], vols[2]['id']],
+                         get_all({'status': ['in-use', 'error']}))
+        self.assertEqual([], get_all({'status': 'available',
+                                      'metadata': {'key1': 'value0'}}))
+        self.assertEqual([], get_all({'nonexistent': 'value'}))
+
+        # the limit and offset only count the matching volumes
+        self.assertEqual([vols[3]['id']],
+                         get_all({'status': 'available'}, limit=1, offset=1))
+
+    def test_volume_get_all_with_filters(self):
+        vol_type = db.volume_type_create(self.ctxt, {'name': 'type1'})
+        vols = [db.volume_create(self.ctxt, {'bootable': True,
+                                             'volume_type_id': vol_type['id'],
+                                             'availability_zone': 'az1'}),
+                db.volume_create(self.ctxt, {'bootable': False,
+                                             'availability_zone': 'az1'}),
+                db.volume_create(self.ctxt, {'bootable': False,
+                                             'status': 'migration_target',
+                                             'availability_zone': 'az2'})]
+
+        def get_all(filters):
+            volumes = db.volume_get_all(self.ctxt, None, None, 'created_at',
+                                        'asc', filters=filters)
+            return set(volume['id'] for volume in volumes)
+
+        self.assertEqual(set([vols[0]['id']]), get_all({'bootable': 'true'}))
+        self.assertEqual(set([vols[1]['id'], vols[2]['id']]),
+                         get_all({'bootable': 'false'}))
+        self.assertEqual(set([vols[0]['id']]),
+                         get_all({'volume_type': 'type1'}))
+        self.assertEqual(set([vols[0]['id'], vols[1]['id']]),
+                         get_all({'availability_zone': 'az1'}))
+        self.assertEqual(set([vols[0]['id'], vols[1]['id']]),
+                         get_all({'no_migration_targets': True}))
+
     def test_volume_get_iscsi_target_num(self):
         target = db.iscsi_target_create_safe(self.ctxt, {'volume_id': 42,
                                                          'target_num': 43})
@@ -656,6 +716,7 @@ class DBAPIBackupTestCase(BaseTest):
             'user_id': 'user',
             'project_id': 'project',
             'volume_id': 'volume',
+            'parent_id': 'parent',
             'host': 'host',
             'availability_zone': 'zone',
             'display_name': 'display',
@@ -665,6 +726,8 @@ class DBAPIBackupTestCase(BaseTest):
             'fail_reason': 'test',
             'service_metadata': 'metadata',
             'service': 'service',
+            'compression': 'zlib',
+            'progress': 'progress',
             'size': 1000,
             'object_count': 100}
         if one:
@@ -703,6 +766,11 @@ class DBAPIBackupTestCase(BaseTest):
                                               self.created[1]['project_id'])
         self._assertEqualObjects(self.created[1], byproj[0])
 
+    def test_backup_get_all_by_volume(self):
+        byvol = db.backup_get_all_by_volume(self.ctxt,
+                                            self.created[1]['volume_id'])
+        self._assertEqualObjects(self.created[1], byvol[0])
+
     def test_backup_update(self):
         updated_values = self._get_values(one=True)
         update_id = self.created[1]['id']
@@ -719,3 +787,108 @@ class DBAPIBackupTestCase(BaseTest):
     def test_backup_not_found(self):
         self.assertRaises(exception.BackupNotFound, db.backup_get, self.ctxt,
                           'notinbase')
+
+
+class DBAPIBackupChunkTestCase(BaseTest):
+
+    """Tests for db.api.backup_chunk_* methods."""
+
+    def setUp(self):
+        super(DBAPIBackupChunkTestCase, self).setUp()
+        self.chunk = db.backup_chunk_create(self.ctxt,
+                                            {'project_id': 'project',
+                                             'container': 'container',
+                                             'object_name': 'chunk_sha',
+                                             'sha256': 'sha',
+                                             'md5': 'md5',
+                                             'compression': 'zlib',
+                                             'length': 10})
+
+    def test_backup_chunk_create(self):
+        self.assertEqual(self.chunk['refcount'], 1)
+
+    def test_backup_chunk_ref(self):
+        chunk = db.backup_chunk_ref(self.ctxt, 'project', 'container', 'sha')
+        self.assertEqual(chunk['object_name'], 'chunk_sha')
+        self.assertEqual(chunk['refcount'], 2)
+        self.assertIsNone(db.backup_chunk_ref(self.ctxt, 'other',
+                                              'container', 'sha'))
+
+    def test_backup_chunk_unref(self):
+        db.backup_chunk_ref(self.ctxt, 'project', 'container', 'sha')
+        chunk = db.backup_chunk_unref(self.ctxt, 'container', 'chunk_sha')
+        self.assertEqual(chunk['refcount'], 1)
+        self.assertFalse(chunk['deleted'])
+        chunk = db.backup_chunk_unref(self.ctxt, 'container', 'chunk_sha')
+        self.assertEqual(chunk['refcount'], 0)
+        self.assertTrue(chunk['deleted'])
+        self.assertIsNone(db.backup_chunk_ref(self.ctxt, 'project',
+                                              'container', 'sha'))
+        self.assertIsNone(db.backup_chunk_unref(self.ctxt, 'container',
+                                                'chunk_sha'))
+
+
+class DBAPIPurgeTestCase(BaseTest):
+
+    """Unit tests for cinder.db.api.purge_deleted_rows."""
+
+    def setUp(self):
+        super(DBAPIPurgeTestCase, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2013, 2, 1))
+        self.addCleanup(timeutils.clear_time_override)
+        self.volumes = [db.volume_create(self.ctxt,
+                                         {'host': 'host1',
+                                          'metadata': {'key': 'value'}})
+                        for i in range(3)]
+        db.volume_destroy(self.ctxt, self.volumes[0]['id'])
+        db.volume_destroy(self.ctxt, self.volumes[1]['id'])
+        timeutils.advance_time_delta(datetime.timedelta(days=2))
+
+    def test_purge_deleted_rows(self):
+        purged = db.purge_deleted_rows(self.ctxt, 1, batch_size=1)
+        self.assertEqual(purged, {'volumes': 2, 'volume_metadata': 2})
+
+        ctxt = self.ctxt.elevated(read_deleted='yes')
+        for volume in self.volumes[:2]:
+            self.assertRaises(exception.VolumeNotFound,
+                              db.volume_get, ctxt, volume['id'])
+        volume = db.volume_get(ctxt, self.volumes[2]['id'])
+        self.assertEqual(volume['volume_metadata'][0]['value'], 'value')
+
+    def test_purge_deleted_rows_still_referenced(self):
+        volume = db.volume_create(self.ctxt, {'host': 'host1'})
+        db.volume_glance_metadata_create(self.ctxt, volume['id'],
+                                         'image_id', 'image1')
+        db.volume_destroy(self.ctxt, volume['id'])
+        timeutils.advance_time_delta(datetime.timedelta(days=2))
+
+        # Only enforced by sqlite when asked to, on the test connection
+        engine = sqlalchemy_api.get_engine()
+        engine.execute('PRAGMA foreign_keys = ON')
+        self.addCleanup(engine.execute, 'PRAGMA foreign_keys = OFF')
+
+        purged = db.purge_deleted_rows(self.ctxt, 1, batch_size=3)
+        self.assertEqual(purged, {'volumes': 2, 'volume_metadata': 2})
+        ctxt = self.ctxt.elevated(read_deleted='yes')
+        db.volume_get(ctxt, volume['id'])
+
+        # The referenced volume doesn't stop the next ones being purged
+        for i in range(3):
+            other = db.volume_create(self.ctxt, {'host': 'host1'})
+            db.volume_destroy(self.ctxt, other['id'])
+        timeutils.advance_time_delta(datetime.timedelta(days=2))
+        purged = db.purge_deleted_rows(self.ctxt, 1, batch_size=1)
+        self.assertEqual(purged, {'volumes': 3})
+        db.volume_get(ctxt, volume['id'])
+
+    def test_purge_deleted_rows_too_recent(self):
+        self.assertEqual(db.purge_deleted_rows(self.ctxt, 3), {})
+        ctxt = self.ctxt.elevated(read_deleted='yes')
+        for volume in self.volumes:
+            db.volume_get(ctxt, volume['id'])
+
+    def test_purge_deleted_rows_invalid_age(self):
+        self.assertRaises(exception.InvalidParameterValue,
+                          db.purge_deleted_rows, self.ctxt, -1)
+        self.assertRaises(exception.InvalidParameterValue,
+                          db.purge_deleted_rows, self.ctxt, 'a day')
@@ -18,13 +18,24 @@
 
 import contextlib
 import mox
+import os
+import shutil
+import tempfile
 import textwrap
 
+from oslo.config import cfg
+
+from cinder import exception
 from cinder.image import image_utils
+from cinder.image import probe
 from cinder import test
+from cinder import units
 from cinder import utils
 
 
+CONF = cfg.CONF
+
+
 class TestUtils(test.TestCase):
     def setUp(self):
         super(TestUtils, self).setUp()
@@ -47,6 +58,19 @@ class TestUtils(test.TestCase):
 
         mox.VerifyAll()
 
+    def test_convert_image_with_source_format(self):
+        mox = self._mox
+        mox.StubOutWithMock(utils, 'execute')
+
+        utils.execute('qemu-img', 'convert', '-f', 'qcow2', '-O', 'raw',
+                      'source', 'dest', run_as_root=True)
+
+        mox.ReplayAll()
+
+        image_utils.convert_image('source', 'dest', 'raw', src_format='qcow2')
+
+        mox.VerifyAll()
+
 
 class TestExtractTo(test.TestCase):
     def test_extract_to_calls_tar(self):
@@ -262,3 +286,231 @@ class TestXenServerImageToCoalescedVhd(test.TestCase):
         mox.ReplayAll()
         image_utils.replace_xenserver_image_with_coalesced_vhd('image')
         mox.VerifyAll()
+
+
+class FakeImageService(object):
+    def __init__(self, disk_format, chunks):
+        self.disk_format = disk_format
+        self.chunks = chunks
+
+    def show(self, context, image_id):
+        return {'id': image_id,
+                'disk_format': self.disk_format,
+                'container_format': 'bare'}
+
+    def download(self, context, image_id, data):
+        for chunk in self.chunks:
+            data.write(chunk)
+
+
+class TestFetchToRaw(test.TestCase):
+    def setUp(self):
+        super(TestFetchToRaw, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.flags(image_conversion_dir=self.tmpdir)
+        self.dest = os.path.join(self.tmpdir, 'volume')
+        self.probed = []
+
+    def _fake_qemu_img_info(self, fmt):
+        def fake_qemu_img_info(path):
+            with open(path, 'rb') as f:
+                self.probed.append(f.read())
+            return image_utils.QemuImgInfo('file format: %s' % fmt)
+        self.stubs.Set(image_utils, 'qemu_img_info', fake_qemu_img_info)
+
+    def test_raw_image_written_directly(self):
+        self.stubs.Set(image_utils, 'RAW_PROBE_SIZE', 4)
+        self._fake_qemu_img_info('raw')
+        self.mox.StubOutWithMock(image_utils, 'convert_image')
+        self.mox.ReplayAll()
+
+        image_service = FakeImageService('raw', ['ab', 'cde', 'fgh'])
+        image_utils.fetch_to_raw(None, image_service, 'image', self.dest)
+
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), 'abcdefgh')
+        self.assertEqual(self.probed, ['abcd'])
+        self.assertEqual(os.listdir(self.tmpdir), ['volume'])
+
+    def test_short_raw_image_probed(self):
+        self._fake_qemu_img_info('raw')
+        image_service = FakeImageService('raw', ['ab'])
+        image_utils.fetch_to_raw(None, image_service, 'image', self.dest)
+
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), 'ab')
+        self.assertEqual(self.probed, ['ab'])
+
+    def test_raw_image_in_other_format_rejected(self):
+        self.stubs.Set(image_utils, 'RAW_PROBE_SIZE', 4)
+        self._fake_qemu_img_info('qcow2')
+        image_service = FakeImageService('raw', ['QFI\xfb', 'data'])
+
+        self.assertRaises(exception.ImageUnacceptable,
+                          image_utils.fetch_to_raw,
+                          None, image_service, 'image', self.dest)
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), '')
+
+    def test_other_format_converted(self):
+        self.mox.StubOutWithMock(image_utils, 'fetch')
+        self.mox.StubOutWithMock(image_utils, 'qemu_img_info')
+        self.mox.StubOutWithMock(image_utils, 'convert_image')
+
+        image_utils.fetch(None, mox.IgnoreArg(), 'image', mox.IgnoreArg(),
+                          None, None)
+        image_utils.qemu_img_info(mox.IgnoreArg()).AndReturn(
+            image_utils.QemuImgInfo('file format: qcow2'))
+        image_utils.convert_image(mox.IgnoreArg(), self.dest, 'raw',
+                                  src_format='qcow2')
+        image_utils.qemu_img_info(self.dest).AndReturn(
+            image_utils.QemuImgInfo('file format: raw'))
+        self.mox.ReplayAll()
+
+        image_service = FakeImageService('qcow2', [])
+        image_utils.fetch_to_raw(None, image_service, 'image', self.dest)
+        self.mox.VerifyAll()
+
+
+class FakeUploadImageService(object):
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.uploaded = None
+        self.size = None
+
+    def update(self, context, image_id, image_meta, data=None):
+        self.size = data.tell()
+        data.seek(0, os.SEEK_END)
+        self.size = data.tell() - self.size
+        data.seek(0)
+        chunks = []
+        while True:
+            chunk = data.read(3)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if self.fail:
+                raise exception.ImageNotFound(image_id=image_id)
+        self.uploaded = ''.join(chunks)
+
+
+class TestUploadVolume(test.TestCase):
+    def setUp(self):
+        super(TestUploadVolume, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.flags(image_conversion_dir=os.path.join(self.tmpdir, 'conv'))
+        self.volume_path = os.path.join(self.tmpdir, 'volume')
+        with open(self.volume_path, 'wb') as f:
+            f.write('abcdefgh')
+
+    def test_raw_uploaded_with_progress(self):
+        progress = []
+        image_service = FakeUploadImageService()
+        image_utils.upload_volume(None, image_service,
+                                  {'id': 'image', 'disk_format': 'raw'},
+                                  self.volume_path,
+                                  lambda sent, total: progress.append(
+                                      (sent, total)))
+        self.assertEqual(image_service.uploaded, 'abcdefgh')
+        self.assertEqual(image_service.size, 8)
+        self.assertEqual(progress, [(3, 8), (6, 8), (8, 8), (8, 8)])
+
+    def test_converted_file_removed_on_failure(self):
+        def fake_convert_image(source, dest, out_format, src_format=None):
+            with open(dest, 'wb') as f:
+                f.write('converted')
+
+        self.stubs.Set(image_utils, 'convert_image', fake_convert_image)
+        self.stubs.Set(image_utils, 'qemu_img_info',
+                       lambda path: image_utils.QemuImgInfo(
+                           'file format: qcow2'))
+        image_service = FakeUploadImageService(fail=True)
+        self.assertRaises(exception.ImageNotFound,
+                          image_utils.upload_volume,
+                          None, image_service,
+                          {'id': 'image', 'disk_format': 'qcow2'},
+                          self.volume_path)
+        self.assertEqual(os.listdir(CONF.image_conversion_dir), [])
+
+    def test_reader_seek_restarts_progress(self):
+        with open(self.volume_path, 'rb') as f:
+            reader = image_utils.ImageUploadReader(f, 'image')
+            self.assertEqual(reader.size, 8)
+            self.assertEqual(reader.read(5), 'abcde')
+            self.assertEqual(reader.tell(), 5)
+            reader.seek(0)
+            self.assertEqual(reader.tell(), 0)
+            self.assertEqual(reader.read(), 'abcdefgh')
+
+
+class TestQemuImgInfo(test.TestCase):
+    def setUp(self):
+        super(TestQemuImgInfo, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'image')
+        with open(self.path, 'wb') as f:
+            f.write(probe.QCOW2_HEADER.pack('QFI\xfb', 2, 0, 0, 16,
+                                            units.GiB, 0))
+        self.stubs.Set(image_utils, '_IMAGE_INFO_CACHE',
+                       image_utils.collections.OrderedDict())
+
+    def test_probed_once_while_unchanged(self):
+        probed = []
+        real_probe = image_utils.probe.probe
+
+        def fake_probe(path):
+            probed.append(path)
+            return real_probe(path)
+
+        self.stubs.Set(image_utils.probe, 'probe', fake_probe)
+        self.mox.StubOutWithMock(utils, 'execute')
+        self.mox.ReplayAll()
+
+        data = image_utils.qemu_img_info(self.path)
+        self.assertEqual(data.file_format, 'qcow2')
+        self.assertEqual(data.virtual_size, units.GiB)
+        self.assertTrue(image_utils.qemu_img_info(self.path) is data)
+        self.assertEqual(probed, [self.path])
+
+        with open(self.path, 'ab') as f:
+            f.write('\0' * 1024)
+        self.assertFalse(image_utils.qemu_img_info(self.path) is data)
+        self.assertEqual(probed, [self.path, self.path])
+
+    def test_raw_uses_qemu_img(self):
+        with open(self.path, 'wb') as f:
+            f.write('\0' * 1024)
+        self.mox.StubOutWithMock(utils, 'execute')
+        utils.execute('env', 'LC_ALL=C', 'LANG=C', 'qemu-img', 'info',
+                      self.path, run_as_root=True).AndReturn(
+                          ('file format: raw', ''))
+        self.mox.ReplayAll()
+
+        self.assertEqual(image_utils.qemu_img_info(self.path).file_format,
+                         'raw')
+
+    def test_unknown_format_uses_qemu_img(self):
+        self.stubs.Set(image_utils.probe, 'probe', lambda path: None)
+        self.mox.StubOutWithMock(utils, 'execute')
+        utils.execute('env', 'LC_ALL=C', 'LANG=C', 'qemu-img', 'info',
+                      self.path, run_as_root=True).AndReturn(
+                          ('file format: qed', ''))
+        self.mox.ReplayAll()
+
+        self.assertEqual(image_utils.qemu_img_info(self.path).file_format,
+                         'qed')
+
+    def test_qemu_img_forced(self):
+        self.flags(image_probe_use_qemu_img=True)
+        self.mox.StubOutWithMock(image_utils.probe, 'probe')
+        self.mox.StubOutWithMock(utils, 'execute')
+        utils.execute('env', 'LC_ALL=C', 'LANG=C', 'qemu-img', 'info',
+                      self.path, run_as_root=True).AndReturn(
+                          ('file format: raw', ''))
+        self.mox.ReplayAll()
+
+        self.assertEqual(image_utils.qemu_img_info(self.path).file_format,
+                         'raw')
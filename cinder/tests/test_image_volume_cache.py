@@ -0,0 +1,216 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the image volume cache."""
+
+import datetime
+import shutil
+import tempfile
+
+from cinder import context
+from cinder import db
+from cinder import exception
+from cinder.openstack.common import timeutils
+from cinder import test
+from cinder.volume import image_volume_cache
+
+
+class FakeDriver(object):
+    def __init__(self):
+        self.clones = []
+        self.extended = []
+        self.deleted = []
+        self.fail_extend = False
+
+    def create_cloned_volume(self, volume, src_vref):
+        self.clones.append((volume['id'], src_vref['id'], volume['size']))
+        return {'provider_location': 'location-%s' % volume['id']}
+
+    def extend_volume(self, volume, new_size):
+        if self.fail_extend:
+            raise exception.VolumeBackendAPIException(data='fake')
+        self.extended.append((volume['id'], new_size))
+
+    def delete_volume(self, volume):
+        self.deleted.append(volume['id'])
+
+
+class ImageVolumeCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(ImageVolumeCacheTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.flags(lock_path=self.tmpdir)
+        self.driver = FakeDriver()
+        self.cache = image_volume_cache.ImageVolumeCache(db, self.driver,
+                                                         'host1',
+                                                         max_size_gb=10,
+                                                         max_count=2)
+        timeutils.set_time_override(datetime.datetime(2013, 2, 1))
+        self.addCleanup(timeutils.clear_time_override)
+
+    def _image(self, image_id='image1', day=1):
+        return {'id': image_id,
+                'updated_at': datetime.datetime(2013, 1, day)}
+
+    @staticmethod
+    def _volume(volume_id, size):
+        return {'id': volume_id, 'name': 'volume-%s' % volume_id,
+                'size': size}
+
+    def _add(self, image_meta, size=1, volume_id='vol1'):
+        timeutils.advance_time_seconds(1)
+        self.cache.add(self.ctxt, self._volume(volume_id, size), image_meta)
+
+    def _cached(self):
+        return [entry['image_id'] for entry in
+                db.image_volume_cache_get_all_for_host(self.ctxt, 'host1')]
+
+    def test_clone_miss(self):
+        self.assertEqual(self.cache.clone(self.ctxt,
+                                          self._volume('vol1', 1),
+                                          self._image()),
+                         (None, False))
+        self.assertEqual(self.driver.clones, [])
+
+    def test_add_and_clone(self):
+        self._add(self._image())
+        entry, = db.image_volume_cache_get_all_for_host(self.ctxt, 'host1')
+        self.assertEqual(self.driver.clones,
+                         [(entry['volume_id'], 'vol1', 1)])
+        self.assertEqual(entry['provider_location'],
+                         'location-%s' % entry['volume_id'])
+
+        model_update, cached = self.cache.clone(self.ctxt,
+                                                self._volume('vol2', 1),
+                                                self._image())
+        self.assertTrue(cached)
+        self.assertEqual(model_update, {'provider_location': 'location-vol2'})
+        self.assertEqual(self.driver.clones[-1],
+                         ('vol2', entry['volume_id'], 1))
+        self.assertEqual(self.driver.extended, [])
+
+    def test_clone_larger_volume_is_extended(self):
+        self._add(self._image())
+        entry, = db.image_volume_cache_get_all_for_host(self.ctxt, 'host1')
+        volume = self._volume('vol2', 2)
+        model_update, cached = self.cache.clone(self.ctxt, volume,
+                                                self._image())
+        self.assertTrue(cached)
+        self.assertEqual(self.driver.clones[-1],
+                         ('vol2', entry['volume_id'], 1))
+        self.assertEqual(self.driver.extended, [('vol2', 2)])
+        self.assertEqual(volume['size'], 2)
+
+    def test_clone_smaller_volume_misses(self):
+        self._add(self._image(), size=2)
+        self.assertEqual(self.cache.clone(self.ctxt,
+                                          self._volume('vol2', 1),
+                                          self._image()),
+                         (None, False))
+
+    def test_clone_failure_falls_back(self):
+        self._add(self._image())
+        self.driver.fail_extend = True
+        volume = self._volume('vol2', 2)
+        self.assertEqual(self.cache.clone(self.ctxt, volume, self._image()),
+                         (None, False))
+        self.assertEqual(self.driver.deleted, ['vol2'])
+        self.assertEqual(volume['size'], 2)
+        self.assertEqual(self._cached(), ['image1'])
+
+    def test_add_cached_image_is_noop(self):
+        self._add(self._image())
+        self._add(self._image(), volume_id='vol2')
+        self.assertEqual(len(self.driver.clones), 1)
+        self.assertEqual(self._cached(), ['image1'])
+
+    def test_add_larger_volume_keeps_entry(self):
+        self._add(self._image())
+        self._add(self._image(), size=2, volume_id='vol2')
+        self.assertEqual(len(self.driver.clones), 1)
+        entry, = db.image_volume_cache_get_all_for_host(self.ctxt, 'host1')
+        self.assertEqual(entry['size'], 1)
+
+    def test_add_smaller_volume_replaces_entry(self):
+        self._add(self._image(), size=2)
+        old_entry, = db.image_volume_cache_get_all_for_host(self.ctxt,
+                                                            'host1')
+        self._add(self._image(), volume_id='vol2')
+        self.assertEqual(self.driver.deleted, [old_entry['volume_id']])
+        entry, = db.image_volume_cache_get_all_for_host(self.ctxt, 'host1')
+        self.assertEqual(entry['size'], 1)
+
+    def test_add_cached_meanwhile_deletes_clone(self):
+        image_meta = self._image()
+        create_cloned_volume = self.driver.create_cloned_volume
+
+        def fake_create_cloned_volume(volume, src_vref):
+            # Another service sharing the host name caches the image first
+            db.image_volume_cache_create(self.ctxt,
+                                         {'host': 'host1',
+                                          'image_id': 'image1',
+                                          'volume_id': 'other',
+                                          'size': 1})
+            return create_cloned_volume(volume, src_vref)
+
+        self.stubs.Set(self.driver, 'create_cloned_volume',
+                       fake_create_cloned_volume)
+        self._add(image_meta)
+        entry, = db.image_volume_cache_get_all_for_host(self.ctxt, 'host1')
+        self.assertEqual(entry['volume_id'], 'other')
+        self.assertEqual(self.driver.deleted, [self.driver.clones[0][0]])
+
+    def test_evict_twice_deletes_volume_once(self):
+        self._add(self._image())
+        entry, = db.image_volume_cache_get_all_for_host(self.ctxt, 'host1')
+        self.cache._evict(self.ctxt, entry)
+        self.cache._evict(self.ctxt, entry)
+        self.assertEqual(self.driver.deleted, [entry['volume_id']])
+        self._add(self._image(), volume_id='vol2')
+        self.assertEqual(self._cached(), ['image1'])
+
+    def test_updated_image_invalidates(self):
+        self._add(self._image())
+        entry, = db.image_volume_cache_get_all_for_host(self.ctxt, 'host1')
+        self.assertEqual(self.cache.clone(self.ctxt,
+                                          self._volume('vol2', 1),
+                                          self._image(day=2)),
+                         (None, False))
+        self.assertEqual(self.driver.deleted, [entry['volume_id']])
+        self.assertEqual(self._cached(), [])
+
+    def test_evicts_least_recently_used_over_count(self):
+        self._add(self._image('image1'), volume_id='vol1')
+        self._add(self._image('image2'), volume_id='vol2')
+        timeutils.advance_time_seconds(1)
+        self.cache.clone(self.ctxt, self._volume('vol3', 1),
+                         self._image('image1'))
+        self._add(self._image('image3'), volume_id='vol4')
+        self.assertEqual(sorted(self._cached()), ['image1', 'image3'])
+        self.assertEqual(len(self.driver.deleted), 1)
+
+    def test_evicts_over_size(self):
+        self._add(self._image('image1'), size=6, volume_id='vol1')
+        self._add(self._image('image2'), size=6, volume_id='vol2')
+        self.assertEqual(self._cached(), ['image2'])
+
+    def test_too_large_not_cached(self):
+        self._add(self._image(), size=11)
+        self.assertEqual(self._cached(), [])
+        self.assertEqual(self.driver.clones, [])
@@ -0,0 +1,103 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the capability reports of the scheduler dependent managers."""
+
+import mox
+
+from cinder import context
+from cinder import manager
+from cinder.openstack.common import timeutils
+from cinder import test
+
+
+class SchedulerDependentManagerTestCase(test.TestCase):
+    def setUp(self):
+        super(SchedulerDependentManagerTestCase, self).setUp()
+        self.flags(capabilities_full_report_interval=600)
+        self.context = context.get_admin_context()
+        self.manager = manager.SchedulerDependentManager(
+            host='fake_host', service_name='volume')
+        self.updates = []
+
+        def fake_update_service_capabilities(context, service_name, host,
+                                             capabilities,
+                                             capabilities_version=None,
+                                             base_version=None):
+            self.updates.append((capabilities, capabilities_version,
+                                 base_version))
+
+        self.stubs.Set(self.manager.scheduler_rpcapi,
+                       'update_service_capabilities',
+                       fake_update_service_capabilities)
+
+    def _publish(self, capabilities, full_report=False):
+        self.manager.update_service_capabilities(capabilities)
+        self.manager._publish_service_capabilities(self.context,
+                                                   full_report=full_report)
+        return self.updates[-1]
+
+    def test_nothing_to_publish(self):
+        self.manager._publish_service_capabilities(self.context)
+        self.assertEqual(self.updates, [])
+
+    def test_publish_changed_capabilities(self):
+        capabilities = {'free_capacity_gb': 10, 'total_capacity_gb': 20}
+        self.assertEqual(self._publish(capabilities),
+                         (capabilities, 1, None))
+
+        capabilities = {'free_capacity_gb': 5, 'total_capacity_gb': 20}
+        self.assertEqual(self._publish(capabilities),
+                         ({'free_capacity_gb': 5}, 2, 1))
+
+        # Changes are relative to the last full report
+        capabilities = {'free_capacity_gb': 10, 'total_capacity_gb': 20}
+        self.assertEqual(self._publish(capabilities), ({}, 3, 1))
+
+        capabilities = {'free_capacity_gb': 10, 'total_capacity_gb': 20,
+                        'QoS_support': True}
+        self.assertEqual(self._publish(capabilities),
+                         ({'QoS_support': True}, 4, 1))
+
+    def test_publish_full_report(self):
+        capabilities = {'free_capacity_gb': 10, 'total_capacity_gb': 20}
+        self._publish(capabilities)
+        self.assertEqual(self._publish(capabilities, full_report=True),
+                         (capabilities, 2, None))
+
+    def test_publish_full_report_when_capability_removed(self):
+        self._publish({'free_capacity_gb': 10, 'QoS_support': True})
+        self.assertEqual(self._publish({'free_capacity_gb': 10}),
+                         ({'free_capacity_gb': 10}, 2, None))
+
+    def test_publish_full_report_when_due(self):
+        capabilities = {'free_capacity_gb': 10}
+        self._publish(capabilities)
+        self.mox.StubOutWithMock(timeutils, 'is_older_than')
+        timeutils.is_older_than(mox.IgnoreArg(), 600).AndReturn(True)
+        self.mox.ReplayAll()
+        self.assertEqual(self._publish(capabilities),
+                         (capabilities, 2, None))
+
+    def test_publish_only_full_reports(self):
+        # Older schedulers do not understand changed capabilities
+        self.flags(capabilities_full_report_interval=0)
+        capabilities = {'free_capacity_gb': 10}
+        self.assertEqual(self._publish(capabilities),
+                         (capabilities, None, None))
+        self.assertEqual(self._publish(capabilities),
+                         (capabilities, None, None))
@@ -816,3 +816,175 @@ class TestMigrations(test.TestCase):
 
             self.assertTrue(engine.dialect.has_table(engine.connect(),
                                                      "migrations"))
+
+    def test_migration_016(self):
+        """Test that adding parent_id column to backups works correctly."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.INIT_VERSION)
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 15)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 16)
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertTrue(isinstance(backups.c.parent_id.type,
+                                       sqlalchemy.types.VARCHAR))
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 15)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertTrue('parent_id' not in backups.c)
+
+    def test_migration_017(self):
+        """Test that adding compression column to backups works correctly."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.INIT_VERSION)
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 16)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 17)
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertTrue(isinstance(backups.c.compression.type,
+                                       sqlalchemy.types.VARCHAR))
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 16)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertTrue('compression' not in backups.c)
+
+    def test_migration_018(self):
+        """Test adding backup_chunks table works correctly."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.INIT_VERSION)
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 17)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 18)
+
+            self.assertTrue(engine.dialect.has_table(engine.connect(),
+                                                     "backup_chunks"))
+            backup_chunks = sqlalchemy.Table('backup_chunks',
+                                             metadata,
+                                             autoload=True)
+            self.assertTrue(isinstance(backup_chunks.c.sha256.type,
+                                       sqlalchemy.types.VARCHAR))
+            self.assertTrue(isinstance(backup_chunks.c.refcount.type,
+                                       sqlalchemy.types.INTEGER))
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 17)
+
+            self.assertFalse(engine.dialect.has_table(engine.connect(),
+                                                      "backup_chunks"))
+
+    def test_migration_019(self):
+        """Test that adding progress column to backups works correctly."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.INIT_VERSION)
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 18)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 19)
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertTrue(isinstance(backups.c.progress.type,
+                                       sqlalchemy.types.TEXT))
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 18)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            backups = sqlalchemy.Table('backups',
+                                       metadata,
+                                       autoload=True)
+            self.assertTrue('progress' not in backups.c)
+
+    def test_migration_020(self):
+        """Test adding image_volume_cache_entries table works correctly."""
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.INIT_VERSION)
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 19)
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 20)
+
+            self.assertTrue(engine.dialect.has_table(
+                engine.connect(), "image_volume_cache_entries"))
+            entries = sqlalchemy.Table('image_volume_cache_entries',
+                                       metadata,
+                                       autoload=True)
+            self.assertTrue(isinstance(entries.c.image_id.type,
+                                       sqlalchemy.types.VARCHAR))
+            self.assertTrue(isinstance(entries.c.size.type,
+                                       sqlalchemy.types.INTEGER))
+            self.assertTrue(isinstance(entries.c.last_used.type,
+                                       sqlalchemy.types.DATETIME))
+            # An image is cached in one volume per host
+            entries.insert().execute(host='host1', image_id='image1',
+                                     volume_id='vol1')
+            self.assertRaises(sqlalchemy.exc.IntegrityError,
+                              entries.insert().execute,
+                              host='host1', image_id='image1',
+                              volume_id='vol2')
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 19)
+
+            self.assertFalse(engine.dialect.has_table(
+                engine.connect(), "image_volume_cache_entries"))
+
+    def test_migration_021(self):
+        """Test adding the volume query indexes works correctly."""
+        def index_names(table_name):
+            metadata = sqlalchemy.schema.MetaData()
+            metadata.bind = engine
+            table = sqlalchemy.Table(table_name, metadata, autoload=True)
+            return set(index.name for index in table.indexes)
+
+        for (key, engine) in self.engines.items():
+            migration_api.version_control(engine,
+                                          TestMigrations.REPOSITORY,
+                                          migration.INIT_VERSION)
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 20)
+
+            migration_api.upgrade(engine, TestMigrations.REPOSITORY, 21)
+            self.assertTrue(set(['volumes_host_deleted_idx',
+                                 'volumes_project_id_deleted_idx',
+                                 'volumes_instance_uuid_deleted_idx']) <=
+                            index_names('volumes'))
+            self.assertTrue('snapshots_project_id_deleted_idx' in
+                            index_names('snapshots'))
+            self.assertTrue(set(['backups_host_deleted_idx',
+                                 'backups_project_id_deleted_idx']) <=
+                            index_names('backups'))
+
+            migration_api.downgrade(engine, TestMigrations.REPOSITORY, 20)
+            self.assertFalse('volumes_host_deleted_idx' in
+                             index_names('volumes'))
+            self.assertFalse('backups_host_deleted_idx' in
+                             index_names('backups'))
@@ -455,6 +455,24 @@ class GenericUtilsTestCase(test.TestCase):
         h2 = hashlib.sha1(data).hexdigest()
         self.assertEquals(h1, h2)
 
+    def test_punch_hole(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write('a' * 16384)
+            f.flush()
+            if not utils.punch_hole(f.fileno(), 4096, 8192):
+                self.skipTest('filesystem does not support punching holes')
+            with open(f.name) as reader:
+                data = reader.read()
+            self.assertEquals(len(data), 16384)
+            self.assertEquals(data[4096:12288], '\0' * 8192)
+            self.assertEquals(data[:4096] + data[12288:], 'a' * 8192)
+
+    def test_punch_hole_past_end_of_file(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write('a' * 4096)
+            f.flush()
+            self.assertFalse(utils.punch_hole(f.fileno(), 4096, 8192))
+
 
 class MonkeyPatchTestCase(test.TestCase):
     """Unit test for utils.monkey_patch()."""
@@ -48,6 +48,7 @@ from cinder.tests.image import fake as fake_image
 from cinder.volume import configuration as conf
 from cinder.volume import driver
 from cinder.volume.drivers import lvm
+from cinder.volume import manager as volume_manager
 from cinder.volume import rpcapi as volume_rpcapi
 from cinder.volume import utils as volutils
 
@@ -300,6 +301,74 @@ class VolumeTestCase(test.TestCase):
                                    volume_type=db_vol_type)
         self.assertEquals(volume['volume_type_id'], db_vol_type.get('id'))
 
+    def test_create_multiple_volumes(self):
+        """Test volumes created together are scheduled in one request."""
+        reservations = []
+
+        def fake_reserve(context, expire=None, project_id=None, **deltas):
+            if deltas['volumes'] > 0 and len(reservations) == 2:
+                raise exception.VolumeLimitExceeded(allowed=2)
+            reservations.append(deltas)
+            return ["RESERVATION"]
+
+        def fake_commit(context, reservations, project_id=None):
+            pass
+
+        scheduled = []
+
+        def fake_create_volumes(context, topic, request_specs,
+                                filter_properties_list):
+            scheduled.append([spec['volume_id'] for spec in request_specs])
+
+        self.stubs.Set(QUOTAS, "reserve", fake_reserve)
+        self.stubs.Set(QUOTAS, "commit", fake_commit)
+
+        volume_api = cinder.volume.api.API()
+        self.stubs.Set(volume_api.scheduler_rpcapi, "create_volumes",
+                       fake_create_volumes)
+
+        volumes = volume_api.create_multiple(self.context, 2, 1, 'name',
+                                             'description')
+        self.assertEqual(len(volumes), 2)
+        self.assertEqual(scheduled, [[volume['id'] for volume in volumes]])
+
+        # The volumes created before a failure are deleted, not scheduled
+        reservations.pop()
+        del scheduled[:]
+        self.assertRaises(exception.VolumeLimitExceeded,
+                          volume_api.create_multiple,
+                          self.context, 2, 1, 'name', 'description')
+        self.assertEqual(scheduled, [])
+        self.assertEqual(reservations[-1]['volumes'], -1)
+        self.assertEqual(len(db.volume_get_all(self.context, None, None,
+                                               'created_at', 'desc')), 2)
+
+    def test_delete_volume_refreshes_capabilities_later(self):
+        """Test deletes share one stats refresh, run after the request."""
+        refreshes = []
+        self.stubs.Set(volume_manager.greenthread, 'spawn_n',
+                       lambda func, *args: refreshes.append((func, args)))
+        self.mox.StubOutWithMock(self.volume.driver, 'get_volume_stats')
+        self.volume.driver.get_volume_stats(refresh=True).AndReturn(
+            {'free_capacity_gb': 10})
+        self.mox.ReplayAll()
+
+        for i in range(2):
+            volume = self._create_volume()
+            self.volume.create_volume(self.context, volume['id'])
+            self.volume.delete_volume(self.context, volume['id'])
+        self.assertEqual(len(refreshes), 1)
+
+        func, args = refreshes.pop()
+        func(*args)
+        self.assertEqual(self.volume.last_capabilities,
+                         {'free_capacity_gb': 10})
+
+        volume = self._create_volume()
+        self.volume.create_volume(self.context, volume['id'])
+        self.volume.delete_volume(self.context, volume['id'])
+        self.assertEqual(len(refreshes), 1)
+
     def test_delete_busy_volume(self):
         """Test volume survives deletion if driver reports it as busy."""
         volume = self._create_volume()
@@ -835,6 +904,41 @@ class VolumeTestCase(test.TestCase):
         self.assertEqual(volume['status'], 'available')
         self.volume.delete_volume(self.context, volume['id'])
 
+    def test_create_volume_from_image_volume_cache(self):
+        """Verify that a volume is cloned from the image volume cache
+        without copying the image when the image is cached.
+        """
+        class FakeCache(object):
+            def clone(self, context, volume_ref, image_meta):
+                return {'provider_location': 'cached'}, True
+
+            def add(self, context, volume_ref, image_meta):
+                raise AssertionError('cached image added again')
+
+        def fake_copy_image_to_volume(context, volume,
+                                      image_service, image_id):
+            raise AssertionError('image copied despite cache hit')
+
+        self.volume.image_volume_cache = FakeCache()
+        self.stubs.Set(self.volume, '_copy_image_to_volume',
+                       fake_copy_image_to_volume)
+
+        volume = self._create_volume_from_image()
+        self.assertEqual(volume['status'], 'available')
+        self.assertEqual(volume['provider_location'], 'cached')
+        self.assertTrue(volume['bootable'])
+        self.volume.delete_volume(self.context, volume['id'])
+
+    def test_image_volume_cache_requires_limit(self):
+        """Verify the image volume cache is only enabled with a limit."""
+        self.flags(image_volume_cache_enabled=True)
+        volume = importutils.import_object(CONF.volume_manager)
+        self.assertEqual(volume.image_volume_cache, None)
+
+        self.flags(image_volume_cache_max_count=10)
+        volume = importutils.import_object(CONF.volume_manager)
+        self.assertEqual(volume.image_volume_cache.max_count, 10)
+
     def test_create_volume_from_image_exception(self):
         """Verify that create volume from image, the volume status is
         'downloading'.
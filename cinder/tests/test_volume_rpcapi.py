@@ -189,6 +189,12 @@ class VolumeRpcAPITestCase(test.TestCase):
                               connector='fake_connector',
                               force=False)
 
+    def test_publish_service_capabilities_to_host(self):
+        self._test_volume_api('publish_service_capabilities',
+                              rpc_method='cast',
+                              host='fake_host',
+                              version='1.2')
+
     def test_accept_transfer(self):
         self._test_volume_api('accept_transfer',
                               rpc_method='cast',
@@ -18,6 +18,10 @@
 """Tests For miscellaneous util methods used with volume."""
 
 
+import os
+import shutil
+import tempfile
+
 from oslo.config import cfg
 
 from cinder import context
@@ -27,6 +31,8 @@ from cinder.openstack.common import log as logging
 from cinder.openstack.common.notifier import api as notifier_api
 from cinder.openstack.common.notifier import test_notifier
 from cinder import test
+from cinder import units
+from cinder import utils
 from cinder.volume import utils as volume_utils
 
 
@@ -156,3 +162,81 @@ class LVMVolumeDriverTestCase(test.TestCase):
         bs, count = volume_utils._calculate_count(1024)
         self.assertEquals(bs, '1M')
         self.assertEquals(count, 1024)
+
+
+class CopyVolumeTestCase(test.TestCase):
+    def setUp(self):
+        super(CopyVolumeTestCase, self).setUp()
+        self.flags(volume_dd_blocksize='64K')
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.src = os.path.join(self.tmpdir, 'src')
+        self.dest = os.path.join(self.tmpdir, 'dest')
+        self.data = ('\0' * 256 * units.KiB + 'a' * 300 * units.KiB +
+                     '\0' * 468 * units.KiB)
+        with open(self.src, 'wb') as f:
+            f.write(self.data)
+        with open(self.dest, 'wb') as f:
+            f.write('x' * units.MiB)
+        self.commands = []
+
+    def _fake_execute(self, *cmd, **kwargs):
+        self.commands.append(cmd)
+        return '', ''
+
+    def _read_dest(self):
+        with open(self.dest, 'rb') as f:
+            return f.read()
+
+    def test_copy_volume_native(self):
+        volume_utils.copy_volume(self.src, self.dest, 1,
+                                 execute=self._fake_execute)
+        self.assertEqual(self._read_dest(), self.data)
+        self.assertEqual(self.commands, [])
+
+    def test_copy_volume_native_skips_zeros(self):
+        punched = []
+
+        def fake_punch_hole(fileno, offset, length):
+            punched.append((offset, length))
+            return True
+
+        self.stubs.Set(utils, 'punch_hole', fake_punch_hole)
+        copy = volume_utils._VolumeCopy(self.src, self.dest, units.MiB)
+        self.assertEqual(copy.run(), 704 * units.KiB)
+        # The first 4 and the last 7 chunks are all zeros.
+        self.assertEqual(len(punched), 11)
+        self.assertEqual(punched[0], (0, 64 * units.KiB))
+        self.assertEqual(self._read_dest()[256 * units.KiB:576 * units.KiB],
+                         self.data[256 * units.KiB:576 * units.KiB])
+
+    def test_copy_volume_native_writes_zeros(self):
+        self.stubs.Set(utils, 'punch_hole', lambda *args: False)
+        volume_utils.copy_volume('/dev/zero', self.dest, 1, sync=True,
+                                 execute=self._fake_execute)
+        self.assertEqual(self._read_dest(), '\0' * units.MiB)
+        self.assertEqual(self.commands, [])
+
+    def test_copy_volume_native_throttled(self):
+        self.flags(volume_copy_bps_limit=units.MiB)
+        delays = []
+        self.stubs.Set(volume_utils.eventlet, 'sleep', delays.append)
+        volume_utils.copy_volume(self.src, self.dest, 1,
+                                 execute=self._fake_execute)
+        self.assertTrue(delays)
+        self.assertEqual(self._read_dest(), self.data)
+
+    def test_copy_volume_falls_back_to_dd(self):
+        missing = os.path.join(self.tmpdir, 'missing')
+        volume_utils.copy_volume(self.src, missing, 1,
+                                 execute=self._fake_execute)
+        self.assertEqual(len(self.commands), 2)
+        self.assertEqual(self.commands[1][:3],
+                         ('dd', 'if=%s' % self.src, 'of=%s' % missing))
+
+    def test_copy_volume_dd_engine(self):
+        self.flags(volume_copy_engine='dd')
+        volume_utils.copy_volume(self.src, self.dest, 1,
+                                 execute=self._fake_execute)
+        self.assertEqual(len(self.commands), 2)
+        self.assertEqual(self._read_dest(), 'x' * units.MiB)
@@ -21,6 +21,8 @@
 
 
 import contextlib
+import ctypes
+import ctypes.util
 import datetime
 import functools
 import hashlib
@@ -31,6 +33,7 @@ import pyclbr
 import random
 import re
 import shutil
+import stat
 import sys
 import tempfile
 import time
@@ -866,6 +869,48 @@ def hash_file(file_like_object):
     return checksum.hexdigest()
 
 
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                use_errno=True)
+        except OSError:
+            _libc = False
+    return _libc
+
+
+def punch_hole(fileno, offset, length):
+    """Deallocate a range of an open file or block device.
+
+    The range reads back as zeros afterwards.  Returns False when the
+    platform or the target does not support punching holes, or when the
+    range extends past the end of a regular file, which punching would
+    not grow.
+    """
+    libc = _get_libc()
+    fallocate = libc and getattr(libc, 'fallocate64', None)
+    if not fallocate:
+        return False
+    st = os.fstat(fileno)
+    if stat.S_ISREG(st.st_mode) and offset + length > st.st_size:
+        return False
+    ret = fallocate(fileno, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE,
+                    ctypes.c_longlong(offset), ctypes.c_longlong(length))
+    if ret != 0:
+        LOG.debug(_('Could not punch hole of %(length)d bytes at offset '
+                    '%(offset)d: %(error)s') %
+                  {'length': length, 'offset': offset,
+                   'error': os.strerror(ctypes.get_errno())})
+        return False
+    return True
+
+
 @contextlib.contextmanager
 def temporary_mutation(obj, **kwargs):
     """Temporarily set the attr on a particular object to a given value then
@@ -99,7 +99,88 @@ class API(base.Base):
                image_id=None, volume_type=None, metadata=None,
                availability_zone=None, source_volume=None,
                scheduler_hints=None):
+        volume, request_spec, filter_properties = self._prepare_create(
+            context, size, name, description, snapshot=snapshot,
+            image_id=image_id, volume_type=volume_type, metadata=metadata,
+            availability_zone=availability_zone, source_volume=source_volume,
+            scheduler_hints=scheduler_hints)
 
+        self._cast_create_volume(context, request_spec, filter_properties)
+
+        return volume
+
+    def create_multiple(self, context, count, size, name, description,
+                        snapshot=None, image_id=None, volume_type=None,
+                        metadata=None, availability_zone=None,
+                        source_volume=None, scheduler_hints=None):
+        """Create count identical volumes, scheduled in a single request.
+
+        Volumes that must be created on the host of their snapshot or
+        source volume bypass the scheduler as they do in create(). If
+        creating one of the volumes fails, those already created are
+        deleted and their quota released before the error is raised, so
+        either all the volumes are created or none.
+        """
+        volumes = []
+        requests = []
+        try:
+            for i in xrange(count):
+                volume, request_spec, filter_properties = (
+                    self._prepare_create(
+                        context, size, name, description, snapshot=snapshot,
+                        image_id=image_id, volume_type=volume_type,
+                        metadata=metadata,
+                        availability_zone=availability_zone,
+                        source_volume=source_volume,
+                        scheduler_hints=scheduler_hints))
+                volumes.append(volume)
+                requests.append((request_spec, filter_properties))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for volume in volumes:
+                    self._rollback_create(context, volume)
+
+        request_specs = []
+        filter_properties_list = []
+        for request_spec, filter_properties in requests:
+            if ((request_spec['snapshot_id'] and CONF.snapshot_same_host) or
+                    request_spec['source_volid']):
+                self._cast_create_volume(context, request_spec,
+                                         filter_properties)
+            else:
+                request_specs.append(request_spec)
+                filter_properties_list.append(filter_properties)
+        if request_specs:
+            self.scheduler_rpcapi.create_volumes(context,
+                                                 CONF.volume_topic,
+                                                 request_specs,
+                                                 filter_properties_list)
+
+        return volumes
+
+    def _rollback_create(self, context, volume):
+        """Delete the record of a volume never scheduled, with its quota."""
+        try:
+            reserve_opts = {'volumes': -1, 'gigabytes': -volume['size']}
+            QUOTAS.add_volume_type_opts(context, reserve_opts,
+                                        volume['volume_type_id'])
+            reservations = QUOTAS.reserve(context, **reserve_opts)
+        except Exception:
+            reservations = None
+            LOG.exception(_("Failed to update quota for deleting volume"))
+        self.db.volume_destroy(context.elevated(), volume['id'])
+        if reservations:
+            QUOTAS.commit(context, reservations)
+
+    def _prepare_create(self, context, size, name, description, snapshot=None,
+                        image_id=None, volume_type=None, metadata=None,
+                        availability_zone=None, source_volume=None,
+                        scheduler_hints=None):
+        """Check a volume request and create its database record.
+
+        Returns the volume with the request_spec and filter_properties
+        to schedule it with.
+        """
         exclusive_options = (snapshot, image_id, source_volume)
         exclusive_options_set = sum(1 for option in
                                     exclusive_options if option is not None)
@@ -262,9 +343,7 @@ class API(base.Base):
         else:
             filter_properties = {}
 
-        self._cast_create_volume(context, request_spec, filter_properties)
-
-        return volume
+        return volume, request_spec, filter_properties
 
     def _cast_create_volume(self, context, request_spec, filter_properties):
 
@@ -422,7 +501,7 @@ class API(base.Base):
         return volume
 
     def get_all(self, context, marker=None, limit=None, sort_key='created_at',
-                sort_dir='desc', filters={}):
+                sort_dir='desc', filters=None, offset=None):
         check_policy(context, 'get_all')
 
         try:
@@ -435,16 +514,18 @@ class API(base.Base):
             msg = _('limit param must be an integer')
             raise exception.InvalidInput(reason=msg)
 
-        if (context.is_admin and 'all_tenants' in filters):
-            # Need to remove all_tenants to pass the filtering below.
-            del filters['all_tenants']
-            volumes = self.db.volume_get_all(context, marker, limit, sort_key,
-                                             sort_dir)
-        else:
-            volumes = self.db.volume_get_all_by_project(context,
-                                                        context.project_id,
-                                                        marker, limit,
-                                                        sort_key, sort_dir)
+        try:
+            if offset is not None:
+                offset = int(offset)
+                if offset < 0:
+                    msg = _('offset param must be positive')
+                    raise exception.InvalidInput(reason=msg)
+        except ValueError:
+            msg = _('offset param must be an integer')
+            raise exception.InvalidInput(reason=msg)
+
+        # Copy the filters, so we don't modify the caller's dict
+        filters = dict(filters or {})
 
         # Non-admin shouldn't see temporary target of a volume migration
         if not context.is_admin:
@@ -453,41 +534,20 @@ class API(base.Base):
         if filters:
             LOG.debug(_("Searching by: %s") % str(filters))
 
-            def _check_metadata_match(volume, searchdict):
-                volume_metadata = {}
-                for i in volume.get('volume_metadata'):
-                    volume_metadata[i['key']] = i['value']
-
-                for k, v in searchdict.iteritems():
-                    if (k not in volume_metadata.keys() or
-                            volume_metadata[k] != v):
-                        return False
-                return True
-
-            def _check_migration_target(volume, searchdict):
-                if not volume['status'].startswith('migration_target'):
-                    return True
-                return False
-
-            # search_option to filter_name mapping.
-            filter_mapping = {'metadata': _check_metadata_match,
-                              'no_migration_targets': _check_migration_target}
-
-            result = []
-            not_found = object()
-            for volume in volumes:
-                # go over all filters in the list
-                for opt, values in filters.iteritems():
-                    try:
-                        filter_func = filter_mapping[opt]
-                    except KeyError:
-                        def filter_func(volume, value):
-                            return volume.get(opt, not_found) == value
-                    if not filter_func(volume, values):
-                        break  # volume doesn't match this filter
-                else:  # did not break out loop
-                    result.append(volume)  # volume matches all filters
-            volumes = result
+        # The filters are applied by the database before the marker, offset
+        # and limit, so a page is only made of matching volumes
+        if (context.is_admin and 'all_tenants' in filters):
+            del filters['all_tenants']
+            volumes = self.db.volume_get_all(context, marker, limit, sort_key,
+                                             sort_dir, filters=filters,
+                                             offset=offset)
+        else:
+            volumes = self.db.volume_get_all_by_project(context,
+                                                        context.project_id,
+                                                        marker, limit,
+                                                        sort_key, sort_dir,
+                                                        filters=filters,
+                                                        offset=offset)
 
         return volumes
 
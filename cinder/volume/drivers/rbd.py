@@ -136,7 +136,16 @@ class RBDImageIOWrapper(io.RawIOBase):
         self._inc_offset(length)
         return self._rbd_meta.image.read(int(offset), int(length))
 
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
     def write(self, data):
+        # NOTE: librbd only accepts strings, so buffers filled with readinto()
+        # have to be copied out here.
+        if isinstance(data, buffer):
+            data = str(data)
         self._rbd_meta.image.write(data, self._offset)
         self._inc_offset(len(data))
 
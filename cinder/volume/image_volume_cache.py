@@ -0,0 +1,287 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cache of volumes holding images on a backend.
+
+On backends where cloning a volume is cheap, creating volumes from an image
+by cloning a volume already holding it is much faster than downloading and
+writing the image again. After a volume has been created from an image,
+the cache keeps a clone of it on the backend. Later volumes created from
+that image are cloned from the cached volume and extended when they are
+larger. When cloning the cached volume fails, the volume is created by
+downloading the image as usual.
+
+Cached volumes are only known to the backend and to the cache entries, they
+have no volume records and are not counted against any quota. Entries are
+invalidated when the image is updated in Glance, and least recently used
+entries are evicted to stay within the configured limits. As the backend
+capacity they use is otherwise unaccounted for, the cache is only enabled
+with a size or count limit.
+
+The cache is seeded on a miss by cloning the new volume before it becomes
+available, while it still only holds the image. This runs synchronously on
+the create path: on backends where a clone is a full copy, such as thick
+LVM, the create that misses the cache takes about twice as long. The cache
+is meant for backends with cheap clones.
+"""
+
+
+from oslo.config import cfg
+
+from cinder import exception
+from cinder.openstack.common import log as logging
+from cinder.openstack.common import timeutils
+from cinder.openstack.common import uuidutils
+from cinder import utils
+
+
+LOG = logging.getLogger(__name__)
+
+image_volume_cache_opts = [
+    cfg.BoolOpt('image_volume_cache_enabled',
+                default=False,
+                help='Keep volumes holding images on the backend to clone '
+                     'new volumes created from these images. Requires '
+                     'image_volume_cache_max_size_gb or '
+                     'image_volume_cache_max_count to be set'),
+    cfg.IntOpt('image_volume_cache_max_size_gb',
+               default=0,
+               help='Maximum total size in GB of the volumes kept by the '
+                    'image volume cache of a backend, 0 means unlimited'),
+    cfg.IntOpt('image_volume_cache_max_count',
+               default=0,
+               help='Maximum number of volumes kept by the image volume '
+                    'cache of a backend, 0 means unlimited'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(image_volume_cache_opts)
+
+
+class ImageVolumeCache(object):
+    """Volumes caching images on the backend of a volume manager."""
+
+    def __init__(self, db, driver, host, max_size_gb=0, max_count=0):
+        self.db = db
+        self.driver = driver
+        self.host = host
+        self.max_size_gb = max_size_gb
+        self.max_count = max_count
+
+    @staticmethod
+    def _cache_volume(entry):
+        """Return the volume the driver knows a cache entry by."""
+        return {'id': entry['volume_id'],
+                'name': CONF.volume_name_template % entry['volume_id'],
+                'size': entry['size'],
+                'provider_location': entry['provider_location'],
+                'host': entry['host'],
+                'volume_type_id': None,
+                'display_name': 'image-%s' % entry['image_id'],
+                'bootable': True}
+
+    @staticmethod
+    def _image_updated_at(image_meta):
+        updated_at = image_meta.get('updated_at')
+        if updated_at:
+            updated_at = timeutils.normalize_time(updated_at)
+        return updated_at
+
+    def _is_current(self, entry, image_meta):
+        return entry['image_updated_at'] == self._image_updated_at(image_meta)
+
+    def _lock(self, image_id):
+        """Serialize the cache operations on an image across processes.
+
+        The cached volume of an image is only cloned, created or evicted
+        with its lock held, so it cannot be deleted while it is cloned and
+        concurrent misses do not each cache their own volume.
+        """
+        return utils.synchronized('image-volume-cache-%s-%s' %
+                                  (self.host, image_id), external=True)
+
+    @staticmethod
+    def _resized_volume(volume_ref, size):
+        """Return a copy of the volume, as the driver sees it, at size GB."""
+        volume = dict(volume_ref.iteritems())
+        volume['name'] = volume_ref['name']
+        volume['size'] = size
+        return volume
+
+    def clone(self, context, volume_ref, image_meta):
+        """Create a volume by cloning the cached copy of an image.
+
+        Returns the model update of the driver and whether the volume was
+        created from the cache.
+        """
+        @self._lock(image_meta['id'])
+        def _clone_cached():
+            entry = self.db.image_volume_cache_get_and_update_last_used(
+                context, image_meta['id'], self.host)
+            if entry and not self._is_current(entry, image_meta):
+                LOG.info(_('Image %s changed since it was cached') %
+                         image_meta['id'])
+                self._evict(context, entry)
+                entry = None
+
+            if not entry or entry['size'] > volume_ref['size']:
+                return None, None
+
+            LOG.info(_('Creating volume %(volume_id)s from cached image '
+                       '%(image_id)s') % {'volume_id': volume_ref['id'],
+                                          'image_id': image_meta['id']})
+            # The clone is made at the size of the cached volume, then
+            # extended to the size requested
+            model_update = self.driver.create_cloned_volume(
+                self._resized_volume(volume_ref, entry['size']),
+                self._cache_volume(entry))
+            return model_update, entry['size']
+
+        cloned = False
+        try:
+            model_update, size = _clone_cached()
+            if size is None:
+                return None, False
+            cloned = True
+            if volume_ref['size'] > size:
+                self.driver.extend_volume(volume_ref, volume_ref['size'])
+        except Exception:
+            LOG.exception(_('Failed to create volume %(volume_id)s from '
+                            'cached image %(image_id)s') %
+                          {'volume_id': volume_ref['id'],
+                           'image_id': image_meta['id']})
+            if cloned:
+                self._delete_failed_clone(volume_ref)
+            return None, False
+        return model_update, True
+
+    def _delete_failed_clone(self, volume_ref):
+        try:
+            self.driver.delete_volume(volume_ref)
+        except Exception:
+            LOG.exception(_('Failed to delete volume %s') % volume_ref['id'])
+
+    def add(self, context, volume_ref, image_meta):
+        """Cache a clone of a volume just created from an image.
+
+        Failures are logged, not raised, as the volume itself is fine.
+        """
+        if not self._evict_unusable(context, volume_ref, image_meta):
+            return
+
+        # Entries of other images are evicted with their own lock, only one
+        # lock is held at a time
+        if not self._make_room(context, volume_ref['size']):
+            LOG.debug(_('No room to cache image %s') % image_meta['id'])
+            return
+
+        @self._lock(image_meta['id'])
+        def _add():
+            # Another request may have cached the image meanwhile
+            if self.db.image_volume_cache_get_and_update_last_used(
+                    context, image_meta['id'], self.host):
+                return
+            self._create_entry(context, volume_ref, image_meta)
+
+        _add()
+
+    def _evict_unusable(self, context, volume_ref, image_meta):
+        """Evict the entry of the image if volume_ref should replace it.
+
+        Returns whether volume_ref should be cached.
+        """
+        @self._lock(image_meta['id'])
+        def _evict_entry():
+            entry = self.db.image_volume_cache_get_and_update_last_used(
+                context, image_meta['id'], self.host)
+            if entry:
+                if (self._is_current(entry, image_meta) and
+                        entry['size'] <= volume_ref['size']):
+                    return False
+                # Stale, or cached at a larger size than needed: one volume
+                # is kept per image, at the smallest size it was created
+                # with
+                self._evict(context, entry)
+            return True
+
+        return _evict_entry()
+
+    def _create_entry(self, context, volume_ref, image_meta):
+        values = {'host': self.host,
+                  'image_id': image_meta['id'],
+                  'image_updated_at': self._image_updated_at(image_meta),
+                  'volume_id': uuidutils.generate_uuid(),
+                  'size': volume_ref['size'],
+                  'provider_location': None}
+        cache_volume = self._cache_volume(values)
+        try:
+            model_update = self.driver.create_cloned_volume(cache_volume,
+                                                            volume_ref)
+        except Exception:
+            LOG.exception(_('Failed to cache image %s') % image_meta['id'])
+            return
+
+        if model_update and 'provider_location' in model_update:
+            values['provider_location'] = model_update['provider_location']
+            cache_volume['provider_location'] = values['provider_location']
+        try:
+            self.db.image_volume_cache_create(context, values)
+        except exception.ImageVolumeCacheEntryExists:
+            # Cached by another service sharing the host name
+            LOG.debug(_('Image %s was cached meanwhile') % image_meta['id'])
+            self._delete_cache_volume(cache_volume)
+            return
+        LOG.info(_('Cached image %(image_id)s in volume %(volume_id)s') %
+                 {'image_id': image_meta['id'],
+                  'volume_id': values['volume_id']})
+
+    def _make_room(self, context, size):
+        """Evict least recently used entries to make room for size GB."""
+        if self.max_size_gb and size > self.max_size_gb:
+            return False
+
+        entries = self.db.image_volume_cache_get_all_for_host(context,
+                                                              self.host)
+        total = sum(entry['size'] for entry in entries)
+        count = len(entries)
+        for entry in entries:
+            if ((not self.max_count or count < self.max_count) and
+                    (not self.max_size_gb or
+                     total + size <= self.max_size_gb)):
+                break
+            self._lock(entry['image_id'])(self._evict)(context, entry)
+            total -= entry['size']
+            count -= 1
+        return True
+
+    def _evict(self, context, entry):
+        """Delete a cache entry and its volume, with the image lock held."""
+        LOG.info(_('Evicting image %(image_id)s cached in volume '
+                   '%(volume_id)s') % {'image_id': entry['image_id'],
+                                       'volume_id': entry['volume_id']})
+        if not self.db.image_volume_cache_delete(context, entry['id']):
+            # Already evicted by another request
+            return
+        self._delete_cache_volume(self._cache_volume(entry))
+
+    def _delete_cache_volume(self, cache_volume):
+        try:
+            self.driver.delete_volume(cache_volume)
+        except Exception:
+            LOG.exception(_('Failed to delete cached image volume %s') %
+                          cache_volume['id'])
@@ -42,6 +42,7 @@ import sys
 import time
 import traceback
 
+from eventlet import greenthread
 from oslo.config import cfg
 
 from cinder.brick.initiator import connector as initiator
@@ -58,6 +59,7 @@ from cinder.openstack.common import uuidutils
 from cinder import quota
 from cinder import utils
 from cinder.volume.configuration import Configuration
+from cinder.volume import image_volume_cache
 from cinder.volume import rpcapi as volume_rpcapi
 from cinder.volume import utils as volume_utils
 
@@ -135,6 +137,23 @@ class VolumeManager(manager.SchedulerDependentManager):
         # NOTE(vish): Implementation specific db handling is done
         #             by the driver.
         self.driver.db = self.db
+        self.configuration.append_config_values(
+            image_volume_cache.image_volume_cache_opts)
+        self.image_volume_cache = None
+        if self.configuration.image_volume_cache_enabled:
+            max_size_gb = self.configuration.image_volume_cache_max_size_gb
+            max_count = self.configuration.image_volume_cache_max_count
+            if max_size_gb or max_count:
+                self.image_volume_cache = \
+                    image_volume_cache.ImageVolumeCache(
+                        self.db, self.driver, self.host,
+                        max_size_gb=max_size_gb, max_count=max_count)
+            else:
+                # Cached volumes use backend capacity no quota accounts for
+                LOG.error(_('The image volume cache is disabled, it requires '
+                            'image_volume_cache_max_size_gb or '
+                            'image_volume_cache_max_count to be set.'))
+        self._capabilities_refresh_pending = False
 
     def init_host(self):
         """Do any initialization that needs to be run if this is a
@@ -168,7 +187,8 @@ class VolumeManager(manager.SchedulerDependentManager):
         self.publish_service_capabilities(ctxt)
 
     def _create_volume(self, context, volume_ref, snapshot_ref,
-                       srcvol_ref, image_service, image_id, image_location):
+                       srcvol_ref, image_service, image_id, image_location,
+                       image_meta=None):
         cloned = None
         model_update = False
 
@@ -197,8 +217,18 @@ class VolumeManager(manager.SchedulerDependentManager):
             # NOTE (singn): two params need to be returned
             # dict containing provider_location for cloned volume
             # and clone status
-            model_update, cloned = self.driver.clone_image(
-                volume_ref, image_location)
+            cached = False
+            if self.image_volume_cache and image_meta:
+                model_update, cached = self.image_volume_cache.clone(
+                    context, volume_ref, image_meta)
+            if cached:
+                cloned = True
+                self.db.volume_update(context,
+                                      volume_ref['id'],
+                                      {'bootable': True})
+            else:
+                model_update, cloned = self.driver.clone_image(
+                    volume_ref, image_location)
             if not cloned:
                 model_update = self.driver.create_volume(volume_ref)
 
@@ -216,6 +246,9 @@ class VolumeManager(manager.SchedulerDependentManager):
                 self.db.volume_update(context,
                                       volume_ref['id'],
                                       {'bootable': True})
+                if self.image_volume_cache and image_meta:
+                    self.image_volume_cache.add(context, volume_ref,
+                                                image_meta)
         return model_update, cloned
 
     def create_volume(self, context, volume_id, request_spec=None,
@@ -267,6 +300,9 @@ class VolumeManager(manager.SchedulerDependentManager):
                 image_service, image_id = \
                     glance.get_remote_image_service(context,
                                                     image_id)
+                # The driver and image_utils look the image up again,
+                # serve these lookups from the ones made here
+                image_service = glance.CachingImageService(image_service)
                 image_location = image_service.get_location(context, image_id)
                 image_meta = image_service.show(context, image_id)
             else:
@@ -279,7 +315,8 @@ class VolumeManager(manager.SchedulerDependentManager):
                                                            sourcevol_ref,
                                                            image_service,
                                                            image_id,
-                                                           image_location)
+                                                           image_location,
+                                                           image_meta)
             except exception.ImageCopyFailure as ex:
                 LOG.error(_('Setting volume: %s status to error '
                             'after failed image copy.'), volume_ref['id'])
@@ -515,7 +552,7 @@ class VolumeManager(manager.SchedulerDependentManager):
         if reservations:
             QUOTAS.commit(context, reservations, project_id=project_id)
 
-        self.publish_service_capabilities(context)
+        self._refresh_service_capabilities(context)
 
         return True
 
@@ -918,9 +955,27 @@ class VolumeManager(manager.SchedulerDependentManager):
             self.update_service_capabilities(volume_stats)
 
     def publish_service_capabilities(self, context):
-        """Collect driver status and then publish."""
+        """Collect driver status and then publish all of it."""
         self._report_driver_status(context)
-        self._publish_service_capabilities(context)
+        self._publish_service_capabilities(context, full_report=True)
+
+    def _refresh_service_capabilities(self, context):
+        """Collect driver status and publish it once the request is done.
+
+        The requests made while a refresh is waiting to run share it.
+        """
+        if self._capabilities_refresh_pending:
+            return
+        self._capabilities_refresh_pending = True
+        greenthread.spawn_n(self._do_refresh_service_capabilities, context)
+
+    def _do_refresh_service_capabilities(self, context):
+        self._capabilities_refresh_pending = False
+        try:
+            self._report_driver_status(context)
+            self._publish_service_capabilities(context)
+        except Exception:
+            LOG.exception(_("Failed to refresh volume status"))
 
     def _reset_stats(self):
         LOG.info(_("Clear capabilities"))
@@ -133,9 +133,15 @@ class VolumeAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
                                                  self.topic,
                                                  volume['host']))
 
-    def publish_service_capabilities(self, ctxt):
-        self.fanout_cast(ctxt, self.make_msg('publish_service_capabilities'),
-                         version='1.2')
+    def publish_service_capabilities(self, ctxt, host=None):
+        if host is None:
+            self.fanout_cast(ctxt,
+                             self.make_msg('publish_service_capabilities'),
+                             version='1.2')
+            return
+        self.cast(ctxt, self.make_msg('publish_service_capabilities'),
+                  topic=rpc.queue_get_for(ctxt, self.topic, host),
+                  version='1.2')
 
     def accept_transfer(self, ctxt, volume):
         self.cast(ctxt,
@@ -17,10 +17,19 @@
 """Volume-related Utilities and helpers."""
 
 
+import ctypes
+import errno
+import fcntl
+import io
 import math
+import mmap
 import os
 import stat
+import time
 
+import eventlet
+from eventlet import queue
+from eventlet import tpool
 from oslo.config import cfg
 
 from cinder import exception
@@ -37,6 +46,20 @@ volume_opts = [
                default='1M',
                help='The default block size used when copying/clearing '
                     'volumes'),
+    cfg.StrOpt('volume_copy_engine',
+               default='native',
+               help='How volume data is copied: "native" copies in-process '
+                    'when both devices can be opened by the service and '
+                    'falls back to "dd" otherwise, "dd" always runs dd as '
+                    'root'),
+    cfg.IntOpt('volume_copy_buffers',
+               default=2,
+               help='Number of volume_dd_blocksize buffers used by the '
+                    'native copy engine to overlap reads and writes'),
+    cfg.IntOpt('volume_copy_bps_limit',
+               default=0,
+               help='Maximum number of bytes per second written by a single '
+                    'native volume copy, 0 means unlimited'),
 ]
 
 CONF = cfg.CONF
@@ -172,8 +195,206 @@ def _calculate_count(size_in_m):
     return blocksize, int(count)
 
 
+def _open_direct(path, flags):
+    """Open path with O_DIRECT if the underlying filesystem supports it."""
+    try:
+        return os.open(path, flags | getattr(os, 'O_DIRECT', 0))
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+        return os.open(path, flags)
+
+
+def _aligned_buffer(size):
+    """Return a writable, page-aligned buffer of size bytes."""
+    return (ctypes.c_char * size).from_buffer(mmap.mmap(-1, size))
+
+
+def _clear_direct(fd):
+    """Turn O_DIRECT off on fd, returning False if it was not on."""
+    direct = getattr(os, 'O_DIRECT', 0)
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    if not flags & direct:
+        return False
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~direct)
+    return True
+
+
+class _VolumeCopy(object):
+    """Copies a volume in-process with page-aligned, double buffered I/O.
+
+    Reads of the next chunk overlap with the write of the current one.
+    Chunks reading back as zeros are deallocated on destinations that
+    support it (e.g. thin LVs and sparse files) and only written out as
+    zeros otherwise.
+    """
+
+    def __init__(self, src, dest, length, sync=False):
+        self.src = src
+        self.dest = dest
+        self.length = length
+        self.sync = sync
+        blocksize = strutils.to_bytes(_calculate_count(0)[0])
+        self.chunk_size = max(blocksize // mmap.PAGESIZE, 1) * mmap.PAGESIZE
+        self.num_buffers = max(CONF.volume_copy_buffers, 1)
+        self.bps_limit = CONF.volume_copy_bps_limit
+        self._zeros = mmap.mmap(-1, self.chunk_size)
+        self._can_punch = True
+
+    @staticmethod
+    def _fill(src, buf, count):
+        """Read up to count bytes from src into buf.
+
+        Runs in a native thread so must not log.
+        """
+        view = memoryview(buf)
+        filled = 0
+        while filled < count:
+            try:
+                nbytes = src.readinto(view[filled:count])
+            except IOError as e:
+                # An unaligned tail cannot be read with O_DIRECT
+                if e.errno != errno.EINVAL or not _clear_direct(src.fileno()):
+                    raise
+                continue
+            if not nbytes:
+                break
+            filled += nbytes
+        return filled
+
+    @staticmethod
+    def _write(fd, data):
+        """Write all of data to fd.
+
+        Runs in a native thread so must not log.
+        """
+        written = 0
+        while written < len(data):
+            try:
+                written += os.write(fd, buffer(data, written))
+            except OSError as e:
+                if e.errno != errno.EINVAL or not _clear_direct(fd):
+                    raise
+
+    def _is_zero(self, buf, count):
+        return buffer(buf, 0, count) == buffer(self._zeros, 0, count)
+
+    def _read(self, src, free_buffers, filled):
+        """Read src into free buffers, queuing them for the writer."""
+        offset = 0
+        try:
+            while offset < self.length:
+                count = min(self.chunk_size, self.length - offset)
+                if src is None:
+                    filled.put((offset, count, None))
+                    offset += count
+                    continue
+                buf = free_buffers.get()
+                nbytes = tpool.execute(self._fill, src, buf, count)
+                filled.put((offset, nbytes, buf))
+                offset += nbytes
+                if nbytes < count:
+                    # Short source, nothing more to read.
+                    return
+        finally:
+            filled.put(None)
+
+    def _write_zeros(self, fd, offset, count):
+        """Make count bytes at offset of fd read back as zeros."""
+        if self._can_punch:
+            if utils.punch_hole(fd, offset, count):
+                return
+            # Punching will not work any better on the next chunk.
+            self._can_punch = False
+        os.lseek(fd, offset, os.SEEK_SET)
+        tpool.execute(self._write, fd, buffer(self._zeros, 0, count))
+
+    def _throttle(self, start, copied):
+        if self.bps_limit:
+            delay = start + float(copied) / self.bps_limit - time.time()
+            if delay > 0:
+                eventlet.sleep(delay)
+
+    def run(self):
+        """Perform the copy, returning the number of bytes not written."""
+        src = None
+        if self.src != '/dev/zero':
+            src = io.FileIO(_open_direct(self.src, os.O_RDONLY), 'r')
+        try:
+            fd = _open_direct(self.dest, os.O_WRONLY)
+            try:
+                return self._copy(src, fd)
+            finally:
+                os.close(fd)
+        finally:
+            if src is not None:
+                src.close()
+
+    def _copy(self, src, fd):
+        free_buffers = queue.Queue()
+        for i in xrange(self.num_buffers):
+            free_buffers.put(_aligned_buffer(self.chunk_size))
+        filled = queue.Queue()
+
+        start = time.time()
+        copied = 0
+        skipped = 0
+        reader = eventlet.spawn(self._read, src, free_buffers, filled)
+        try:
+            while True:
+                item = filled.get()
+                if item is None:
+                    break
+
+                offset, count, buf = item
+                if buf is None or self._is_zero(buf, count):
+                    self._write_zeros(fd, offset, count)
+                    skipped += count
+                else:
+                    os.lseek(fd, offset, os.SEEK_SET)
+                    tpool.execute(self._write, fd, buffer(buf, 0, count))
+                if buf is not None:
+                    free_buffers.put(buf)
+                copied += count
+                self._throttle(start, copied)
+
+            # Re-raises any error hit by the reader
+            reader.wait()
+        finally:
+            reader.kill()
+
+        if self.sync:
+            tpool.execute(os.fdatasync, fd)
+
+        elapsed = max(time.time() - start, 0.001)
+        LOG.debug(_('Copied %(copied)d bytes from %(src)s to %(dest)s in '
+                    '%(elapsed).2f seconds (%(rate).2f MB/s), %(skipped)d '
+                    'zero bytes not written') %
+                  {'copied': copied, 'src': self.src, 'dest': self.dest,
+                   'elapsed': elapsed, 'rate': copied / elapsed / units.MiB,
+                   'skipped': skipped})
+        return skipped
+
+
+def _can_copy_natively(srcstr, deststr):
+    if CONF.volume_copy_engine != 'native':
+        return False
+    return (os.access(srcstr, os.R_OK) and os.path.exists(deststr) and
+            os.access(deststr, os.W_OK))
+
+
 def copy_volume(srcstr, deststr, size_in_m, sync=False,
                 execute=utils.execute):
+    """Copy size_in_m MiB from srcstr to deststr.
+
+    The copy runs in-process when the service may open both paths, or
+    through dd as root otherwise.
+    """
+    if _can_copy_natively(srcstr, deststr):
+        _VolumeCopy(srcstr, deststr, size_in_m * units.MiB,
+                    sync=sync).run()
+        return
+
     # Use O_DIRECT to avoid thrashing the system buffer cache
     extra_flags = ['iflag=direct', 'oflag=direct']
 
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time the volume lookups before and after the migration 021 indexes.
+
+An in-memory SQLite database is migrated to version 20 and filled with
+volumes spread over hosts and projects, part of them deleted and half of
+the others attached. The lookups by host, project and instance are timed
+through the DB API, then again after migrating to version 21.
+
+    tools/with_venv.sh python tools/db_index_benchmark.py --rows 1000000
+"""
+
+import os
+import random
+import sys
+import time
+import uuid
+
+from oslo.config import cfg
+
+
+POSSIBLE_TOPDIR = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(POSSIBLE_TOPDIR, 'cinder', '__init__.py')):
+    sys.path.insert(0, POSSIBLE_TOPDIR)
+
+from cinder.openstack.common import gettextutils
+gettextutils.install('cinder')
+
+from cinder.common import config  # Need to register global_opts
+from cinder import context
+from cinder import db
+from cinder.db import migration
+from cinder.db.sqlalchemy import models
+from cinder.openstack.common.db.sqlalchemy import session as db_session
+
+
+benchmark_opts = [
+    cfg.IntOpt('rows',
+               default=1000000,
+               help='Number of volumes to create'),
+    cfg.IntOpt('hosts',
+               default=500,
+               help='Number of hosts the volumes are spread over'),
+    cfg.IntOpt('projects',
+               default=2000,
+               help='Number of projects the volumes are spread over'),
+    cfg.FloatOpt('deleted_ratio',
+                 default=0.2,
+                 help='Fraction of the volumes marked as deleted'),
+    cfg.IntOpt('repeat',
+               default=5,
+               help='Number of runs of each lookup, the best one is kept'),
+]
+
+CONF = cfg.CONF
+CONF.register_cli_opts(benchmark_opts)
+
+BATCH_SIZE = 10000
+
+
+def _populate(engine):
+    table = models.Volume.__table__
+    instance_uuids = []
+    rows = []
+    for i in xrange(CONF.rows):
+        deleted = random.random() < CONF.deleted_ratio
+        instance_uuid = None
+        if not deleted and random.random() < 0.5:
+            instance_uuid = str(uuid.uuid4())
+            instance_uuids.append(instance_uuid)
+        rows.append({'id': str(uuid.uuid4()),
+                     'host': 'host%d' % random.randrange(CONF.hosts),
+                     'project_id': 'project%d' %
+                                   random.randrange(CONF.projects),
+                     'instance_uuid': instance_uuid,
+                     'size': random.randint(1, 100),
+                     'status': 'deleted' if deleted else 'available',
+                     'deleted': deleted})
+        if len(rows) == BATCH_SIZE:
+            engine.execute(table.insert(), rows)
+            rows = []
+    if rows:
+        engine.execute(table.insert(), rows)
+    return instance_uuids
+
+
+def _best_time(func, *args):
+    best = None
+    for i in xrange(CONF.repeat):
+        start = time.time()
+        func(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1000
+
+
+def _run_lookups(ctxt, host, project_id, instance_uuid):
+    return [
+        ('volume_get_all_by_host',
+         _best_time(db.volume_get_all_by_host, ctxt, host)),
+        ('volume_data_get_for_project',
+         _best_time(db.volume_data_get_for_project, ctxt, project_id)),
+        ('volume_get_all_by_instance_uuid',
+         _best_time(db.volume_get_all_by_instance_uuid, ctxt,
+                    instance_uuid)),
+    ]
+
+
+def main():
+    CONF(sys.argv[1:], project='cinder')
+    CONF.set_override('connection', 'sqlite://', group='database')
+
+    migration.db_sync(20)
+    print('Creating %d volumes...' % CONF.rows)
+    instance_uuids = _populate(db_session.get_engine())
+
+    ctxt = context.get_admin_context()
+    host = 'host%d' % random.randrange(CONF.hosts)
+    project_id = 'project%d' % random.randrange(CONF.projects)
+    instance_uuid = random.choice(instance_uuids)
+
+    before = _run_lookups(ctxt, host, project_id, instance_uuid)
+    migration.db_sync(21)
+    after = _run_lookups(ctxt, host, project_id, instance_uuid)
+
+    for (name, before_ms), (_name, after_ms) in zip(before, after):
+        print('%-32s %8.2f ms -> %8.2f ms' % (name, before_ms, after_ms))
+
+
+if __name__ == '__main__':
+    main()